@@ -0,0 +1,254 @@
+'''
+Open Combat Flow - archive.py
+@purpose Stores combat logs in a compact binary format, and reads them back without loading the whole file.
+@note Layout of an archive file:
+	-A header (HEADER), giving the number of records and turns, and where the turn index and tables start.
+	-The records, each RECORD.size bytes long. Characters, names and effects are stored as ids into the tables.
+	-The turn index: the number of the first record of each turn, as unsigned 64 bit integers.
+	-The tables, as UTF-8 JSON: the names of characters, the names of actions and reactions, and each distinct set of effects.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.combatlog as combatlog
+import collections
+import json
+import mmap
+import struct
+
+MAGIC = b"OCFLOG\x00\x01"
+VERSION = 2
+HEADER = struct.Struct("<8sHHIQQQQQ") #magic, version, record size, reserved, record count, turn count, turn index offset, tables offset, tables length
+RECORD = struct.Struct("<BxHIIIIIiI") #messageType, flags, turn, character, action, reaction, reactor, damageTaken, effects
+TURN_INDEX = struct.Struct("<Q")
+NONE = 0xFFFFFFFF #Stored in place of an id when there is nothing to refer to.
+CHUNK_RECORDS = 4096 #The number of records decoded from each slice of the file while iterating.
+
+FLAG_DAMAGE = 1 #The record has a damageTaken value.
+
+ArchiveRecord = collections.namedtuple('ArchiveRecord', ['messageType', 'turn', 'character', 'action', 'reaction', 'reactor', 'damageTaken', 'effects'])
+ArchiveRecord.__doc__ = '''
+One decoded log message. character is the name of the character the message is about (the user of the action, for messages about an action). action and reaction are names. reactor is the name of the character that reacted (the user of the reaction), or None if the message has no reaction. damageTaken is None if the message has no damage. effects is a dictionary.
+'''
+
+class ArchiveWriter():
+	'''
+	Writes logBlocks to an archive file. An ArchiveWriter is a sink, so it can be passed to combatHandler.configureLog, or called directly with each message.
+	@note The file is only readable once close() has been called.
+	'''
+
+	def __init__(self, path):
+		'''
+		Creates an archive file, replacing any existing file.
+		@param path The path of the file.
+		'''
+		self.path = path
+		self._file = open(path, 'wb')
+		self._file.write(b"\x00"*HEADER.size) #Placeholder, written for real by close().
+		self._recordCount = 0
+		self._turnStarts = [0]
+		self._seenStartOfTurn = False
+		self._characters = {} #Maps id(character) to (character id, character), so characters are interned by identity.
+		self._characterNames = []
+		self._names = {}
+		self._effects = {}
+
+	def __call__(self, message):
+		'''
+		Writes one logBlock.
+		@param message The logBlock to write.
+		'''
+		messageType = message['messageType']
+		if messageType == 'startOfTurn':
+			if self._seenStartOfTurn:
+				self._turnStarts.append(self._recordCount)
+			self._seenStartOfTurn = True
+
+		character = NONE
+		action = NONE
+		reaction = NONE
+		reactor = NONE
+		damageTaken = 0
+		effects = NONE
+		flags = 0
+		if 'character' in message:
+			character = self._intern(message['character'])
+		if 'action' in message:
+			action = self._internName(message['action'].get('name'))
+			if character == NONE and 'user' in message['action']:
+				character = self._intern(message['action']['user'])
+		if 'reaction' in message:
+			reaction = self._internName(message['reaction'].get('name'))
+			if 'user' in message['reaction']:
+				reactor = self._intern(message['reaction']['user'])
+		if 'damage' in message:
+			flags|=FLAG_DAMAGE
+			damageTaken = message['damage'].get('damageTaken', 0)
+			if message['damage'].get('effects'):
+				effects = self._internEffects(message['damage']['effects'])
+
+		self._file.write(RECORD.pack(combatlog.MESSAGE_TYPES.index(messageType), flags, len(self._turnStarts)-1, character, action, reaction, reactor, damageTaken, effects))
+		self._recordCount+=1
+
+	def close(self):
+		'''
+		Writes the turn index and tables, and closes the file.
+		@post The file is complete, and can be opened with ArchiveReader.
+		'''
+		if self._file.closed:
+			return
+		turnIndexOffset = self._file.tell()
+		for start in self._turnStarts:
+			self._file.write(TURN_INDEX.pack(start))
+		tablesOffset = self._file.tell()
+		tables = json.dumps({'characters': self._characterNames, 'names': list(self._names), 'effects': list(self._effects)}).encode('utf-8')
+		self._file.write(tables)
+		self._file.seek(0)
+		self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0, self._recordCount, len(self._turnStarts), turnIndexOffset, tablesOffset, len(tables)))
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	#Private
+
+	def _intern(self, character):
+		'''
+		PRIVATE: Gets the id of a character, giving it one if it has none.
+		'''
+		entry = self._characters.get(id(character))
+		if entry is None:
+			entry = (len(self._characterNames), character) #The character is kept, so that its id() cannot be reused by another object.
+			self._characters[id(character)] = entry
+			self._characterNames.append(getattr(character, 'name', None))
+		return entry[0]
+
+	def _internName(self, name):
+		'''
+		PRIVATE: Gets the id of an action or reaction name, giving it one if it has none.
+		'''
+		if name is None:
+			return NONE
+		return self._names.setdefault(name, len(self._names))
+
+	def _internEffects(self, effects):
+		'''
+		PRIVATE: Gets the id of a set of effects, giving it one if it has none.
+		'''
+		return self._effects.setdefault(json.dumps(sorted(effects.items())), len(self._effects))
+
+class ArchiveReader():
+	'''
+	Reads an archive file through a memory map. Records are only decoded when they are accessed.
+	'''
+
+	def __init__(self, path):
+		'''
+		Opens an archive file.
+		@param path The path of the file.
+		@raise ValueError If the file is not a complete archive.
+		'''
+		self.path = path
+		self._file = open(path, 'rb')
+		self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, recordSize, reserved, self._recordCount, self._turnCount, turnIndexOffset, tablesOffset, tablesLength = HEADER.unpack_from(self._map, 0)
+		if magic != MAGIC or version != VERSION or recordSize != RECORD.size:
+			raise ValueError(f"{path} is not a complete OpenCombatFlow archive.")
+		self._turnIndexOffset = turnIndexOffset
+		tables = json.loads(self._map[tablesOffset:tablesOffset+tablesLength].decode('utf-8'))
+		self.characters = tables['characters'] #The name of each character, by id.
+		self.names = tables['names'] #Each action and reaction name, by id.
+		self.effects = [dict(effects) for effects in (json.loads(entry) for entry in tables['effects'])] #Each distinct set of effects, by id.
+
+	def __len__(self):
+		'''
+		Returns the number of records.
+		'''
+		return self._recordCount
+
+	def __getitem__(self, index):
+		'''
+		Decodes a single record.
+		@param index The number of the record. Negative numbers count from the end.
+		@raise IndexError If there is no such record.
+		@return An ArchiveRecord.
+		'''
+		if index < 0:
+			index+=self._recordCount
+		if not 0 <= index < self._recordCount:
+			raise IndexError("Archive record index out of range.")
+		return self._decode(RECORD.unpack_from(self._map, HEADER.size+index*RECORD.size))
+
+	def __iter__(self):
+		'''
+		Iterates over every record, in order.
+		'''
+		return self.records(0, self._recordCount)
+
+	def records(self, start, stop):
+		'''
+		Iterates over a range of records.
+		@param start The number of the first record.
+		@param stop The number of the record after the last.
+		@return An iterator of ArchiveRecords.
+		'''
+		stop = min(stop, self._recordCount)
+		for chunkStart in range(max(0, start), stop, CHUNK_RECORDS): #Only one chunk of the file is copied out of the map at a time.
+			chunkStop = min(chunkStart+CHUNK_RECORDS, stop)
+			for fields in RECORD.iter_unpack(self._map[HEADER.size+chunkStart*RECORD.size:HEADER.size+chunkStop*RECORD.size]):
+				yield self._decode(fields)
+
+	def turnCount(self):
+		'''
+		Returns the number of turns in the archive.
+		'''
+		return self._turnCount
+
+	def turn(self, turn):
+		'''
+		Iterates over the records of a single turn. Messages logged before the first turn started are part of turn 0.
+		@param turn The number of the turn, starting from 0.
+		@raise IndexError If there is no such turn.
+		@return An iterator of ArchiveRecords.
+		'''
+		if not 0 <= turn < self._turnCount:
+			raise IndexError("Archive turn index out of range.")
+		start = TURN_INDEX.unpack_from(self._map, self._turnIndexOffset+turn*TURN_INDEX.size)[0]
+		if turn+1 < self._turnCount:
+			stop = TURN_INDEX.unpack_from(self._map, self._turnIndexOffset+(turn+1)*TURN_INDEX.size)[0]
+		else:
+			stop = self._recordCount
+		return self.records(start, stop)
+
+	def close(self):
+		'''
+		Closes the file.
+		'''
+		self._map.close()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	#Private
+
+	def _decode(self, fields):
+		'''
+		PRIVATE: Turns the fields of a record into an ArchiveRecord.
+		'''
+		messageType, flags, turn, character, action, reaction, reactor, damageTaken, effects = fields
+		return ArchiveRecord(
+			combatlog.MESSAGE_TYPES[messageType],
+			turn,
+			None if character == NONE else self.characters[character],
+			None if action == NONE else self.names[action],
+			None if reaction == NONE else self.names[reaction],
+			None if reactor == NONE else self.characters[reactor],
+			damageTaken if flags & FLAG_DAMAGE else None,
+			{} if effects == NONE else self.effects[effects],
+		)
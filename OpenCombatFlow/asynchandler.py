@@ -0,0 +1,134 @@
+'''
+Open Combat Flow - asynchandler.py
+@purpose Defines the AsyncCombatHandler, a combatHandler for characters whose getActionBlock and getReactionBlock are coroutines (for example, because they ask a remote service what to do).
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import asyncio
+import inspect
+
+class AsyncCombatHandler(character.combatHandler):
+	'''
+	A combatHandler whose turn() and run() are coroutines. Characters may implement getActionBlock and getReactionBlock either as coroutines (async def) or as ordinary methods.
+	When an action has several targets, all of their reactions are requested at once and awaited together, so waiting for them takes about as long as the slowest one rather than all of them added up. Everything else (chances, damage, retaliations and deaths) is then applied one target at a time, in target order, exactly as combatHandler does.
+	@note Reactions are requested before the action is applied to any target, so a reaction cannot depend on what happened to earlier targets. Targets that the action misses are also asked, and their reactions are discarded.
+	@note While a decisionSource is set (see replay), reactions are requested one at a time, as combatHandler does. replay.replay() itself needs the ordinary combatHandler.
+	@note Batched resolution (setBatchResolution) is not used by this handler.
+	@note Retaliations and failure conditions are bounded by setActionBudget, just as with combatHandler.
+	'''
+
+	async def turn(self):
+		'''
+		Executes the turn of the current character.
+		@post The turn of the current character is completed, and moves to the next character.
+		@raise Exception If no characters are alive.
+		'''
+		actor = self._startTurn()
+
+		#Get, and execute, the desired action.
+		action = await _resolve(self._getAction(actor))
+		if 'action' not in self._unlogged:
+			self.addLogMessage({'messageType':'action', 'action': action}) #Add log message regarding the action
+		await self._executeActionBlockAsync(action)
+
+		self._endTurn(actor)
+
+	async def run(self, max_turns=None, until=character.oneGroupRemaining, max_rounds=None):
+		'''
+		Executes turns until a stop condition is met. See combatHandler.run.
+		@param max_turns The maximum number of turns to execute. If None, there is no limit.
+		@param until A predicate, called with the handler, that stops the run once it returns True. If None, only the limits apply.
+		@param max_rounds The maximum number of rounds to complete. If None, there is no limit.
+		@raise ValueError If there is no stop condition at all.
+		@return A character.RunSummary.
+		'''
+		start = self._startRun(max_turns, until, max_rounds)
+		try:
+			reason = self._stopReason(until, start)
+			while reason is None:
+				await self.turn()
+				reason = self._stopReason(until, start)
+		finally:
+			self._endRun()
+		return self._summarizeRun(start, reason)
+
+	#Private
+
+	async def _executeActionBlockAsync(self, action):
+		'''
+		PRIVATE: Executes action, along with every failure condition and retaliation it leads to, gathering the reactions of every target concurrently. Follow-up actions are kept on the same kind of explicit stack as in combatHandler._executeActionBlock, so long chains of retaliations cannot hit the recursion limit.
+		@param action The action to execute.
+		@post The action has been executed, except for follow-up actions that went over the action budget.
+		'''
+		stack = []
+		await self._pushActionAsync(stack, action, None)
+		while stack:
+			frame = stack[-1]
+			if frame.pending is not None: #Back from a retaliation, so finish off its target.
+				self._checkDeath(frame.pending)
+				frame.pending = None
+			followUp = await self._stepActionAsync(frame)
+			if followUp is None:
+				stack.pop()
+				if self._actionFinished is not None:
+					self._actionFinished(frame.action, frame.depth)
+			else:
+				await self._pushActionAsync(stack, followUp, frame)
+
+	async def _pushActionAsync(self, stack, action, parent):
+		'''
+		PRIVATE: Starts executing an action, requesting the reactions of all its targets at once, and pushes a frame for it onto stack.
+		@param stack The stack of frames.
+		@param action The action.
+		@param parent The frame of the action that led to this one, or None for an action chosen on a turn.
+		'''
+		frame = self._startAction(action, parent, True)
+		if frame is None:
+			return
+		if self.decisionSource is None and len(frame.targets) > 1:
+			frame.reactions = await asyncio.gather(*(_resolve(self._getReaction(target, action)) for target in frame.targets)) #Results come back in target order.
+		stack.append(frame)
+
+	async def _stepActionAsync(self, frame):
+		'''
+		PRIVATE: Works through the targets of an action, until it leads to a follow-up action or runs out of targets. See combatHandler._stepAction.
+		@param frame The frame of the action.
+		@return The follow-up action to execute next, or None if the action is finished.
+		'''
+		action = frame.action
+		targets = frame.targets
+		while frame.index < len(targets):
+			i = frame.index
+			target = targets[i]
+			frame.index+=1
+			if target not in self.alive: #Killed by a retaliation earlier in this action.
+				continue
+
+			#Chance Handling
+			if self._chanceFails(action):
+				if "failureCondition" in action:
+					return action['failureCondition']
+				continue
+
+			#Gathering reaction and creating damage
+			if frame.reactions is None:
+				reaction = await _resolve(self._getReaction(target, action))
+			else:
+				reaction = frame.reactions[i]
+			retaliation = self._hitTarget(frame, target, reaction)
+			if retaliation is not None:
+				return retaliation
+		return None
+
+#Private
+
+async def _resolve(result):
+	'''
+	PRIVATE: Awaits result if it is awaitable, so that hooks can be coroutines or ordinary methods.
+	@param result The value returned by a hook.
+	@return The block.
+	'''
+	if inspect.isawaitable(result):
+		return await result
+	return result
@@ -0,0 +1,141 @@
+'''
+Open Combat Flow - blocks.py
+@purpose Defines ActionBlock, RangeBlock, ReactionBlock and DamageBlock: frozen, slotted versions of the blocks described in the DSD, which are validated once, when they are built.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.enforce as enforce
+import collections.abc
+
+class Block(collections.abc.Mapping):
+	'''
+	A frozen block. Blocks behave like read-only dicts, so the combatHandler accepts them wherever it accepts a dict, and their keys can also be read as attributes (action.damage). Each key from the DSD is kept in a slot instead of a dict, which makes blocks much smaller than dicts, so they suit libraries of pre-built actions.
+	A block is validated against its prototype in enforce.py when it is built. Since it cannot change afterwards, enforce() never checks it again.
+	@note Keys that are not in the DSD are kept too, in an ordinary dict.
+	@note Nested dicts are frozen with enforce.freeze(), and nested blocks (such as the range of an action) are converted to their Block classes.
+	'''
+	__slots__ = ('_extra',)
+	blockType = None #The blockType of the block, as passed to enforce().
+	_nested = {} #Maps each key that holds a nested block to its blockType.
+
+	def __init__(self, block = (), **keys):
+		'''
+		Builds a block, and validates it.
+		@param block A dict (or any mapping, including another Block) with the keys of the block.
+		@param keys More keys, which override those in block.
+		@raise KeyError If the block is not valid. See enforce().
+		'''
+		values = {}
+		for key, value in dict(block, **keys).items():
+			nested = self._nested.get(key)
+			if nested is not None and isinstance(value, collections.abc.Mapping):
+				if type(value) != BLOCK_CLASSES[nested]:
+					value = BLOCK_CLASSES[nested](value)
+			elif not isinstance(value, Block):
+				value = enforce.freeze(value)
+			values[key] = value
+		enforce.enforce(values, self.blockType)
+
+		extra = {}
+		for key, value in values.items():
+			if key in self.__slots__:
+				object.__setattr__(self, key, value)
+			else:
+				extra[key] = value
+		object.__setattr__(self, '_extra', extra or None)
+
+	def toDict(self):
+		'''
+		Converts the block back into a plain dict. Nested blocks and frozen dicts become dicts, and tuples become lists.
+		@return A new dict, which can be changed freely.
+		'''
+		return {key: _thaw(value) for key, value in self.items()}
+
+	def __getitem__(self, key):
+		if key in self.__slots__:
+			try:
+				return getattr(self, key)
+			except AttributeError: #The slot was never set.
+				raise KeyError(key) from None
+		if self._extra is not None and key in self._extra:
+			return self._extra[key]
+		raise KeyError(key)
+
+	def __contains__(self, key):
+		if key in self.__slots__:
+			return hasattr(self, key)
+		return self._extra is not None and key in self._extra
+
+	def __iter__(self):
+		for key in self.__slots__:
+			if hasattr(self, key):
+				yield key
+		if self._extra is not None:
+			yield from self._extra
+
+	def __len__(self):
+		return sum(1 for key in self)
+
+	def __setattr__(self, name, value):
+		raise AttributeError(f"{type(self).__name__} is frozen. Use toDict() to get a copy that can be changed.")
+
+	def __delattr__(self, name):
+		raise AttributeError(f"{type(self).__name__} is frozen. Use toDict() to get a copy that can be changed.")
+
+	def __reduce__(self):
+		return (type(self), (self.toDict(),))
+
+	def __repr__(self):
+		return f"{type(self).__name__}({dict(self)!r})"
+
+class ActionBlock(Block):
+	'''
+	A frozen actionBlock. See the DSD.
+	'''
+	__slots__ = ('range', 'user', 'name', 'damage', 'effects', 'chance', 'failureCondition')
+	blockType = 'action'
+	_nested = {'range': 'range', 'failureCondition': 'action'}
+
+class RangeBlock(Block):
+	'''
+	A frozen rangeBlock. See the DSD.
+	'''
+	__slots__ = ('center', 'distance', 'group', 'character')
+	blockType = 'range'
+
+class ReactionBlock(Block):
+	'''
+	A frozen reactionBlock. See the DSD.
+	'''
+	__slots__ = ('user', 'name', 'resistance', 'action')
+	blockType = 'reaction'
+	_nested = {'action': 'action'}
+
+class DamageBlock(Block):
+	'''
+	A frozen damageBlock. See the DSD.
+	'''
+	__slots__ = ('damageTaken', 'effects')
+	blockType = 'damage'
+
+BLOCK_CLASSES = {
+	'action': ActionBlock,
+	'range': RangeBlock,
+	'reaction': ReactionBlock,
+	'damage': DamageBlock,
+} #Maps each blockType to its Block class.
+
+#Private
+
+def _thaw(value):
+	'''
+	PRIVATE: Undoes enforce.freeze(), and converts blocks back into dicts.
+	'''
+	if isinstance(value, Block):
+		return value.toDict()
+	elif isinstance(value, collections.abc.Mapping):
+		return {key: _thaw(element) for key, element in value.items()}
+	elif type(value) == tuple:
+		return [_thaw(element) for element in value]
+	else:
+		return value
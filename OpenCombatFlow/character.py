@@ -6,6 +6,11 @@ Open Combat Flow - character.py
 '''
 import opencombatflow
 import opencombatflow.dice as dice
+import opencombatflow.effects as effects
+import opencombatflow.turnorder as turnorder
+import collections
+import functools
+import itertools
 import math
 import random
 
@@ -14,10 +19,13 @@ class Character():
 	A single character.
 	'''
 	HP = 1 #Hit Points. When this number reaches 0, the character is dead,
-	effects = {} #A dictionary of effects. We start with no effects.
 	position = [0, 0, 0] #The coordinates of the character. If you don't plan on using a coordinat system, this can be safely ignored.
 	groups = [] #Groups of characters. These are specifed as strings. EX: "Enemies", "Undead", etc.
 	name = "Set" #The name of the character. This can also be safely ignored, and is only dded for your convience.
+	speed = 1 #How often the character acts, relative to others, if the combatHandler uses a turnorder.SpeedScheduler.
+	initiative = "1d20" #The dice string (or integer) rolled for turn order each round, if the combatHandler uses a turnorder.InitiativeScheduler.
+	_positionListeners = () #Spatial indexes that must be told when the character moves.
+	_groupListeners = () #Group indexes that must be told when the character's groups change.
 
 	#Things to implement in derived classes.
 	def getActionBlock(self):
@@ -54,8 +62,32 @@ class Character():
 		'''
 
 		pass
+
+	def effectExpired(self, effect):
+		'''
+		This method is called by _update for each effect that runs out. It doesn't need to be implemented.
+		@param effect The effect that ran out.
+		'''
+
+		pass
 	
 	#Getters/Setters
+
+	@property
+	def effects(self):
+		'''
+		A dictionary of effects, mapping each effect to the number of turns it has left. We start with no effects. Each character gets its own effects.TimedEffects the first time this is used, and assigning a dictionary replaces its contents.
+		'''
+		try:
+			return self._effects
+		except AttributeError:
+			self._effects = effects.TimedEffects()
+			return self._effects
+
+	@effects.setter
+	def effects(self, value):
+		self._effects = effects.TimedEffects(value)
+
 	def setPosition(self, x, y=None, z=None):
 		'''
 		Sets the position. Specify however many coordinates you need, up to 3.
@@ -64,12 +96,48 @@ class Character():
 		@param z The new Z coordinate
 		@post The position member variable is altered to refled the change.
 		'''
-		self.position[0] = x
+		position = list(self.position) #Copy, so that we never alter the position shared by all characters.
+		position[0] = x
 		if y is not None:
-			self.position[1] = y
+			position[1] = y
 		if z is not None:
-			self.position[2] = z
+			position[2] = z
+		self.position = position
+
+		#Keep spatial indexes up to date.
+		for listener in self._positionListeners:
+			listener.move(self)
 	
+	def setGroups(self, groups):
+		'''
+		Replaces the groups the character belongs to.
+		@param groups The new groups, as an iterable of strings.
+		@post The groups member variable is altered to reflect the change.
+		'''
+		self.groups = list(groups) #Always a new list, so that we never alter the groups shared by all characters.
+
+		#Keep group indexes up to date.
+		for listener in self._groupListeners:
+			listener.regroup(self)
+
+	def addGroup(self, group):
+		'''
+		Adds the character to a group. Nothing happens if the character is already in it.
+		@param group The group to join.
+		@post The character is in the group.
+		'''
+		if group not in self.groups:
+			self.setGroups(self.groups+[group])
+
+	def removeGroup(self, group):
+		'''
+		Removes the character from a group. Nothing happens if the character is not in it.
+		@param group The group to leave.
+		@post The character is not in the group.
+		'''
+		if group in self.groups:
+			self.setGroups([oldGroup for oldGroup in self.groups if oldGroup != group])
+
 	def isDead(self):
 		'''
 		Returns Whether or not the character is dead.
@@ -84,28 +152,36 @@ class Character():
 	def _update(self):
 		'''
 		PRIVATE: Updates status effects, and any other general character things to complete before the turn starts.
-		@post Effects are ticked down, and inactive effects (those with time remaining <= 0) are removed.
+		@post Effects are ticked down, and inactive effects (those with time remaining <= 0) are removed. effectExpired is called for each of them.
 		'''
 
-		#Tick down status effects.
-		toRemove = []
-		for effect in self.effects: #Loop through all keys in effects.
-			self.effects[effect]-=1 #Decrement the count for each.
-			if self.effects[effect] <= 0: #If the counter is less than 0
-				toRemove.append(effect) #Add to a list of keys to delete.
-		
-		#Delete all those whose counters are less than 0.
-		for effect in toRemove: 
-			self.effects.pop(effect, None) #Remove effects whose counter value is 0.
+		#Tick down status effects. TimedEffects only looks at the effects that run out this turn.
+		activeEffects = self.effects
+		if type(activeEffects) == effects.TimedEffects:
+			toRemove = activeEffects.tick()
+		else: #A plain dictionary, set as a class attribute by a derived class.
+			toRemove = []
+			for effect in activeEffects: #Loop through all keys in effects.
+				activeEffects[effect]-=1 #Decrement the count for each.
+				if activeEffects[effect] <= 0: #If the counter is less than 0
+					toRemove.append(effect) #Add to a list of keys to delete.
+			
+			#Delete all those whose counters are less than 0.
+			for effect in toRemove: 
+				activeEffects.pop(effect, None) #Remove effects whose counter value is 0.
+
+		for effect in toRemove:
+			self.effectExpired(effect)
 
-	def _takeDamage(self, damageBlock):
+	def _takeDamage(self, damageBlock, validator=None):
 		'''
 		PRIVATE: Causes character to take the amount of damage specified by the damageBlock, along with all status effects.
 		@param damageBlock The amount of damage to take
+		@param validator The enforce.Validator to check the block with. If None, the global one is used.
 		@post Character takes the given amount of damage.
 		'''
 		import opencombatflow.enforce as enforce
-		enforce.enforce(damageBlock, "damage")
+		(enforce.defaultValidator if validator is None else validator).enforce(damageBlock, "damage")
 
 		#Take damage.
 		if "damageTaken" in damageBlock:
@@ -124,12 +200,9 @@ class Character():
 	def _inRange(self, rangeBlock):
 		'''
 		PRIVATE: Returns true if the character is in a certain range.
-		@param rangeBlock The range to test that the character is in.
+		@param rangeBlock The range to test that the character is in. It is not checked here; the caller checks it once for every character it tests.
 		@return True if the character is in the given range.
 		'''
-		import opencombatflow.enforce as enforce
-		enforce.enforce(rangeBlock, "range")
-
 		#Check if the range is empty
 		if rangeBlock == {}:
 			return False
@@ -141,8 +214,8 @@ class Character():
 			y1 = self.position[1]
 			z1 = self.position[2]
 			x2 = rangeBlock['center'][0]
-			y2 = (0, rangeBlock['center'][1])[len(rangeBlock['center'])>=2] #Ternary statement that says if the second element of center exists, use it, otherwise use 0.
-			z2 = (0, rangeBlock['center'][2])[len(rangeBlock['center'])==3] #See above.
+			y2 = rangeBlock['center'][1] if len(rangeBlock['center'])>=2 else 0 #Ternary statement that says if the second element of center exists, use it, otherwise use 0.
+			z2 = rangeBlock['center'][2] if len(rangeBlock['center'])==3 else 0 #See above.
 			dist = math.sqrt((x2-x1)**2+(y2-y1)**2+(z2-z1)**2)
 
 			#Compare Distances
@@ -161,15 +234,183 @@ class Character():
 
 		return True
 
+RunSummary = collections.namedtuple('RunSummary', ['turns', 'rounds', 'reason', 'alive', 'dead', 'deaths', 'groups'])
+RunSummary.__doc__ = '''
+What happened during a call to combatHandler.run(). turns and rounds count only this run. reason is why the run stopped: "until", "max_turns", "max_rounds" or "noneAlive". alive and dead are the numbers of characters alive and dead at the end, deaths is the number that died during the run, and groups is a sorted tuple of the groups still standing.
+'''
+
+def oneGroupRemaining(handler):
+	'''
+	A stop condition for combatHandler.run(): true once the alive characters belong to at most one group.
+	@param handler The combatHandler.
+	@return True if the combat is over.
+	'''
+	if handler.groupIndex is not None:
+		return handler.groupIndex.groupCount() <= 1
+
+	groups = set()
+	for character in handler.alive:
+		groups.update(character.groups)
+		if len(groups) > 1:
+			return False
+	return True
+
+class DamagePlan(collections.namedtuple('DamagePlan', ['damage', 'effects'])):
+	'''
+	The damage an action does to a target with a given reaction, compiled by damagePlan().
+	damage is a tuple of (damageType, damage, resistance) triples, in the order of the action's damage types. damage and resistance are compiled dice: functions that take a random generator and roll. resistance is None if the type is not resisted. effects is a tuple of (effect, duration) pairs, with the durations compiled the same way, or None if the action has no effects.
+	'''
+	__slots__ = ()
+
+	def roll(self, rng = None):
+		'''
+		Rolls the damage. Draws from rng in the same order as rolling the blocks directly would.
+		@param rng The random generator to draw from. If None, the global random module is used.
+		@return A damageBlock.
+		'''
+		NO_EFFECTS_ON_0_DAMAGE = True #Whether or not effects should be dealt if 0 damage is dealt.
+
+		total = 0
+		for dType, damage, resistance in self.damage:
+			if resistance is None:
+				total+=damage(rng)
+			else:
+				total+=max(0, damage(rng)-resistance(rng))
+		toReturn = {'damageTaken': total}
+		if self.effects is not None:
+			toReturn['effects'] = {}
+			if not (total == 0 and NO_EFFECTS_ON_0_DAMAGE):
+				for effect, duration in self.effects:
+					toReturn['effects'][effect] = duration(rng)
+		return toReturn
+
+DAMAGE_PLAN_CACHE_SIZE = 1024 #The maximum number of damage plans kept by damagePlan(). When it is full, the plan used least recently is dropped.
+
+def damagePlan(action, reaction):
+	'''
+	Gets the DamagePlan for an action hitting a target with a reaction. Plans are cached by the contents of the action's damage and effects and the reaction's resistance, so the same weapon hitting the same armor compiles only once, and a block that changes simply gets a new plan.
+	@param action The actionBlock.
+	@param reaction The reactionBlock.
+	@return The DamagePlan.
+	'''
+	damage = action['damage']
+	resistance = reaction['resistance'] if 'resistance' in reaction else None
+	effects = action['effects'] if 'effects' in action else None
+	return _cachedDamagePlan(tuple(damage.items()), None if resistance is None else tuple(resistance.items()), None if effects is None else tuple(effects.items()))
+
+def clearDamagePlans():
+	'''
+	Forgets every cached damage plan.
+	@post The next call to damagePlan() compiles a new plan.
+	'''
+	_cachedDamagePlan.cache_clear()
+
+@functools.lru_cache(maxsize=DAMAGE_PLAN_CACHE_SIZE)
+def _cachedDamagePlan(damage, resistance, effects):
+	'''
+	PRIVATE: Compiles a DamagePlan, keeping it in a bounded LRU cache.
+	@param damage The action's damage, as a tuple of items.
+	@param resistance The reaction's resistance, as a tuple of items, or None.
+	@param effects The action's effects, as a tuple of items, or None.
+	'''
+	return _compileDamagePlan(dict(damage), None if resistance is None else dict(resistance), None if effects is None else dict(effects))
+
+def _compileDamagePlan(damage, resistance, effects):
+	'''
+	PRIVATE: Compiles a DamagePlan.
+	@param damage The action's damage.
+	@param resistance The reaction's resistance, or None.
+	@param effects The action's effects, or None.
+	'''
+	compiled = []
+	for dType in damage:
+		if resistance is not None and dType in resistance:
+			compiled.append((dType, _compileDice(damage[dType]), _compileDice(resistance[dType])))
+		else:
+			compiled.append((dType, _compileDice(damage[dType]), None))
+	if effects is not None:
+		effects = tuple((effect, _compileDice(effects[effect])) for effect in effects)
+	return DamagePlan(tuple(compiled), effects)
+
+def _compileDice(diceString):
+	'''
+	PRIVATE: Compiles a dice string into a function that takes a random generator and rolls it, like dice.evaluate would. Dice strings without a conditional roll their terms directly.
+	'''
+	expression = dice.parse(diceString)
+	if expression.comparator is None:
+		return expression.pre.roll
+	return functools.partial(expression.evaluate, False)
+
+class _ActionFrame():
+	'''
+	PRIVATE: The progress of combatHandler._executeActionBlock through one action.
+	'''
+	__slots__ = ('action', 'validator', 'depth', 'targets', 'index', 'resolved', 'reactions', 'pending', 'followUps', 'batched', 'succeeded', 'run')
+
+	def __init__(self, action, validator, depth):
+		self.action = action
+		self.validator = validator
+		self.depth = depth
+		self.targets = () #The characters that may be hit, in order.
+		self.index = 0 #The index in targets of the next character to resolve.
+		self.resolved = False #Whether targets are already known to be in range.
+		self.reactions = None #Reactions gathered up front, in the same order as targets.
+		self.pending = None #A character whose retaliation is executing. It is checked for death afterwards.
+		self.followUps = 0 #The number of follow-up actions started so far.
+		self.batched = False #Whether the action is resolved in bulk, by _stepBatched.
+		self.succeeded = None #If batched, whether the chance succeeded against each target.
+		self.run = [] #If batched, the (character, reaction) pairs of targets that have been hit, but not yet resolved.
+
 class combatHandler():
 	'''
 	The "flow" part of OpenCombatFlow. Handles interactions between characters.
 	'''
 
-	alive = [] #Characters, in combat, who have not yet died
-	dead = [] #Characters, in combat, (meaning those who have not yet despawned, and may still be looted), who have died.
-	_currentCharacterIndex = 0 #The index of the current character within alive
-	log = [] #A list of log messages.
+	turnCount = 0 #The number of turns executed so far.
+	roundCount = 0 #The number of rounds completed so far. A round is completed each time the turn order wraps around.
+	rng = random #The random generator used for all rolls made by this handler. By default, this is the global random module.
+	validator = None #The enforce.Validator used for all block checks made by this handler. If None, the global one (enforce.defaultValidator) is used.
+	spatialIndex = None #A spatial.UniformGrid over the positions of alive characters. If None, area queries scan every alive character.
+	groupIndex = None #A groups.GroupIndex over the groups of alive characters. If None, group queries scan every alive character.
+	roster = None #An optional roster.Roster, holding the HP, positions and effects of this handler's characters in arrays.
+	decisionSource = None #If set, actions and reactions are taken from this object (see replay.RecordedDecisions) instead of from the characters.
+	batchThreshold = None #Actions that hit at least this many characters are resolved in bulk. If None, every action is resolved one target at a time.
+	reactionExecutor = None #A concurrent.futures executor that gathers the reactions of every target of an action at once. If None, reactions are gathered one at a time.
+	_ownsExecutor = False #Whether reactionExecutor was created by setReactionExecutor, and must be shut down by it.
+	profiler = None #A profiling.Profiler measuring this handler, if profiling is enabled.
+	_actionStarted = None #If set, called with each action and its depth when the action starts executing. Only set while profiling, so other handlers do not pay for the call.
+	_actionFinished = None #If set, called with each action and its depth once the action, and all its follow-ups, have finished executing. Only set while profiling.
+	_isTarget = None #If set, called with each target and the rangeBlock to check that the target is still in range, in place of the target's _inRange. Only set while profiling, so it can be timed.
+	maxActionDepth = None #Follow-up actions (failure conditions and retaliations) nested deeper than this are skipped. An action chosen on a turn has depth 1. If None, there is no limit.
+	maxActionFanout = None #Each action may lead to at most this many follow-up actions; the rest are skipped. If None, there is no limit.
+	truncatedActions = 0 #The number of follow-up actions skipped because of maxActionDepth or maxActionFanout.
+	_runValidator = None #The validator, looked up once when run() starts. If None, it is looked up for every action.
+	_unlogged = frozenset() #The messageTypes the log ignores, looked up once when run() starts. Messages of these types are never built.
+
+	def __init__(self, seed=None, rng=None):
+		'''
+		Creates a combatHandler.
+		@param seed If given, the handler gets its own random stream, seeded with this value.
+		@param rng A random.Random to use as the handler's random stream. Takes precedence over seed.
+		'''
+		self.alive = turnorder.TurnOrder() #Characters, in combat, who have not yet died, in turn order.
+		self.dead = [] #Characters, in combat, (meaning those who have not yet despawned, and may still be looted), who have died.
+		self.log = [] #A list of log messages. Replaced by a combatlog.CombatLog if configureLog is called.
+		if rng is not None:
+			self.rng = rng
+		elif seed is not None:
+			self.rng = random.Random(seed)
+
+	@property
+	def alive(self):
+		'''
+		The characters who have not yet died, held by the scheduler that decides whose turn it is (a turnorder.TurnOrder unless setScheduler was called). Assigning a scheduler uses it as is. Assigning any other iterable of characters replaces them with a TurnOrder, and gives the first one the next turn.
+		'''
+		return self._alive
+
+	@alive.setter
+	def alive(self, characters):
+		self._alive = characters if isinstance(characters, turnorder.Scheduler) else turnorder.TurnOrder(characters)
 
 	#Tools for interfacing with the combatHandler
 
@@ -180,31 +421,81 @@ class combatHandler():
 		@raise Exception If no characters are alive.
 		'''
 		
-		if self.alive == []:
-			raise Exception("No Characters are alive.")
-
-		#Get the actor (character executing actions)
-		actor = self.alive[self._currentCharacterIndex] #The character executing the action.
-
-		#Add log message about the start of the turn.
-		self.addLogMessage({'messageType':'startOfTurn','character':actor})
-
-		#Do additional things, which do not relate to getting actions.
-		actor.preTurn()
-		actor._update()
+		actor = self._startTurn()
 
 		#Get, and execute, the desired action.
-		action = actor.getActionBlock()
-		self.addLogMessage({'messageType':'action', 'action': action}) #Add log message regarding the action
+		action = self._getAction(actor)
+		if 'action' not in self._unlogged:
+			self.addLogMessage({'messageType':'action', 'action': action}) #Add log message regarding the action
 		self._executeActionBlock(action)
 		
-		#Do one more additional thing.
-		actor.postTurn()
+		self._endTurn(actor)
+
+	def run(self, max_turns=None, until=oneGroupRemaining, max_rounds=None):
+		'''
+		Executes turns until a stop condition is met. Conditions are checked before every turn, so nothing happens if one already holds.
+		@param max_turns The maximum number of turns to execute. If None, there is no limit.
+		@param until A predicate, called with the handler, that stops the run once it returns True. Defaults to stopping once only one group remains. If None, only the limits apply.
+		@param max_rounds The maximum number of rounds to complete. If None, there is no limit.
+		@raise ValueError If there is no stop condition at all.
+		@post A stop condition holds, or no characters are alive.
+		@return A RunSummary.
+		@note The validator and the log's messageTypes are looked up once, when the run starts. Changing either during the run takes effect on the next run.
+		'''
+		#Hoist everything that does not change between turns out of the loop. _startRun looks up the validator and the messageTypes the log ignores.
+		turn = self.turn
+		start = self._startRun(max_turns, until, max_rounds)
+		try:
+			reason = self._stopReason(until, start)
+			while reason is None:
+				turn()
+				reason = self._stopReason(until, start)
+		finally:
+			self._endRun()
+		return self._summarizeRun(start, reason)
+
+	def snapshot(self):
+		'''
+		Captures the state of the combat: who is alive and dead, whose turn it is, the HP, effects, position and groups of every character, and the state of the random stream. Much cheaper than copying the handler.
+		@note Anything else stored on your characters is not captured.
+		@return A replay.Snapshot, which can be passed to restore.
+		'''
+		import opencombatflow.replay as replay
+		return replay.Snapshot(
+			tuple(self.alive),
+			tuple(self.dead),
+			self.alive.getState(),
+			self.turnCount,
+			self.roundCount,
+			tuple(replay.captureCharacter(character) for character in itertools.chain(self.alive, self.dead)),
+			self.rng.getstate(),
+		)
 
-		#Go to the next character.
-		self._currentCharacterIndex+=1
-		if self._currentCharacterIndex >= len(self.alive):
-			self._currentCharacterIndex = 0
+	def restore(self, snapshot):
+		'''
+		Puts the combat back into the state captured by snapshot. Spatial and group indexes are rebuilt. The log is not changed.
+		@note The handler must still use the kind of scheduler it had when the snapshot was taken.
+		@param snapshot A replay.Snapshot taken from this handler.
+		@post The combat continues exactly as it did after the snapshot was taken, given the same decisions.
+		'''
+		import opencombatflow.replay as replay
+		spatialIndex = self.spatialIndex
+		groupIndex = self.groupIndex
+		self.disableSpatialIndex()
+		self.disableGroupIndex()
+
+		self.alive.setState(snapshot.turnOrder)
+		self.dead = list(snapshot.dead)
+		self.turnCount = snapshot.turnCount
+		self.roundCount = snapshot.roundCount
+		for state in snapshot.characters:
+			replay.restoreCharacter(state)
+		self.rng.setstate(snapshot.rngState)
+
+		if spatialIndex is not None:
+			self.enableSpatialIndex(spatialIndex.cellSize)
+		if groupIndex is not None:
+			self.enableGroupIndex()
 	
 	#Helpful Tools
 
@@ -214,14 +505,14 @@ class combatHandler():
 		@param range A rangeBlock specifying the valid range.
 		@return A random character in the range. None if there are none in that range.
 		'''
-		import opencombatflow.enforce as enforce
-		enforce.enforce(range,"range")
+		validator = self.getValidator()
+		validator.enforce(range,"range")
 
-		inRange = [character for character in self.alive if character._inRange(range)]
+		inRange = self._findTargets(self._getCandidates(range), range)
 		if inRange == []:
 			return None
 		else:
-			return random.choice(inRange)
+			return self.rng.choice(inRange)
 
 	def getAllInRange(self, range):
 		'''
@@ -229,14 +520,189 @@ class combatHandler():
 		@param range A rangeBlock specifying the valid range.
 		@return All characters in the range. None if there are none in that range.
 		'''
-		import opencombatflow.enforce as enforce
-		enforce.enforce(range,"range")
+		validator = self.getValidator()
+		validator.enforce(range,"range")
 
-		inRange = [character for character in self.alive if character._inRange(range)]
+		inRange = self._findTargets(self._getCandidates(range), range)
 		return inRange
 
+	def spawnRandom(self):
+		'''
+		Creates an independent random stream, seeded from this handler's stream. Spawning in the same order from the same seed always gives the same child streams, so they can be handed to other handlers or worker processes.
+		@return A new random.Random.
+		'''
+		return random.Random(self.rng.getrandbits(128))
+
 	#Setters/Getters
 
+	def setValidationMode(self, mode, sampleRate=0.1):
+		'''
+		Gives this handler its own validation mode, instead of following the global one. See enforce.Validator for the available modes.
+		@param mode The validation mode.
+		@param sampleRate The fraction of blocks that are checked in "sampled" mode.
+		@raise ValueError If mode is not valid.
+		@post The handler has its own validator, with fresh counters.
+		'''
+		import opencombatflow.enforce as enforce
+		self.validator = enforce.Validator(mode, sampleRate)
+
+	def getValidator(self):
+		'''
+		Gets the validator used by this handler. Its counters report how many checks were performed and skipped.
+		@return The handler's enforce.Validator, or the global one if the handler does not have its own.
+		'''
+		import opencombatflow.enforce as enforce
+		return enforce.defaultValidator if self.validator is None else self.validator
+
+	def setScheduler(self, scheduler=None):
+		'''
+		Changes how the next character to act is chosen.
+		@param scheduler An empty scheduler from turnorder, such as SpeedScheduler() or InitiativeScheduler(). If None, characters take turns in the order they were added.
+		@post Every alive character is in the new scheduler, which decides whose turn is next.
+		'''
+		if scheduler is None:
+			scheduler = turnorder.TurnOrder()
+		if isinstance(scheduler, turnorder.InitiativeScheduler) and scheduler.rng is None:
+			scheduler.rng = self.rng
+		for character in self.alive:
+			scheduler.append(character)
+		self.alive = scheduler
+
+	def enableSpatialIndex(self, cellSize=10):
+		'''
+		Builds a spatial index over the positions of alive characters, so that area range queries (those with "center" and "distance") only look at nearby characters.
+		@note Characters must be added with addCharacter, and moved with setPosition, for the index to stay up to date.
+		@param cellSize The size of each cell of the index. Something close to the distance of a typical area attack works well.
+		@post Area queries use the index.
+		'''
+		import opencombatflow.spatial as spatial
+		self.disableSpatialIndex()
+		self.spatialIndex = spatial.UniformGrid(cellSize)
+		for character in self.alive:
+			self._indexCharacter(character)
+
+	def disableSpatialIndex(self):
+		'''
+		Removes the spatial index, if there is one.
+		@post Area queries scan every alive character.
+		'''
+		if self.spatialIndex is None:
+			return
+		for character in self.alive:
+			self._unindexCharacter(character)
+		self.spatialIndex = None
+
+	def enableGroupIndex(self):
+		'''
+		Builds an index from each group to its alive members, so that group range queries only look at members of the group.
+		@note Characters must be added with addCharacter, and change groups with setGroups, addGroup or removeGroup, for the index to stay up to date.
+		@post Group queries use the index.
+		'''
+		import opencombatflow.groups as groups
+		self.disableGroupIndex()
+		self.groupIndex = groups.GroupIndex()
+		for character in self.alive:
+			self._indexGroups(character)
+
+	def disableGroupIndex(self):
+		'''
+		Removes the group index, if there is one.
+		@post Group queries scan every alive character.
+		'''
+		if self.groupIndex is None:
+			return
+		for character in self.alive:
+			self._unindexGroups(character)
+		self.groupIndex = None
+
+	def createRoster(self, effectNames=(), capacity=1024):
+		'''
+		Gives the handler an array-backed roster. Create characters for it with roster.RosterCharacter, and add them with addCharacter as usual.
+		@note This requires NumPy.
+		@param effectNames The effects to allocate timers for up front.
+		@param capacity The number of characters to allocate room for up front.
+		@return The new roster.Roster.
+		'''
+		import opencombatflow.roster as roster
+		self.roster = roster.Roster(effectNames, capacity)
+		return self.roster
+
+	def setBatchResolution(self, threshold=64):
+		'''
+		Resolves actions that hit many characters in bulk: all chances and damage are rolled at once, and HP is written in a single pass.
+		@note Batched actions roll from a different sequence of random numbers than unbatched ones, and log reactions before the hits they go with. Failure conditions and retaliations still happen for each target, in target order, and targets they kill are skipped, just as without batching. Reactions are requested together for each run of hits between failure conditions, so a target can be asked for a reaction and then be killed by an earlier target's retaliation.
+		@param threshold The minimum number of targets for an action to be batched. If None, batching is turned off.
+		@post Actions with at least threshold targets are batched.
+		'''
+		self.batchThreshold = threshold
+
+	def setReactionExecutor(self, executor=None, threads=None):
+		'''
+		Gathers the reactions of every target of an action at once, by submitting each target's getReactionBlock to an executor. Useful when reactions spend their time waiting (on a network, for example). Damage and retaliation are still applied one target at a time, in target order, with the same rolls as usual.
+		@note Reactions are requested before the action is applied to any target, so a reaction cannot depend on what happened to earlier targets. Targets that the action misses are also asked, and their reactions are discarded. While a decisionSource is set, reactions are gathered one at a time.
+		@param executor A concurrent.futures.Executor to submit reactions to. The handler does not shut it down.
+		@param threads If executor is None, the number of threads in a ThreadPoolExecutor created (and owned) by the handler. If both are None, reactions are gathered one at a time again.
+		@post Reactions are gathered with the executor, or one at a time.
+		'''
+		if self._ownsExecutor:
+			self.reactionExecutor.shutdown()
+		self._ownsExecutor = False
+		if executor is None and threads is not None:
+			import concurrent.futures
+			executor = concurrent.futures.ThreadPoolExecutor(threads)
+			self._ownsExecutor = True
+		self.reactionExecutor = executor
+
+	def setActionBudget(self, maxDepth=None, maxFanout=None):
+		'''
+		Limits chains of failure conditions and retaliations. Follow-up actions that go over the budget are skipped, counted in truncatedActions, and logged with messageType "truncated".
+		@param maxDepth The deepest a follow-up action may be. An action chosen on a turn has depth 1, its failure conditions and retaliations have depth 2, and so on. If None, there is no limit.
+		@param maxFanout The number of follow-up actions a single action may lead to. If None, there is no limit.
+		@post Chains are limited to the budget.
+		'''
+		self.maxActionDepth = maxDepth
+		self.maxActionFanout = maxFanout
+
+	def enableProfiling(self):
+		'''
+		Starts counting calls and measuring time (in nanoseconds) in each phase of this handler's turns: getting actions and reactions, enforcing blocks, range checks, rolling, taking damage and logging. Also measures each action by name, and how deep chains of retaliations and failure conditions go.
+		@note Profiling wraps this handler's methods, so it costs nothing while it is disabled.
+		@post The handler is profiled.
+		@return The profiling.Profiler. Use its asDict() or toCSV() to export the results.
+		'''
+		import opencombatflow.profiling as profiling
+		self.disableProfiling()
+		self.profiler = profiling.Profiler()
+		self.profiler.attach(self)
+		return self.profiler
+
+	def disableProfiling(self):
+		'''
+		Stops profiling, if it is enabled. The profiler keeps what it measured.
+		@post The handler is not profiled.
+		'''
+		if self.profiler is None:
+			return
+		self.profiler.detach(self)
+		self.profiler = None
+
+	def reapDead(self):
+		'''
+		Moves every alive character with no HP left to dead. Useful after changing HP in bulk (for example, with Roster.applyDamage). If the handler has a roster, the dead are found with a single vectorized pass.
+		@post No character in alive is dead.
+		@return The characters that were moved to dead.
+		'''
+		if self.roster is not None:
+			newlyDeadCharacters = [character for character in self.roster.findDead() if character in self.alive]
+		else:
+			newlyDeadCharacters = [character for character in self.alive if character.isDead()]
+
+		for character in newlyDeadCharacters:
+			if 'death' not in self._unlogged:
+				self.addLogMessage({'messageType':'death', 'character': character})
+		self._removeDead(newlyDeadCharacters)
+		return newlyDeadCharacters
+
 	def addCharacter(self, character):
 		'''
 		Adds a character to those alive.
@@ -244,7 +710,25 @@ class combatHandler():
 		@post The character has been added.
 		'''
 		self.alive.append(character)
+		if self.spatialIndex is not None:
+			self._indexCharacter(character)
+		if self.groupIndex is not None:
+			self._indexGroups(character)
 	
+	def configureLog(self, maxMessages=None, messageTypes=None, sinks=()):
+		'''
+		Replaces the log with a combatlog.CombatLog, which can be bounded, filtered by messageType, and streamed to sinks. getLog and flushLog keep working as before.
+		@param maxMessages The number of messages to keep. Older messages are discarded. If None, every message is kept.
+		@param messageTypes The messageTypes to record. If None, every message is recorded.
+		@param sinks Callables that are passed each recorded message, such as combatlog.StreamSink or combatlog.FileSink.
+		@post Existing messages are discarded, and new messages go to the new log.
+		@note During run(), messages of types that are not recorded are never built, so addLogMessage is not called for them.
+		@return The new combatlog.CombatLog.
+		'''
+		import opencombatflow.combatlog as combatlog
+		self.log = combatlog.CombatLog(maxMessages, messageTypes, sinks)
+		return self.log
+
 	def addLogMessage(self, message):
 		'''
 		Adds a message to the log.
@@ -269,87 +753,526 @@ class combatHandler():
 		@post No messages remain in the log.
 		'''
 
-		self.log = []
+		if type(self.log) == list:
+			self.log = []
+		else:
+			self.log.clear()
 
 	#Private
 
+	def _startTurn(self):
+		'''
+		PRIVATE: Starts the turn of the current character: logs it, and calls preTurn and _update.
+		@raise Exception If no characters are alive.
+		@return The character whose turn it is.
+		'''
+		if not self.alive:
+			raise Exception("No Characters are alive.")
+
+		#Get the actor (character executing actions)
+		actor = self.alive.current() #The character executing the action.
+
+		#Add log message about the start of the turn.
+		if 'startOfTurn' not in self._unlogged:
+			self.addLogMessage({'messageType':'startOfTurn','character':actor})
+
+		#Do additional things, which do not relate to getting actions.
+		actor.preTurn()
+		actor._update()
+		return actor
+
+	def _endTurn(self, actor):
+		'''
+		PRIVATE: Ends the turn of actor: calls postTurn, and moves to the next character.
+		@param actor The character whose turn it was.
+		'''
+		#Do one more additional thing.
+		actor.postTurn()
+
+		#Go to the next character. If the actor died during its turn, this is the character after it.
+		if self.alive.advance():
+			self.roundCount+=1
+		self.turnCount+=1
+
+	def _startRun(self, max_turns, until, max_rounds):
+		'''
+		PRIVATE: Records where a run starts, and where its limits are. Also looks up the validator and the messageTypes the log ignores, once for the whole run. Call _endRun once the run is over.
+		@raise ValueError If there is no stop condition at all.
+		@return A tuple of the starting turn, round and number of dead, and the last turn and round (or None, for no limit).
+		'''
+		if max_turns is None and until is None and max_rounds is None:
+			raise ValueError("run() needs at least one stop condition.")
+		startTurn = self.turnCount
+		startRound = self.roundCount
+		self._runValidator = self.getValidator()
+		wants = getattr(self.log, 'wants', None) #Only a combatlog.CombatLog can ignore messages.
+		if wants is not None:
+			import opencombatflow.combatlog as combatlog
+			self._unlogged = frozenset(messageType for messageType in combatlog.MESSAGE_TYPES if not wants(messageType))
+		return (startTurn, startRound, len(self.dead), None if max_turns is None else startTurn+max_turns, None if max_rounds is None else startRound+max_rounds)
+
+	def _stopReason(self, until, start):
+		'''
+		PRIVATE: Checks the stop conditions of a run.
+		@param until The predicate, or None.
+		@param start The tuple returned by _startRun.
+		@return The reason for stopping, or None to keep going.
+		'''
+		if until is not None and until(self):
+			return 'until'
+		if start[3] is not None and self.turnCount >= start[3]:
+			return 'max_turns'
+		if start[4] is not None and self.roundCount >= start[4]:
+			return 'max_rounds'
+		if not self.alive:
+			return 'noneAlive'
+		return None
+
+	def _endRun(self):
+		'''
+		PRIVATE: Forgets the lookups made by _startRun, so turns taken outside of run() look them up again.
+		'''
+		self._runValidator = None
+		self._unlogged = frozenset()
+
+	def _summarizeRun(self, start, reason):
+		'''
+		PRIVATE: Builds the RunSummary of a run.
+		@param start The tuple returned by _startRun.
+		@param reason The reason the run stopped.
+		@return A RunSummary.
+		'''
+		groups = tuple(sorted({group for character in self.alive for group in character.groups}))
+		return RunSummary(self.turnCount-start[0], self.roundCount-start[1], reason, len(self.alive), len(self.dead), len(self.dead)-start[2], groups)
+
 	def _executeActionBlock(self, action):
 		'''
-		PRIVATE: Executes action.
+		PRIVATE: Executes action, along with every failure condition and retaliation it leads to. Follow-up actions are kept on an explicit stack instead of the Python call stack, so long chains of retaliations cannot hit the recursion limit. They are executed in exactly the order a recursive executor would use.
 		@param The action to execute.
-		@post The action has been executed.
+		@post The action has been executed, except for follow-up actions that went over the action budget (see setActionBudget).
 		'''
-		import opencombatflow.enforce as enforce
-		enforce.enforce(action, "action")
+		stack = []
+		self._pushAction(stack, action, None)
+		while stack:
+			frame = stack[-1]
+			if frame.pending is not None: #Back from a retaliation, so finish off its target.
+				self._checkDeath(frame.pending)
+				frame.pending = None
+			followUp = self._stepBatched(frame) if frame.batched else self._stepAction(frame)
+			if followUp is None:
+				stack.pop()
+				if self._actionFinished is not None:
+					self._actionFinished(frame.action, frame.depth)
+			else:
+				self._pushAction(stack, followUp, frame)
+
+	def _pushAction(self, stack, action, parent):
+		'''
+		PRIVATE: Starts executing an action, by pushing a frame for it onto stack, to be worked through by _stepAction (or _stepBatched, if the action has enough targets to be batched).
+		@param stack The stack of frames.
+		@param action The action.
+		@param parent The frame of the action that led to this one, or None for an action chosen on a turn.
+		'''
+		#Resolve every target up front, to see if the action should be batched, or to gather reactions for all of them.
+		resolve = self.batchThreshold is not None or self.reactionExecutor is not None
+		frame = self._startAction(action, parent, resolve)
+		if frame is None:
+			return
+		if self.batchThreshold is not None and len(frame.targets) >= self.batchThreshold:
+			frame.batched = True
+			if "chance" in action: #Roll every chance at once.
+				frame.succeeded = self._rollMany(action['chance'], len(frame.targets), return_bool=True)
+			else:
+				frame.succeeded = [True]*len(frame.targets)
+		elif resolve:
+			frame.reactions = self._gatherReactions(frame.targets, action)
+		stack.append(frame)
+
+	def _startAction(self, action, parent, resolve):
+		'''
+		PRIVATE: Checks an action against the action budget, validates it, and makes a frame for it.
+		@param action The action.
+		@param parent The frame of the action that led to this one, or None for an action chosen on a turn.
+		@param resolve Whether to find out which characters are in range right away. Otherwise, each candidate is checked when its turn comes.
+		@return The frame, or None if the action went over the budget, and was skipped.
+		'''
+		depth = 1 if parent is None else parent.depth+1
+		if parent is not None:
+			if self.maxActionDepth is not None and depth > self.maxActionDepth:
+				self._truncate(action, 'depth')
+				return None
+			if self.maxActionFanout is not None and parent.followUps >= self.maxActionFanout:
+				self._truncate(action, 'fanout')
+				return None
+			parent.followUps+=1
+
+		validator = self.getValidator() if self._runValidator is None else self._runValidator
+		validator.enforce(action, "action")
+		if self._actionStarted is not None:
+			self._actionStarted(action, depth)
+		frame = _ActionFrame(action, validator, depth)
 
-		newlyDeadCharacters = []
 		#For each effected character, as determined by their response to the range query, get defense and deal damage
 		range = action['range']
-		for character in self.alive:
-			if character._inRange(range):
+		candidates = self._getCandidates(range)
+		frame.resolved = resolve
+		if resolve:
+			candidates = self._findTargets(candidates, range)
+		frame.targets = list(candidates) #Taken up front, so characters can die while the action executes.
+		return frame
+
+	def _stepAction(self, frame):
+		'''
+		PRIVATE: Works through the targets of an action, until it leads to a follow-up action or runs out of targets.
+		@param frame The frame of the action.
+		@return The follow-up action (a failure condition or retaliation) to execute next, or None if the action is finished.
+		'''
+		action = frame.action
+		targets = frame.targets
+		isTarget = self._isTarget
+		while frame.index < len(targets):
+			i = frame.index
+			character = targets[i]
+			frame.index+=1
+			if character not in self.alive: #Killed by a retaliation earlier in this action.
+				continue
+			if frame.resolved or (character._inRange(action['range']) if isTarget is None else isTarget(character, action['range'])):
 
 				#Chance Handling
-				if "chance" in action: #Check if a chance is specified.
-					if dice.evaluate(action['chance'], return_bool=True) == False: #What happens if the chance fails
-						self.addLogMessage({'messageType':"attackFailure", 'action': action}) #Add a log message regarding the failure.
-						if "failureCondition" in action: #Check to see if a failure condition is specified. 
-							self._executeActionBlock(action['failureCondition']) #Execute the failure condition.
-						continue #Do not get a reaction, do not deal damage.
+				if self._chanceFails(action): #What happens if the chance fails
+					if "failureCondition" in action: #Check to see if a failure condition is specified. 
+						return action['failureCondition'] #Execute the failure condition.
+					continue #Do not get a reaction, do not deal damage.
 				
 				#Gathering reaction and creating damage
-				reaction = character.getReactionBlock(action) #Get the defensive reaction of the effected character.
-				enforce.enforce(reaction, "reaction")
+				reaction = self._getReaction(character, action) if frame.reactions is None else frame.reactions[i] #Get the defensive reaction of the effected character.
+				retaliation = self._hitTarget(frame, character, reaction)
+				if retaliation is not None:
+					return retaliation
+		return None
+
+	def _hitTarget(self, frame, character, reaction):
+		'''
+		PRIVATE: Applies an action to a target it hit.
+		@param frame The frame of the action.
+		@param character The target.
+		@param reaction The target's reaction.
+		@return The target's retaliation, to execute next, or None if it does not retaliate.
+		'''
+		self._applyReaction(character, frame.action, reaction, frame.validator)
+
+		#Retaliation
+		if 'action' in reaction: #Check if an action is specified in the reactionBlock.
+			frame.pending = character #Checked for death once the retaliation is over.
+			return reaction['action']
+		
+		self._checkDeath(character)
+		return None
+
+	def _truncate(self, action, reason):
+		'''
+		PRIVATE: Skips a follow-up action that went over the action budget, and reports it.
+		@param action The skipped action.
+		@param reason "depth" or "fanout".
+		'''
+		self.truncatedActions+=1
+		if 'truncated' not in self._unlogged:
+			self.addLogMessage({'messageType':'truncated', 'action': action, 'reason': reason})
+
+	def _chanceFails(self, action):
+		'''
+		PRIVATE: Rolls the chance of an action against one target, and logs a failure.
+		@param action The action.
+		@return True if the action has a chance, and it failed.
+		'''
+		if "chance" in action: #Check if a chance is specified.
+			if dice.evaluate(action['chance'], return_bool=True, rng=self.rng) == False:
+				if 'attackFailure' not in self._unlogged:
+					self.addLogMessage({'messageType':"attackFailure", 'action': action}) #Add a log message regarding the failure.
+				return True
+		return False
+
+	def _applyReaction(self, character, action, reaction, validator):
+		'''
+		PRIVATE: Deals the damage of an action to one target, reduced by its reaction, and logs the reaction and the hit.
+		@param character The target.
+		@param action The action.
+		@param reaction The target's reaction.
+		@param validator The validator to check blocks with.
+		@post The character has taken damage.
+		'''
+		validator.enforce(reaction, "reaction")
+		if 'reaction' not in self._unlogged:
+			self.addLogMessage({'messageType':'reaction', 'reaction': reaction, 'action': action})
+		damage = self._getDamageBlock(action, reaction) #Get the damage block representing the damage taken by the character.
+		validator.enforce(damage, "damage")
+		self._dealDamage(character, damage, validator) #Cause character to take damage
+		if 'attackHit' not in self._unlogged:
+			self.addLogMessage({'messageType':'attackHit', 'damage': damage, 'action': action}) #Add log message regarding the hit.
+
+	def _checkDeath(self, character):
+		'''
+		PRIVATE: Moves a character to dead, and logs its death, if it has just been killed. Retaliations may already have removed it.
+		@param character The character.
+		'''
+		if character.isDead() and character in self.alive:
+			if 'death' not in self._unlogged:
+				self.addLogMessage({'messageType':'death', 'character': character})
+			self._removeDead((character,))
+
+	def _stepBatched(self, frame):
+		'''
+		PRIVATE: Works through the targets of a batched action, until it leads to a follow-up action or runs out of targets. Has the same effect as _stepAction, but resolves each run of consecutive hits in bulk: their reactions are gathered together, and their damage is rolled and dealt together. A run is only split where a target retaliates, so targets killed by the retaliation are not hit afterwards.
+		@param frame The frame of the action. Its chances are already rolled.
+		@return The follow-up action (a failure condition or retaliation) to execute next, or None if the action is finished.
+		'''
+		action = frame.action
+		targets = frame.targets
+		while True:
+			#Resolve the hits gathered so far, up to and including the first one that retaliates.
+			if frame.run:
+				run = [(character, reaction) for character, reaction in frame.run if character in self.alive] #Follow-ups may have killed some of them.
+				retaliation = next((i for i, (character, reaction) in enumerate(run) if 'action' in reaction), None)
+				if retaliation is None:
+					chunk, frame.run = run, []
+				else:
+					chunk, frame.run = run[:retaliation+1], run[retaliation+1:]
+				self._resolveHits(action, chunk, frame.validator)
+				for character, reaction in chunk[:retaliation]: #The retaliating target is checked once its retaliation is over.
+					self._checkDeath(character)
+				if retaliation is not None:
+					character, reaction = chunk[-1]
+					frame.pending = character
+					return reaction['action']
+				continue
+
+			if frame.index >= len(targets):
+				return None
+			i = frame.index
+			if targets[i] not in self.alive: #Killed by a follow-up earlier in this action.
+				frame.index+=1
+				continue
+
+			#Chance Handling. Failures are handled in target order, as usual.
+			if not frame.succeeded[i]:
+				frame.index+=1
+				if 'attackFailure' not in self._unlogged:
+					self.addLogMessage({'messageType':"attackFailure", 'action': action})
+				if "failureCondition" in action:
+					return action['failureCondition']
+				continue
+
+			#Gather the run of hits starting here, and all of their reactions. Misses only end the run if they lead to a failure condition.
+			hit = []
+			while frame.index < len(targets):
+				character = targets[frame.index]
+				if frame.succeeded[frame.index]:
+					if character in self.alive:
+						hit.append(character)
+				elif "failureCondition" in action:
+					break
+				elif character in self.alive and 'attackFailure' not in self._unlogged:
+					self.addLogMessage({'messageType':"attackFailure", 'action': action})
+				frame.index+=1
+			reactions = self._gatherReactions(hit, action)
+			if reactions is None:
+				reactions = [self._getReaction(character, action) for character in hit]
+			frame.run = list(zip(hit, reactions))
+
+	def _resolveHits(self, action, run, validator):
+		'''
+		PRIVATE: Deals the damage of an action to many targets at once, reduced by their reactions, and logs the reactions and the hits. Deaths and retaliations are left to the caller.
+		@param action The action.
+		@param run A list of (character, reaction) pairs.
+		@param validator The validator to check blocks with.
+		@post The characters have taken damage.
+		'''
+		import opencombatflow.enforce as enforce
+
+		NO_EFFECTS_ON_0_DAMAGE = True #Whether or not effects should be dealt if 0 damage is dealt. Matches DamagePlan.roll.
+
+		if run == []:
+			return
+		hit = [character for character, reaction in run]
+		reactions = [reaction for character, reaction in run]
+		logReactions = 'reaction' not in self._unlogged
+		for reaction in reactions:
+			validator.enforce(reaction, "reaction")
+			if logReactions:
 				self.addLogMessage({'messageType':'reaction', 'reaction': reaction, 'action': action})
-				damage = self._getDamageBlock(action, reaction) #Get the damage block representing the damage taken by the character.
-				enforce.enforce(damage, "damage")
-				character._takeDamage(damage) #Cause character to take damage
-				self.addLogMessage({'messageType':'attackHit', 'damage': damage, 'action': action}) #Add log message regarding the hit.
-
-				#Retaliation
-				if 'action' in reaction: #Check if an action is specified in the reactionBlock.
-					self._executeActionBlock(reaction['action'])
-				
-				#See if the character was killed by this action.
-				if character.isDead():
-					newlyDeadCharacters.append(character)
-					self.addLogMessage({'messageType':'death', 'character': character})
 
-		#Kill Dead characters. We can't do this from within the above for loop, because it would mess up the comprehension.
+		#Roll damage for every target at once, one damage type at a time. Targets that share a resistance are rolled together.
+		totals = [0]*len(hit)
+		for dType in action['damage']:
+			damage = self._rollMany(action['damage'][dType], len(hit))
+			resisted = {}
+			for i, reaction in enumerate(reactions):
+				if 'resistance' in reaction and dType in reaction['resistance']:
+					resisted.setdefault(reaction['resistance'][dType], []).append(i)
+				else:
+					totals[i]+=damage[i]
+			for resistance, indexes in resisted.items():
+				for i, rolled in zip(indexes, self._rollMany(resistance, len(indexes))):
+					totals[i]+=max(0, damage[i]-rolled)
+
+		#Build the damage blocks, rolling each effect for every target at once.
+		damageBlocks = [{'damageTaken': total} for total in totals]
+		if "effects" in action:
+			for damage in damageBlocks:
+				damage['effects'] = {}
+			affected = [damage for damage in damageBlocks if not (damage['damageTaken'] == 0 and NO_EFFECTS_ON_0_DAMAGE)]
+			for effect in action['effects']:
+				for damage, duration in zip(affected, self._rollMany(action['effects'][effect], len(affected))):
+					damage['effects'][effect] = duration
+		validator.enforce(damageBlocks[0], "damage") #Every damage block is built the same way, so checking one is enough.
+
+		#Apply all damage in a single pass.
+		if self.roster is not None and all(getattr(character, '_roster', None) is self.roster for character in hit):
+			self.roster.applyDamage(hit, totals)
+			if "effects" in action:
+				for character, damage in zip(hit, damageBlocks):
+					self._dealDamage(character, {'effects': damage['effects']}, enforce.trustedValidator)
+		else:
+			for character, damage in zip(hit, damageBlocks):
+				self._dealDamage(character, damage, enforce.trustedValidator)
+		if 'attackHit' not in self._unlogged:
+			for damage in damageBlocks:
+				self.addLogMessage({'messageType':'attackHit', 'damage': damage, 'action': action})
+
+	def _getAction(self, actor):
+		'''
+		PRIVATE: Gets the action of the character whose turn it is, from the decisionSource if there is one.
+		@param actor The character whose turn it is.
+		@return The actionBlock.
+		'''
+		if self.decisionSource is None:
+			return actor.getActionBlock()
+		return self.decisionSource.getActionBlock(actor)
+
+	def _getReaction(self, character, action):
+		'''
+		PRIVATE: Gets the reaction of a character to an action, from the decisionSource if there is one.
+		@param character The character reacting.
+		@param action The action being reacted to.
+		@return The reactionBlock.
+		'''
+		if self.decisionSource is None:
+			return character.getReactionBlock(action)
+		return self.decisionSource.getReactionBlock(character, action)
+
+	def _gatherReactions(self, characters, action):
+		'''
+		PRIVATE: Gets the reactions of several characters at once, with the reactionExecutor.
+		@param characters The characters reacting.
+		@param action The action being reacted to.
+		@return A list of reactionBlocks, in the same order as characters. None if reactions should be gathered one at a time instead.
+		'''
+		if self.reactionExecutor is None or self.decisionSource is not None or len(characters) < 2:
+			return None
+		futures = [self.reactionExecutor.submit(character.getReactionBlock, action) for character in characters]
+		return [future.result() for future in futures]
+
+	def _rollMany(self, diceString, n, return_bool=False):
+		'''
+		PRIVATE: Rolls a dice string n times, using the handler's random stream. Uses vectorized rolling if NumPy is installed.
+		@param diceString The dice string to roll.
+		@param n The number of results.
+		@param return_bool Set this to true to return boolean values instead of numbers.
+		@return A list of n results.
+		'''
+		expression = dice.parse(diceString)
+		if n == 0:
+			return []
+		if type(expression) == dice.ConstantExpression: #Ints are not rolled, so the random stream is left alone, as in the serial path.
+			return [expression.evaluate(return_bool)]*n
+		if dice.numpy is not None:
+			generator = dice.numpy.random.default_rng(self.rng.getrandbits(64)) #Seeded from the handler's stream, so results stay reproducible.
+			return expression.evaluateMany(n, return_bool, generator).tolist()
+		return [expression.evaluate(return_bool, self.rng) for i in range(n)]
+
+	def _findTargets(self, candidates, range):
+		'''
+		PRIVATE: Filters characters down to those in range.
+		@param candidates The characters to test.
+		@param range The rangeBlock, already checked by the caller.
+		@return A list of the candidates in range, in order.
+		'''
+		return [character for character in candidates if character._inRange(range)]
+
+	def _dealDamage(self, character, damage, validator):
+		'''
+		PRIVATE: Makes a character take a damageBlock.
+		'''
+		character._takeDamage(damage, validator)
+
+	def _removeDead(self, newlyDeadCharacters):
+		'''
+		PRIVATE: Moves characters from alive to dead, and removes them from any indexes. Characters that are not alive are ignored, so nobody is moved twice.
+		@param newlyDeadCharacters The characters that died.
+		@post The characters are in dead, and not in alive.
+		'''
 		for character in newlyDeadCharacters:
+			if character not in self.alive:
+				continue
 			self.alive.remove(character)
 			self.dead.append(character)
+			if self.spatialIndex is not None:
+				self._unindexCharacter(character)
+			if self.groupIndex is not None:
+				self._unindexGroups(character)
+
+	def _getCandidates(self, range):
+		'''
+		PRIVATE: Gets the characters that may be in range. Uses the group and spatial indexes, if there are any and the range specifies a group or an area. If both apply, the smaller candidate list is used.
+		@param range A rangeBlock.
+		@return The characters to test with _inRange, in the same order as alive.
+		'''
+		candidates = self.alive
+		if self.groupIndex is not None and "group" in range:
+			candidates = self.groupIndex.query(range['group'])
+		if self.spatialIndex is not None and "center" in range and "distance" in range:
+			nearby = self.spatialIndex.query(range['center'], range['distance'])
+			if len(nearby) < len(candidates):
+				candidates = nearby
+		return candidates
+
+	def _indexCharacter(self, character):
+		'''
+		PRIVATE: Adds a character to the spatial index, and subscribes the index to the character's moves.
+		'''
+		self.spatialIndex.insert(character)
+		character._positionListeners = character._positionListeners+(self.spatialIndex,)
+
+	def _unindexCharacter(self, character):
+		'''
+		PRIVATE: Removes a character from the spatial index, and unsubscribes the index from the character's moves.
+		'''
+		self.spatialIndex.remove(character)
+		character._positionListeners = tuple(listener for listener in character._positionListeners if listener is not self.spatialIndex)
+
+	def _indexGroups(self, character):
+		'''
+		PRIVATE: Adds a character to the group index, and subscribes the index to the character's group changes.
+		'''
+		self.groupIndex.insert(character)
+		character._groupListeners = character._groupListeners+(self.groupIndex,)
+
+	def _unindexGroups(self, character):
+		'''
+		PRIVATE: Removes a character from the group index, and unsubscribes the index from the character's group changes.
+		'''
+		self.groupIndex.remove(character)
+		character._groupListeners = tuple(listener for listener in character._groupListeners if listener is not self.groupIndex)
 				
 	def _getDamageBlock(self, action, reaction):
 		'''
 		PRIVATE: Get damage
 		@param action The action to get damage from.
 		@param reaction The reaction to reduce damage with.
+		@return The damageBlock.
 		'''
-		import opencombatflow.enforce as enforce
-		enforce.enforce(action, "action")
-		enforce.enforce(reaction, "reaction")
-		
-		NO_EFFECTS_ON_0_DAMAGE = True #Whether or not effects should be dealt if 0 damage is dealt.
+		validator = self.getValidator() if self._runValidator is None else self._runValidator
+		validator.enforce(action, "action")
+		validator.enforce(reaction, "reaction")
 		
-		toReturn = {}
-
-		#Look through each key in action['damage'], and see if the reaction has an associated resistance. If not, add it to the total HP lost. If so, subtract resistance and add it to total HP lost.
-		total = 0
-		for dType in action['damage']: #Loop through the set of all keys in the damage set.
-			if 'resistance' in reaction and dType in reaction['resistance']: #See if that key is in the resistance.
-				total+=max(0, dice.evaluate(action['damage'][dType])-dice.evaluate(reaction['resistance'][dType])) #If so, add that to the total (with minimum being 0).
-			else:
-				total+=dice.evaluate(action['damage'][dType]) #Otherwise, just add the total damage amount 
-		toReturn['damageTaken'] = total #Add it to the damageBlock.
-
-		#Handle effects
-		if "effects" in action: #Only do this if effects are specified.
-			toReturn['effects'] = {}
-			if not (total == 0 and NO_EFFECTS_ON_0_DAMAGE): #Also, only do it if the NO_EFFECTS_ON_0_DAMAGE clause doesn't hold.
-				for effect in action['effects']:
-					toReturn['effects'][effect] = dice.evaluate(action['effects'][effect])
-				#toReturn['effects'] = dice.evaluate(action['effects']) #Add it to the damage block.
-		
-		return toReturn
-
-
+		return damagePlan(action, reaction).roll(self.rng) #Compiled once per weapon and armor.
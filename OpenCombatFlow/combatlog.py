@@ -0,0 +1,157 @@
+'''
+Open Combat Flow - combatlog.py
+@purpose Defines the CombatLog, a bounded log of logBlocks with filtering by messageType and pluggable sinks, and a few ready-made sinks.
+@note A CombatLog can be used wherever the combatHandler's log list was used: it supports append, len, iteration and indexing.
+@author Owen Mellema
+@date 2-25-19
+'''
+import collections
+import json
+
+MESSAGE_TYPES = ('startOfTurn', 'action', 'attackHit', 'attackFailure', 'reaction', 'death', 'truncated') #Every valid messageType, as listed in the DSD.
+
+class CombatLog():
+	'''
+	A log of logBlocks. Only the most recent messages are kept, and every message is also passed to each sink as it arrives.
+	'''
+
+	def __init__(self, maxMessages = None, messageTypes = None, sinks = ()):
+		'''
+		Creates an empty log.
+		@param maxMessages The number of messages to keep. Older messages are discarded. If None, every message is kept.
+		@param messageTypes The messageTypes to record. Messages of other types are ignored completely. If None, every message is recorded.
+		@param sinks Callables that are passed each recorded message, in order.
+		'''
+		self._messages = collections.deque(maxlen=maxMessages)
+		self.messageTypes = None if messageTypes is None else frozenset(messageTypes)
+		self.sinks = list(sinks)
+
+	def append(self, message):
+		'''
+		Records a message, if its messageType is wanted.
+		@param message The logBlock to record.
+		@post The message is in the log, and has been passed to every sink.
+		'''
+		if self.messageTypes is not None and message['messageType'] not in self.messageTypes:
+			return
+		self._messages.append(message)
+		for sink in self.sinks:
+			sink(message)
+
+	def wants(self, messageType):
+		'''
+		Returns whether messages of a given type are recorded. Lets callers skip building messages that would be ignored.
+		@param messageType The messageType to check.
+		@return True if messages of that type are recorded.
+		'''
+		return self.messageTypes is None or messageType in self.messageTypes
+
+	def addSink(self, sink):
+		'''
+		Adds a sink.
+		@param sink A callable that is passed each recorded message.
+		@post The sink receives every message recorded from now on.
+		'''
+		self.sinks.append(sink)
+
+	def removeSink(self, sink):
+		'''
+		Removes a sink. Nothing happens if it was not added.
+		@param sink The sink to remove.
+		@post The sink receives no more messages.
+		'''
+		if sink in self.sinks:
+			self.sinks.remove(sink)
+
+	def clear(self):
+		'''
+		Removes all messages currently in the log. Sinks are not affected.
+		@post No messages remain in the log.
+		'''
+		self._messages.clear()
+
+	def __len__(self):
+		return len(self._messages)
+
+	def __iter__(self):
+		return iter(self._messages)
+
+	def __getitem__(self, index):
+		if type(index) == slice:
+			return list(self._messages)[index]
+		return self._messages[index]
+
+	def __repr__(self):
+		return f"CombatLog({list(self._messages)})"
+
+class StreamSink():
+	'''
+	A sink that queues messages for a consumer. Iterating over it yields (and removes) every message queued so far, so a consumer can drain it as often as it likes.
+	'''
+
+	def __init__(self, maxPending = None):
+		'''
+		Creates an empty stream.
+		@param maxPending The number of messages to hold before the oldest are discarded. If None, every message is held until consumed.
+		'''
+		self._pending = collections.deque(maxlen=maxPending)
+
+	def __call__(self, message):
+		self._pending.append(message)
+
+	def __iter__(self):
+		while self._pending:
+			yield self._pending.popleft()
+
+	def __len__(self):
+		return len(self._pending)
+
+class FileSink():
+	'''
+	A sink that appends each message to a file, as one line of JSON. Characters and blocks are written as summaries (see summarize()), so the file holds no live references.
+	'''
+
+	def __init__(self, path):
+		'''
+		Opens a file for appending.
+		@param path The path of the file.
+		'''
+		self.path = path
+		self._file = open(path, 'a')
+
+	def __call__(self, message):
+		self._file.write(json.dumps(summarize(message), default=str)+"\n")
+
+	def flush(self):
+		'''
+		Writes any buffered messages to disk.
+		'''
+		self._file.flush()
+
+	def close(self):
+		'''
+		Closes the file.
+		@post No more messages can be written.
+		'''
+		self._file.close()
+
+def summarize(message):
+	'''
+	Turns a logBlock into a plain dictionary with no live references: characters become their names, and actions and reactions become their names.
+	@param message The logBlock to summarize.
+	@return A dictionary that can be stored or serialized safely.
+	'''
+	summary = {'messageType': message['messageType']}
+	if 'character' in message:
+		summary['character'] = message['character'].name
+	if 'action' in message:
+		summary['action'] = message['action'].get('name')
+		summary['user'] = message['action']['user'].name if 'user' in message['action'] else None
+	if 'reaction' in message:
+		summary['reaction'] = message['reaction'].get('name')
+	if 'damage' in message:
+		summary['damageTaken'] = message['damage'].get('damageTaken', 0)
+		summary['effects'] = dict(message['damage'].get('effects', {}))
+	if 'reason' in message:
+		summary['reason'] = message['reason']
+	return summary
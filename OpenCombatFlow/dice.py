@@ -6,19 +6,186 @@ Open Combat Flow - dice.py
 @date 2-25-19
 '''
 import random
+import functools
+import collections
 
-def evaluate(to_eval, return_bool = False, failure_value = 0):
+try:
+	import numpy
+except ImportError: #NumPy is optional, and only needed for evaluate_many.
+	numpy = None
+
+PARSE_CACHE_SIZE = 1024 #The maximum number of distinct dice strings kept in the parse cache.
+BATCH_CHUNK_SIZE = 2**22 #The maximum number of individual dice drawn at once by evaluate_many.
+
+class DiceTerms(collections.namedtuple('DiceTerms', ['dice', 'constant'])):
+	'''
+	One side of a compiled dice string (IE, a dice string with no conditionals).
+	dice is a tuple of (numberDice, numberSides) pairs, in the order they appear in the string. constant is the sum of all constants.
+	'''
+	__slots__ = ()
+
+	def roll(self, rng = None):
+		'''
+		Roll the dice, and add the constant.
+		@param rng The random generator to draw from. If None, the global random module is used.
+		@return The result of rolling the dice.
+		'''
+		total = self.constant
+		for numberDice, numberSides in self.dice:
+			total+=_roll(numberDice, numberSides, rng)
+		return total
+
+	def rollMany(self, n, rng):
+		'''
+		Roll the dice n independent times, using vectorized generation.
+		@param n The number of results to generate.
+		@param rng The numpy.random.Generator to draw from.
+		@return A numpy array of n results.
+		'''
+		total = numpy.full(n, self.constant, dtype=numpy.int64)
+		for numberDice, numberSides in self.dice:
+			total+=_rollMany(numberDice, numberSides, n, rng)
+		return total
+
+class DiceExpression(collections.namedtuple('DiceExpression', ['pre', 'comparator', 'suf', 'failure_value'])):
+	'''
+	A compiled dice string, as returned by parse().
+	pre is the DiceTerms before the conditional. comparator is one of ">", "<", "=" or None, if there is no conditional. suf is the DiceTerms after the conditional, or None. failure_value is the value to return on a failure.
+	'''
+	__slots__ = ()
+
+	def evaluate(self, return_bool = False, rng = None):
+		'''
+		Roll the compiled dice string. Behaves exactly like evaluate() does for the string this was compiled from.
+		@param return_bool Set this to true to return a boolean value instead of a number.
+		@param rng The random generator to draw from. If None, the global random module is used.
+		@return The result of rolling the dice.
+		'''
+		if self.comparator is None:
+			if return_bool:
+				return True
+			else:
+				return self.pre.roll(rng)
+
+		#Get values before and after the conditional.
+		pre = self.pre.roll(rng)
+		suf = self.suf.roll(rng)
+
+		#Return an appropriate value based upon the conditional and the value of pre and suf.
+		if self.comparator == ">":
+			success = pre > suf
+		elif self.comparator == "<":
+			success = pre < suf
+		else:
+			success = pre == suf
+
+		if return_bool:
+			return success
+		elif success:
+			return pre
+		else:
+			return self.failure_value
+
+	def evaluateMany(self, n, return_bool = False, rng = None):
+		'''
+		Roll the compiled dice string n independent times. Each result behaves like a call to evaluate().
+		@param n The number of results to generate.
+		@param return_bool Set this to true to return boolean values instead of numbers.
+		@param rng The numpy.random.Generator to draw from. A new one is created if this is None.
+		@raise ImportError If NumPy is not installed.
+		@return A numpy array of n results.
+		'''
+		rng = _getGenerator(rng)
+
+		if self.comparator is None:
+			if return_bool:
+				return numpy.ones(n, dtype=bool)
+			else:
+				return self.pre.rollMany(n, rng)
+
+		#Get values before and after the conditional.
+		pre = self.pre.rollMany(n, rng)
+		suf = self.suf.rollMany(n, rng)
+
+		#Build the mask of successes based upon the conditional.
+		if self.comparator == ">":
+			success = pre > suf
+		elif self.comparator == "<":
+			success = pre < suf
+		else:
+			success = pre == suf
+
+		if return_bool:
+			return success
+		else:
+			return numpy.where(success, pre, self.failure_value)
+
+class ConstantExpression(DiceExpression):
+	'''
+	A compiled int, as returned by parse() for an int. Like evaluate(), it always evaluates to the int itself, even when return_bool is set, so as a chance it only succeeds if the int is not 0.
+	'''
+	__slots__ = ()
+
+	def evaluate(self, return_bool = False, rng = None):
+		'''
+		Returns the int. See DiceExpression.evaluate.
+		'''
+		return self.pre.constant
+
+	def evaluateMany(self, n, return_bool = False, rng = None):
+		'''
+		Returns the int n times. With return_bool, each result is whether the int is not 0. See DiceExpression.evaluateMany.
+		@raise ImportError If NumPy is not installed.
+		'''
+		_getGenerator(rng) #Only checks for NumPy. Nothing is drawn.
+		if return_bool:
+			return numpy.full(n, self.pre.constant != 0)
+		return numpy.full(n, self.pre.constant, dtype=numpy.int64)
+
+def evaluate(to_eval, return_bool = False, failure_value = 0, rng = None):
 	'''
 	Evaluate a dice string, and return a number consistent with the query (IE, roll the dice)
 	@param to_eval The dice string to be evaluated. If this is an int, it will be returned with nothing else being done
 	@param return_bool Set this to true to return a boolean value instead of a number.
 	@param failure_value The value to return on a failure.
+	@param rng A random.Random (or anything with a randrange method) to roll with. If None, the global random module is used.
 	@return The result of rolling the dice.
 	'''
 	
 	if type(to_eval)==int:
 		return to_eval
 
+	return parse(to_eval, failure_value).evaluate(return_bool, rng)
+
+def evaluate_many(dice_string, n, rng = None, return_bool = False, failure_value = 0):
+	'''
+	Evaluate a dice string n independent times at once. Much faster than calling evaluate() in a loop.
+	@note This requires NumPy.
+	@param dice_string The dice string to be evaluated. An int is also accepted.
+	@param n The number of results to generate.
+	@param rng A numpy.random.Generator, or a seed for a new one. If None, a freshly seeded generator is used.
+	@param return_bool Set this to true to return boolean values instead of numbers.
+	@param failure_value The value to return on a failure.
+	@raise ImportError If NumPy is not installed.
+	@return A numpy array of n results.
+	'''
+
+	return parse(dice_string, failure_value).evaluateMany(n, return_bool, rng)
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse(to_eval, failure_value = 0):
+	'''
+	Compile a dice string into a DiceExpression, which can be rolled many times without being parsed again.
+	@note Results are kept in a bounded LRU cache, keyed by the string and failure value. Use parse.cache_clear() to empty it.
+	@param to_eval The dice string to be compiled. If this is an int, a ConstantExpression is returned, which always evaluates to it.
+	@param failure_value The value to return on a failure.
+	@raise ValueError If the dice string cannot be parsed.
+	@return The compiled DiceExpression.
+	'''
+
+	if type(to_eval)==int:
+		return ConstantExpression(DiceTerms((), to_eval), None, None, failure_value)
+
 	if ">" in to_eval:
 		condChar = ">"
 	elif "<" in to_eval:
@@ -26,87 +193,85 @@ def evaluate(to_eval, return_bool = False, failure_value = 0):
 	elif "=" in to_eval:
 		condChar = "="
 	else:
-		if return_bool:
-			return True
-		else:
-			return _evaluateHelper(to_eval)
+		return DiceExpression(_parseTerms(to_eval), None, None, failure_value)
 
-	#Get values before and after the conditional.
-	pre = _evaluateHelper(to_eval.split(condChar)[0])
-	suf = _evaluateHelper(to_eval.split(condChar)[1])
+	#Compile values before and after the conditional.
+	pre = _parseTerms(to_eval.split(condChar)[0])
+	suf = _parseTerms(to_eval.split(condChar)[1])
+	return DiceExpression(pre, condChar, suf, failure_value)
 
-	#Return an appropriate value based upon the conditional and the value of pre and suf.
-	if condChar == ">":
-		if pre > suf:
-			if return_bool:
-				return True
-			else:
-				return pre
-		else:
-			if return_bool:
-				return False
-			else:
-				return failure_value
-	elif condChar == "<":
-		if pre < suf:
-			if return_bool:
-				return True
-			else:
-				return pre
-		else:
-			if return_bool:
-				return False
-			else:
-				return failure_value
-	elif condChar == "=":
-		if pre == suf:
-			if return_bool:
-				return True
-			else:
-				return pre
-		else:
-			if return_bool:
-				return False
-			else:
-				return failure_value
-
-def _roll(to_roll):
+def _roll(numberDice, numberSides, rng = None):
 	'''
-	Pass in a string which contains only a dice statement (to_roll), and return a number consistent with the query.
-	@param to_roll A dice string in the form "XdY", where X and Y are integers. Note that X may be negative, but Y cannot be. (How would tht work?)
+	PRIVATE: Roll numberDice dice, each with numberSides sides, and return the sum.
+	@param numberDice The number of dice to roll. Note that this may be negative, but numberSides cannot be. (How would tht work?)
+	@param numberSides The number of sides on each die.
+	@param rng The random generator to draw from. If None, the global random module is used.
 	@return The result of rolling the dice.
 	'''
-	numberDice = int(to_roll.split('d')[0])
-	numberSides = int(to_roll.split('d')[1])
-	
+	randrange = (random if rng is None else rng).randrange
 	total = 0
 	for i in range(abs(numberDice)):
-		total+=random.randrange(1, numberSides+1)
+		total+=randrange(1, numberSides+1)
 	
 	if numberDice < 0: #If there was a negative number of dice.
 		return -1*total
 	
 	return total
 	
-def _evaluateHelper(to_eval):
+def _rollMany(numberDice, numberSides, n, rng):
+	'''
+	PRIVATE: Roll numberDice dice, each with numberSides sides, n independent times.
+	@param numberDice The number of dice to roll. Note that this may be negative.
+	@param numberSides The number of sides on each die.
+	@param n The number of results to generate.
+	@param rng The numpy.random.Generator to draw from.
+	@return A numpy array of n sums.
+	'''
+	total = numpy.zeros(n, dtype=numpy.int64)
+	remaining = abs(numberDice)
+	chunk = max(1, BATCH_CHUNK_SIZE//max(n, 1)) #Roll several dice per draw, without building an array bigger than BATCH_CHUNK_SIZE.
+	while remaining > 0:
+		rows = min(chunk, remaining)
+		total+=rng.integers(1, numberSides+1, size=(rows, n), dtype=numpy.int64).sum(axis=0)
+		remaining-=rows
+
+	if numberDice < 0: #If there was a negative number of dice.
+		return -total
+	
+	return total
+
+def _getGenerator(rng):
+	'''
+	PRIVATE: Get a numpy random generator.
+	@param rng A numpy.random.Generator, a seed, or None.
+	@raise ImportError If NumPy is not installed.
+	@return A numpy.random.Generator.
 	'''
-	PRIVATE: A Helper function for evaluating dice strings.
+	if numpy is None:
+		raise ImportError("NumPy is required for batch dice rolling.")
+	if isinstance(rng, numpy.random.Generator):
+		return rng
+	return numpy.random.default_rng(rng)
+
+def _parseTerms(to_eval):
+	'''
+	PRIVATE: A Helper function for compiling dice strings.
 	@param to_eval A dice string with no conditionals.
-	@return the result of rolling the dice.
+	@return A DiceTerms representing the string.
 	'''
 	
 	#Convert all "-" into "+-"
 	to_eval_ready = "+-".join(to_eval.split('-'))
 
-	#Evaluate the new string.
-	total = 0
+	#Compile the new string.
+	dice = []
+	constant = 0
 	for statement in to_eval_ready.split('+'):
 		#See if the statement is a dice statement, by testing if there is a 'd' in it.
 		if "d" in statement:
-			total+=_roll(statement)
+			dice.append((int(statement.split('d')[0]), int(statement.split('d')[1])))
 		elif statement == "":
 			pass
 		else: #Otherwise, we assume that it is a constant.
-			total+=int(statement)
-	return total
-	
+			constant+=int(statement)
+	return DiceTerms(tuple(dice), constant)
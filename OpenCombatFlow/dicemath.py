@@ -0,0 +1,264 @@
+'''
+Open Combat Flow - dicemath.py
+@purpose Computes the exact probability distribution of dice strings, without rolling any dice.
+@note Dice strings are compiled with dice.parse(), so they follow the format documented in DiceStringFormat.txt. All probabilities are returned as exact Fractions.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.dice as dice
+import decimal
+import functools
+import sys
+from fractions import Fraction
+
+DISTRIBUTION_CACHE_SIZE = 256 #The maximum number of distinct dice strings whose distributions are kept.
+DICE_COUNTS_CACHE_SIZE = 64 #The maximum number of distributions of sums of dice (such as 8d6) that are kept.
+PACKED_CONVOLUTION_THRESHOLD = 64 #Convolutions where both lists are at least this long are done as a single multiplication of packed numbers.
+
+_packingContext = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX) #Exact arithmetic for packed convolutions. decimal multiplies very large numbers much faster than int does.
+
+class Distribution():
+	'''
+	The exact distribution of the values returned by dice.evaluate() for a single dice string.
+	'''
+
+	def __init__(self, ways, total, successWays):
+		'''
+		Creates a distribution. Use distribution() instead of calling this directly.
+		@param ways A dictionary mapping each possible value to the number of equally likely outcomes that produce it.
+		@param total The total number of equally likely outcomes.
+		@param successWays The number of outcomes in which the conditional (if any) succeeds.
+		'''
+		self._ways = ways
+		self._total = total
+		self._successWays = successWays
+		self._pmf = None #Computed the first time each is asked for.
+		self._mean = None
+		self._variance = None
+
+	def pmf(self):
+		'''
+		Returns the probability mass function.
+		@return A dictionary mapping each possible value, in ascending order, to the probability of rolling it.
+		'''
+		if self._pmf is None:
+			self._pmf = {value: Fraction(self._ways[value], self._total) for value in sorted(self._ways)}
+		return dict(self._pmf)
+
+	def cdf(self, value):
+		'''
+		Returns the probability of rolling at most value.
+		@param value The value to compare against.
+		@return P(result <= value)
+		'''
+		return Fraction(sum(ways for result, ways in self._ways.items() if result <= value), self._total)
+
+	def mean(self):
+		'''
+		Returns the expected value.
+		@return The mean of the distribution.
+		'''
+		if self._mean is None:
+			self._mean = Fraction(sum(value*ways for value, ways in self._ways.items()), self._total)
+		return self._mean
+
+	def variance(self):
+		'''
+		Returns the variance.
+		@return The variance of the distribution.
+		'''
+		if self._variance is None:
+			mean = self.mean()
+			self._variance = Fraction(sum(value*value*ways for value, ways in self._ways.items()), self._total) - mean*mean
+		return self._variance
+
+	def probability(self):
+		'''
+		Returns the probability that the conditional succeeds. (IE, that dice.evaluate() would return True when return_bool is set.)
+		@return The probability of success. Always 1 if there is no conditional, except for the int 0, which never succeeds.
+		'''
+		return Fraction(self._successWays, self._total)
+
+@functools.lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def distribution(to_eval, failure_value = 0):
+	'''
+	Computes the exact distribution of a dice string.
+	@param to_eval The dice string to analyze. An int is also accepted.
+	@param failure_value The value returned on a failure, as in dice.evaluate().
+	@raise ValueError If the dice string cannot be parsed.
+	@return A Distribution.
+	'''
+	expression = dice.parse(to_eval, failure_value)
+
+	preOffset, preCounts = _termsCounts(expression.pre)
+	preTotal = sum(preCounts)
+	if expression.comparator is None:
+		ways = {preOffset+i: count for i, count in enumerate(preCounts) if count}
+		if type(expression) == dice.ConstantExpression and expression.pre.constant == 0: #An int chance of 0 never succeeds, as in dice.evaluate().
+			return Distribution(ways, preTotal, 0)
+		return Distribution(ways, preTotal, preTotal)
+
+	sufOffset, sufCounts = _termsCounts(expression.suf)
+	sufTotal = sum(sufCounts)
+
+	#Cumulative counts of the value after the conditional. below[i] is the number of outcomes where suf < sufOffset+i.
+	below = [0]
+	for count in sufCounts:
+		below.append(below[-1]+count)
+
+	#For each value before the conditional, count the outcomes after the conditional that make it succeed.
+	ways = {}
+	successWays = 0
+	for i, count in enumerate(preCounts):
+		if count == 0:
+			continue
+		pre = preOffset+i
+		if expression.comparator == ">":
+			succeeded = below[_clamp(pre-sufOffset, 0, len(sufCounts))]
+		elif expression.comparator == "<":
+			succeeded = sufTotal-below[_clamp(pre-sufOffset+1, 0, len(sufCounts))]
+		else:
+			succeeded = sufCounts[pre-sufOffset] if 0 <= pre-sufOffset < len(sufCounts) else 0
+
+		if succeeded:
+			ways[pre] = ways.get(pre, 0)+count*succeeded
+			successWays+=count*succeeded
+		if succeeded != sufTotal:
+			ways[failure_value] = ways.get(failure_value, 0)+count*(sufTotal-succeeded)
+
+	return Distribution(ways, preTotal*sufTotal, successWays)
+
+def pmf(to_eval, failure_value = 0):
+	'''
+	Returns the probability mass function of a dice string.
+	@param to_eval The dice string to analyze.
+	@param failure_value The value returned on a failure.
+	@return A dictionary mapping each possible value to the probability of rolling it.
+	'''
+	return distribution(to_eval, failure_value).pmf()
+
+def cdf(to_eval, value, failure_value = 0):
+	'''
+	Returns the probability that a dice string rolls at most value.
+	@param to_eval The dice string to analyze.
+	@param value The value to compare against.
+	@param failure_value The value returned on a failure.
+	@return P(result <= value)
+	'''
+	return distribution(to_eval, failure_value).cdf(value)
+
+def mean(to_eval, failure_value = 0):
+	'''
+	Returns the expected value of a dice string.
+	@param to_eval The dice string to analyze.
+	@param failure_value The value returned on a failure.
+	@return The mean.
+	'''
+	return distribution(to_eval, failure_value).mean()
+
+def variance(to_eval, failure_value = 0):
+	'''
+	Returns the variance of a dice string.
+	@param to_eval The dice string to analyze.
+	@param failure_value The value returned on a failure.
+	@return The variance.
+	'''
+	return distribution(to_eval, failure_value).variance()
+
+def probability(to_eval):
+	'''
+	Returns the probability that dice.evaluate(to_eval, return_bool=True) returns True.
+	@param to_eval The dice string to analyze.
+	@return The chance of success.
+	'''
+	return distribution(to_eval).probability()
+
+#Private
+
+def _clamp(value, low, high):
+	'''
+	PRIVATE: Clamps value between low and high.
+	'''
+	return max(low, min(value, high))
+
+@functools.lru_cache(maxsize=DICE_COUNTS_CACHE_SIZE)
+def _diceSumCounts(numberDice, numberSides):
+	'''
+	PRIVATE: Gets the distribution of the sum of numberDice dice with numberSides sides each. The distribution of half as many dice is convolved with itself (square and multiply), so only about log2(numberDice) convolutions are needed.
+	@param numberDice The number of dice. Must not be negative.
+	@param numberSides The number of sides on each die.
+	@return A tuple (offset, counts), where counts[i] is the number of outcomes that sum to offset+i.
+	'''
+	if numberDice == 0:
+		return 0, (1,)
+	if numberDice == 1:
+		return 1, (1,)*numberSides
+	offset, counts = _diceSumCounts(numberDice//2, numberSides)
+	offset, counts = 2*offset, _convolve(counts, counts)
+	if numberDice%2 == 1:
+		offset, counts = offset+1, _addDie(counts, numberSides)
+	return offset, counts
+
+def _addDie(counts, numberSides):
+	'''
+	PRIVATE: Adds one die to a distribution. This is a sliding window sum over the counts.
+	'''
+	prefix = [0]
+	for count in counts:
+		prefix.append(prefix[-1]+count)
+	last = len(counts)-1
+	return tuple(prefix[min(i, last)+1]-prefix[max(0, i-numberSides+1)] for i in range(len(counts)+numberSides-1))
+
+def _termsCounts(terms):
+	'''
+	PRIVATE: Gets the distribution of one side of a compiled dice string.
+	@param terms A dice.DiceTerms.
+	@return A tuple (offset, counts), where counts[i] is the number of outcomes that sum to offset+i.
+	'''
+	offset, counts = terms.constant, (1,)
+	for numberDice, numberSides in terms.dice:
+		dieOffset, dieCounts = _diceSumCounts(abs(numberDice), numberSides)
+		if numberDice < 0: #Negative dice are subtracted, so the distribution is mirrored.
+			dieOffset, dieCounts = -(dieOffset+len(dieCounts)-1), dieCounts[::-1]
+		offset, counts = offset+dieOffset, _convolve(counts, dieCounts)
+	return offset, counts
+
+def _convolve(first, second):
+	'''
+	PRIVATE: Convolves two lists of counts.
+	'''
+	if len(first) == 1:
+		return tuple(first[0]*count for count in second)
+	if len(second) == 1:
+		return tuple(second[0]*count for count in first)
+	if min(len(first), len(second)) >= PACKED_CONVOLUTION_THRESHOLD:
+		packed = _convolvePacked(first, second)
+		if packed is not None:
+			return packed
+	result = [0]*(len(first)+len(second)-1)
+	for i, a in enumerate(first):
+		if a == 0:
+			continue
+		for j, b in enumerate(second):
+			result[i+j]+=a*b
+	return tuple(result)
+
+def _convolvePacked(first, second):
+	'''
+	PRIVATE: Convolves two lists of counts by packing each into one number, a fixed number of digits per count, and multiplying them. (This is Kronecker substitution.) Every count in the result is at most sum(first)*sum(second), so the digits of neighbouring counts never overlap.
+	@return The convolution, or None if the counts are too large to convert to strings.
+	'''
+	width = len(str(sum(first)*sum(second)))
+	limit = getattr(sys, 'get_int_max_str_digits', lambda: 0)()
+	if limit and width > limit:
+		return None
+	product = _packingContext.multiply(_pack(first, width), _pack(second, width))
+	length = len(first)+len(second)-1
+	digits = str(product).zfill(length*width)
+	return tuple(int(digits[start:start+width]) for start in range((length-1)*width, -1, -width))
+
+def _pack(counts, width):
+	'''
+	PRIVATE: Packs a list of counts into a Decimal, with counts[0] in the lowest width digits.
+	'''
+	return decimal.Decimal(''.join(str(count).zfill(width) for count in reversed(counts)))
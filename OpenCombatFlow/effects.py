@@ -0,0 +1,98 @@
+'''
+Open Combat Flow - effects.py
+@purpose Defines TimedEffects, the per-character store of status effects, which expires effects without ticking each one down every turn.
+@author Owen Mellema
+@date 2-25-19
+'''
+import collections.abc
+import math
+
+class TimedEffects(collections.abc.MutableMapping):
+	'''
+	A dictionary of effects, mapping each effect to the number of turns it has left, like Character.effects always was. Instead of counting every effect down on every turn, it keeps a clock that counts the character's turns, stores the turn on which each effect expires, and files each effect in a bucket for that turn (a timing wheel). A tick only looks at the effects that expire on it, so adding, stacking, removing and expiring an effect all take constant time.
+	'''
+
+	def __init__(self, effects = ()):
+		'''
+		Creates a set of effects.
+		@param effects A dictionary (or iterable of (effect, duration) pairs) to start with.
+		'''
+		self._clock = 0 #The number of ticks so far.
+		self._expiry = {} #Maps each effect to the tick at which its time remaining reaches 0.
+		self._slots = {} #Maps each effect to the tick on which it will be removed.
+		self._buckets = {} #Maps a tick to the set of effects removed on it.
+		self._order = {} #Maps each effect to the order in which it was added, so expired effects are reported in a stable order.
+		self._nextOrder = 0
+		self.update(effects)
+
+	def tick(self):
+		'''
+		Counts down one turn.
+		@post Every effect has one less turn remaining, and effects with no time remaining (<= 0) are removed.
+		@return A list of the effects that were removed, in the order they were added.
+		'''
+		self._clock+=1
+		bucket = self._buckets.pop(self._clock, None)
+		if bucket is None:
+			return []
+		expired = sorted(bucket, key=self._order.__getitem__)
+		for effect in expired:
+			del self._expiry[effect]
+			del self._slots[effect]
+			del self._order[effect]
+		return expired
+
+	def add(self, effect, duration):
+		'''
+		Applies an effect. If it is already active, the duration is added to the time it has left.
+		@param effect The effect.
+		@param duration The number of turns to add.
+		'''
+		if effect in self._expiry:
+			self[effect] = self[effect]+duration
+		else:
+			self[effect] = duration
+
+	def __getitem__(self, effect):
+		return self._expiry[effect]-self._clock
+
+	def __setitem__(self, effect, duration):
+		if effect in self._slots:
+			self._unfile(effect)
+		else:
+			self._order[effect] = self._nextOrder
+			self._nextOrder+=1
+		expiry = self._clock+duration
+		slot = max(math.ceil(expiry), self._clock+1) #An effect with no time left is still removed on the next tick.
+		self._expiry[effect] = expiry
+		self._slots[effect] = slot
+		self._buckets.setdefault(slot, set()).add(effect)
+
+	def __delitem__(self, effect):
+		if effect not in self._expiry:
+			raise KeyError(effect)
+		self._unfile(effect)
+		del self._expiry[effect]
+		del self._slots[effect]
+		del self._order[effect]
+
+	def __iter__(self):
+		return iter(self._expiry)
+
+	def __len__(self):
+		return len(self._expiry)
+
+	def __repr__(self):
+		return f"TimedEffects({dict(self.items())})"
+
+	#Private
+
+	def _unfile(self, effect):
+		'''
+		PRIVATE: Takes an effect out of the bucket it is filed in.
+		'''
+		slot = self._slots[effect]
+		bucket = self._buckets[slot]
+		bucket.discard(effect)
+		if not bucket:
+			del self._buckets[slot]
@@ -5,6 +5,10 @@ Open Combat Flow - enforce.py
 @date 2-25-19
 '''
 import opencombatflow.character as c
+import collections.abc
+import functools
+import random
+import types
 
 '''
 ENFORCEMENT BLOCK
@@ -15,7 +19,7 @@ ENFORCEMENT BLOCK
     At the top level, the enforcementBlock is a list. Each element of the list corresponds to an element specified by the DSD. At each index in the list, there is a dictionary detailing information about the elemtn, as defined below.
         (MANDATORY)
         "name": The name of the key. (string)
-        "type": The type of the element at the key. This can be a type (eg, 'int', 'str', etc.) or a string, specifying a specific type of block.
+        "type": The type of the element at the key. This can be a type (eg, 'int', 'str', etc.), a tuple of types (any of which is accepted), or a string, specifying a specific type of block.
 
         (CONDITIONALLY MANDATORY)
         "dictElement": What type of element each key in a dictionary must be of. Only nessesary if "type" is dict.
@@ -23,7 +27,58 @@ ENFORCEMENT BLOCK
         (NON-MANDATORY)
         "mandatory": If true, this key must be present. Otherwise, or if it not provided, it is assumed to be non-mandatory.
 '''
+DICE_STRING_CACHE_SIZE = 4096 #The maximum number of distinct dice strings remembered as valid.
+FROZEN_CACHE_SIZE = 1024 #The maximum number of frozen blocks remembered as valid. Each one is kept alive while it is remembered.
+SHAPE_CACHE_SIZE = 1024 #The maximum number of blocks whose shapes each Validator remembers. Each one is kept alive while it is remembered.
+
 blockContext = {}
+_validators = {} #Compiled validators, by blockType. Built the first time each blockType is enforced.
+
+class _IdentityCache():
+    '''
+    PRIVATE: Remembers something about each of a bounded number of blocks, by identity. Dicts and mapping proxies cannot be weakly referenced, so each block is held while it is remembered, which stops its id from being reused. When the cache is full, the block used least recently is forgotten, so blocks that come back turn after turn stay cached, and one-off blocks are let go.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = collections.OrderedDict() #Maps each key to (block, value), least recently used first.
+
+    def get(self, key, block):
+        '''
+        Gets the value remembered for a block.
+        @param key The key the block was remembered under. It should include id(block).
+        @param block The block.
+        @return The value, or None if the block is not remembered.
+        '''
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is not block:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, block, value):
+        '''
+        Remembers a value for a block, forgetting the least recently used block if the cache is full.
+        @param key The key to remember the block under. It should include id(block).
+        @param block The block.
+        @param value The value. Must not be None.
+        '''
+        self._entries[key] = (block, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        '''
+        Forgets every block.
+        '''
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+_validatedFrozen = _IdentityCache(FROZEN_CACHE_SIZE) #Frozen blocks that have already passed validation, under (blockType, id(block)).
+
 def enforce(blockToCheck, blockType):
     '''
     Enforce rules for the given blockType. blockType is a string.
@@ -36,22 +91,33 @@ def enforce(blockToCheck, blockType):
     @param blockToCheck The block to check.
     @param blockType The type of block the blockToCheck should be.
     @raise KeyError If there is a syntax error with the block.
+    @note Blocks from blocks.py (ActionBlock and so on) are validated when they are built, and are never checked again.
     '''
 
-    global actionBlockPrototype, rangeBlockPrototype, reactionBlockPrototype, damageBlockPrototype
     global blockContext
 
     blockContext = blockToCheck
 
-    if blockType == 'action':
-        _enforceHelper(blockToCheck, actionBlockPrototype)
-    elif blockType == 'range':
-        _enforceHelper(blockToCheck, rangeBlockPrototype)
-    elif blockType == 'reaction':
-        _enforceHelper(blockToCheck, reactionBlockPrototype)
-    elif blockType == 'damage':
-        _enforceHelper(blockToCheck, damageBlockPrototype)
-    elif blockType == 'log':
+    if blockType != 'log':
+        if getattr(type(blockToCheck), 'blockType', None) == blockType: #A Block of the right type, which cannot have changed since it was validated.
+            return
+
+        validator = _validators.get(blockType)
+        if validator is None:
+            validator = _compileValidator(blockType)
+        if validator is None: #Not a known blockType.
+            return
+
+        #Frozen blocks cannot change, so they only need to be validated once.
+        if type(blockToCheck) == types.MappingProxyType:
+            key = (blockType, id(blockToCheck))
+            if _validatedFrozen.get(key, blockToCheck) is not None:
+                return
+            validator(blockToCheck)
+            _validatedFrozen.put(key, blockToCheck, True)
+        else:
+            validator(blockToCheck)
+    else:
         #Do log testing. This requires a different kind of check.
         assert 'messageType' in blockToCheck
         assert type(blockToCheck['messageType']) == str
@@ -69,6 +135,8 @@ def enforce(blockToCheck, blockType):
             required = ['action', 'reaction']
         elif messageType ==  'death':
             required = ['action', 'character']
+        elif messageType ==  'truncated':
+            required = ['action', 'reason']
         else:
             raise KeyError(f"Message Type {messageType} is not valid. (Evaluating {blockContext})")
         
@@ -125,44 +193,227 @@ def _evaluateDiceStringHelper(diceString):
             except:
                 raise KeyError(f"Invalid Syntax for Dice String {diceString}")
 	
-def _enforceType(toCheck, requestedType, dictElement = None):
+def _enforceDiceStringCached(diceString):
     '''
-    PRIVATE: Checks to make sure that variables match specifications for types. Depending upon the value of requestedType, this has different tests that it performs:
+    PRIVATE: Makes sure the dice string is a valid dice string, remembering strings that have already passed.
+    '''
+    if type(diceString) == str:
+        _enforceValidDiceString(diceString)
+    else:
+        _enforceDiceString(diceString)
+
+@functools.lru_cache(maxsize=DICE_STRING_CACHE_SIZE)
+def _enforceValidDiceString(diceString):
+    '''
+    PRIVATE: Cached form of _enforceDiceString. Only strings that pass are cached, since the cache does not store errors.
+    '''
+    _enforceDiceString(diceString)
+
+def _compileType(requestedType, dictElement = None):
+    '''
+    PRIVATE: Builds a function that checks that variables match specifications for types. Depending upon the value of requestedType, the function performs different tests:
     -If requestedType is a Type, it will check to make sure that toCheck is of that type.
+    -If requestedType is a tuple of Types, it will check to make sure that toCheck is of one of them.
     -If requestedType is a Type of dict, and dictElement is not None, raise an error if each element of the dictionary is not of dictElement.
     -If requestedType is a string equal to "DS", it makes sure that toCheck is a valid dice string.
     -If requestedType is any string besides "DS", it checks that toCheck is a valid block of the type requestedType.
+    @note Frozen blocks (see freeze()) are accepted wherever a dict is required.
     '''
-    global blockContext
-    if type(requestedType) == type: #If we are doing a check of a 'normal' variable test. (IE, not specified by a string.) We tell this by seeing if requestedType is of type type, or of type string
-        if not issubclass(type(toCheck), requestedType): #See if the types match. The "issubclass" function determines if toCheck has a parent of requestedType 
-            raise KeyError(f"The element {toCheck} is of type {type(toCheck)}, not of required type {requestedType}. (Evaluating {blockContext})") #If they don't match, raise an error.
-        if requestedType == dict and dictElement is not None: #If the type is a dictionary, run additional testing of the given dictionary.
-            for internalKey in toCheck: #Check each individual key in the dictionary.
-                _enforceType(toCheck[internalKey], dictElement) #Test each element.
-    elif type(requestedType) == str: #If the requestedType is a string, perform special testing, including block and dicestring, as specified by the string.
-        if requestedType == "DS": #If requested type is 'DS', we enforce the dice string.
-            _enforceDiceString(toCheck)
-        else: #If it is not 'DS', we assume that it is a specification of a block, and we let enforce take care of it.
-            enforce(toCheck, requestedType)
-
-def _enforceHelper(blockToCheck, enforcementBlock):
-    '''
-    PRIVATE: This is to enforce protocols using a pre-determined enforcement block. Please use an appropriate front-end channel to access this functionality.
+    if type(requestedType) == type or type(requestedType) == tuple: #If we are doing a check of a 'normal' variable test. (IE, not specified by a string.)
+        acceptedType = collections.abc.Mapping if requestedType == dict else requestedType
+        elementChecker = _compileType(dictElement) if requestedType == dict and dictElement is not None else None
+
+        def checkType(toCheck):
+            if not isinstance(toCheck, acceptedType): #See if the types match, allowing subclasses.
+                raise KeyError(f"The element {toCheck} is of type {type(toCheck)}, not of required type {requestedType}. (Evaluating {blockContext})") #If they don't match, raise an error.
+            if elementChecker is not None: #If the type is a dictionary, run additional testing of the given dictionary.
+                for internalKey in toCheck: #Check each individual key in the dictionary.
+                    elementChecker(toCheck[internalKey]) #Test each element.
+        return checkType
+    elif requestedType == "DS": #If requested type is 'DS', we enforce the dice string.
+        return _enforceDiceStringCached
+    else: #If it is not 'DS', we assume that it is a specification of a block, and we let enforce take care of it.
+        return lambda toCheck: enforce(toCheck, requestedType)
+
+def _compileValidator(blockType):
     '''
-    global blockContext
+    PRIVATE: Compiles the prototype for the given blockType into a single validator function, and stores it in _validators.
+    @param blockType The type of block to compile a validator for.
+    @return The validator, or None if there is no prototype for blockType.
+    '''
+    prototypes = {
+        'action': actionBlockPrototype,
+        'range': rangeBlockPrototype,
+        'reaction': reactionBlockPrototype,
+        'damage': damageBlockPrototype,
+    }
+    if blockType not in prototypes:
+        return None
 
-    for keyToCheck in enforcementBlock:
+    mandatory = tuple(keyToCheck['name'] for keyToCheck in prototypes[blockType] if keyToCheck.get('mandatory', False) == True)
+    checkers = tuple((keyToCheck['name'], _compileType(keyToCheck['type'], keyToCheck.get('dictElement', None))) for keyToCheck in prototypes[blockType])
+
+    def validator(blockToCheck):
         #Check if mandatory elements are present.
-        keyName = keyToCheck['name']
-        if keyToCheck.get('mandatory', False) == True and keyName not in blockToCheck:
-            raise KeyError(f"The Key {keyName} must be present in this block. (Evaluating {blockContext})")
-        elif keyName not in blockToCheck:
-            continue
+        for keyName in mandatory:
+            if keyName not in blockToCheck:
+                raise KeyError(f"The Key {keyName} must be present in this block. (Evaluating {blockContext})")
 
         #Check if given values were consistent with required values.
-        element = blockToCheck[keyName]
-        _enforceType(element, keyToCheck['type'], dictElement=keyToCheck['dictElement'] if 'dictElement' in keyToCheck else None)
+        for keyName, checker in checkers:
+            if keyName in blockToCheck:
+                checker(blockToCheck[keyName])
+
+    _validators[blockType] = validator
+    return validator
+
+_PLAIN_TYPES = frozenset((str, int, float, bool, list, tuple, type(None))) #Types that are never Mappings, so shapes can be worked out without an isinstance() check.
+
+class Validator():
+    '''
+    Decides which calls to enforce() are actually performed, and counts them. The available modes are:
+    -"strict": Every block is checked. This is the default, and is recommended during development.
+    -"first": A block is only checked the first time its shape (its keys, and the types of their values) appears for its blockType.
+    -"sampled": Only a fraction of blocks, given by sampleRate, are checked.
+    -"off": No blocks are checked.
+    @note In "first" mode, Blocks from blocks.py and frozen blocks that were already validated are skipped without working out their shapes, and the shapes of the SHAPE_CACHE_SIZE dicts used most recently are remembered by identity. A dict that is changed after it was first checked is not checked again.
+    '''
+
+    MODES = ('strict', 'first', 'sampled', 'off')
+
+    def __init__(self, mode = 'strict', sampleRate = 0.1, seed = 0):
+        '''
+        Creates a Validator.
+        @param mode The validation mode. One of MODES.
+        @param sampleRate The fraction of blocks that are checked in "sampled" mode.
+        @param seed Seed for the sampling. Sampling uses its own random stream, so it never disturbs the rolls made during combat.
+        @raise ValueError If mode is not one of MODES.
+        '''
+        self.setMode(mode, sampleRate)
+        self.performed = 0 #The number of checks performed.
+        self.skipped = 0 #The number of checks skipped.
+        self._seenShapes = set()
+        self._shapes = _IdentityCache(SHAPE_CACHE_SIZE) #The shapes of recently checked blocks, under id(block).
+        self._random = random.Random(seed)
+
+    def setMode(self, mode, sampleRate = None):
+        '''
+        Changes the validation mode.
+        @param mode The validation mode. One of MODES.
+        @param sampleRate The fraction of blocks that are checked in "sampled" mode. If None, the current rate is kept.
+        @raise ValueError If mode is not one of MODES.
+        '''
+        if mode not in self.MODES:
+            raise ValueError(f"Validation mode {mode} is not valid. Use one of {self.MODES}.")
+        self.mode = mode
+        if sampleRate is not None:
+            self.sampleRate = sampleRate
+
+    def enforce(self, blockToCheck, blockType):
+        '''
+        Enforce rules for the given blockType, if the mode calls for it. See enforce().
+        @param blockToCheck The block to check.
+        @param blockType The type of block the blockToCheck should be.
+        @raise KeyError If the block is checked, and there is a syntax error with it.
+        '''
+        if self.mode == 'strict':
+            check = True
+        elif self.mode == 'off':
+            check = False
+        elif self.mode == 'sampled':
+            check = self._random.random() < self.sampleRate
+        elif getattr(type(blockToCheck), 'blockType', None) == blockType or _validatedFrozen.get((blockType, id(blockToCheck)), blockToCheck) is not None: #Already known to be valid.
+            check = False
+        elif type(blockToCheck) == types.MappingProxyType: #enforce() remembers frozen blocks by identity itself.
+            shape = None
+            check = True
+        else:
+            shape = (blockType, self._shape(blockToCheck))
+            check = shape not in self._seenShapes
+
+        if not check:
+            self.skipped+=1
+            return
+
+        self.performed+=1
+        enforce(blockToCheck, blockType)
+        if self.mode == 'first' and shape is not None:
+            self._seenShapes.add(shape) #Only remembered once the check passes.
+
+    def getCounters(self):
+        '''
+        Gets the number of checks performed and skipped.
+        @return A dictionary with the keys "performed" and "skipped".
+        '''
+        return {'performed': self.performed, 'skipped': self.skipped}
+
+    def resetCounters(self):
+        '''
+        Resets the counters, and forgets every shape seen so far.
+        @post Both counters are 0.
+        '''
+        self.performed = 0
+        self.skipped = 0
+        self._seenShapes = set()
+        self._shapes.clear()
+
+    #Private
+
+    def _shape(self, block):
+        '''
+        PRIVATE: Gets the shape of a block: its keys, and the types of their values. Nested blocks are described by their own shapes. The shape of each block is remembered by its identity, so blocks that share nested blocks only work them out once.
+        '''
+        if not isinstance(block, collections.abc.Mapping):
+            return type(block)
+        cached = self._shapes.get(id(block), block)
+        if cached is not None:
+            return cached
+
+        shape = []
+        for key, value in block.items():
+            valueType = type(value)
+            if valueType is dict or (valueType not in _PLAIN_TYPES and isinstance(value, collections.abc.Mapping)):
+                shape.append((key, self._shape(value)))
+            else:
+                shape.append((key, valueType))
+        shape = tuple(shape)
+
+        self._shapes.put(id(block), block, shape)
+        return shape
+
+defaultValidator = Validator() #The validator used by every combatHandler that does not have its own.
+trustedValidator = Validator('off') #Used for blocks built internally, which are already known to be valid.
+
+def setValidationMode(mode, sampleRate = None):
+    '''
+    Sets the global validation mode, used by every combatHandler that does not have its own. See Validator.
+    @param mode The validation mode. One of Validator.MODES.
+    @param sampleRate The fraction of blocks that are checked in "sampled" mode. If None, the current rate is kept.
+    @raise ValueError If mode is not valid.
+    '''
+    defaultValidator.setMode(mode, sampleRate)
+
+def clearCache():
+    '''
+    Forgets all compiled validators and previously validated dice strings and frozen blocks. Call this after changing a prototype.
+    @post The next call to enforce() recompiles the validator it needs.
+    '''
+    _validators.clear()
+    _validatedFrozen.clear()
+    _enforceValidDiceString.cache_clear()
+
+def freeze(block):
+    '''
+    Makes a read-only copy of a block. Frozen blocks behave like dicts when read, but cannot be changed, so enforce() only validates each one once.
+    @param block The block to freeze. Nested dicts are frozen as well, and lists become tuples. Characters are left as they are.
+    @return The frozen block.
+    '''
+    if isinstance(block, collections.abc.Mapping):
+        return types.MappingProxyType({key: freeze(value) for key, value in block.items()})
+    elif type(block) == list or type(block) == tuple:
+        return tuple(freeze(element) for element in block)
+    else:
+        return block
     
 #Prototypes
 actionBlockPrototype = [
@@ -204,11 +455,11 @@ actionBlockPrototype = [
 rangeBlockPrototype = [
     {
         'name': 'center',
-        'type': int,
+        'type': (list, tuple),
     },
     {
-        'name': 'range',
-        'type': int,
+        'name': 'distance',
+        'type': (int, float),
     },
     {
         'name': 'group',
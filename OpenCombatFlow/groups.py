@@ -0,0 +1,105 @@
+'''
+Open Combat Flow - groups.py
+@purpose Defines the GroupIndex, which maps each group to its members, used by the combatHandler to answer group range queries without scanning every character.
+@author Owen Mellema
+@date 2-25-19
+'''
+
+class GroupIndex():
+	'''
+	Maps each group to the set of characters in it.
+	@note The index only knows about group changes made through Character.setGroups, addGroup and removeGroup. If you change groups directly, call regroup() yourself.
+	'''
+
+	def __init__(self):
+		'''
+		Creates an empty index.
+		'''
+		self._members = {} #Maps each group to the set of characters in it.
+		self._groupsOf = {} #Maps each character to the groups it was indexed under.
+		self._order = {} #Maps each character to the order in which it was inserted, so queries can return characters in a stable order.
+		self._nextOrder = 0
+
+	def insert(self, character):
+		'''
+		Adds a character to the index.
+		@param character The character to add.
+		@post The character will be found by queries for each of its groups.
+		'''
+		groups = frozenset(character.groups)
+		for group in groups:
+			self._members.setdefault(group, set()).add(character)
+		self._groupsOf[character] = groups
+		self._order[character] = self._nextOrder
+		self._nextOrder+=1
+
+	def remove(self, character):
+		'''
+		Removes a character from the index. Nothing happens if the character is not in the index.
+		@param character The character to remove.
+		@post The character will not be found by any query.
+		'''
+		groups = self._groupsOf.pop(character, None)
+		if groups is None:
+			return
+		self._order.pop(character, None)
+		for group in groups:
+			self._discard(group, character)
+
+	def regroup(self, character):
+		'''
+		Updates the index after a character's groups changed. Nothing happens if the character is not in the index.
+		@param character The character whose groups changed.
+		@post The character is indexed under exactly its current groups.
+		'''
+		oldGroups = self._groupsOf.get(character)
+		if oldGroups is None:
+			return
+		newGroups = frozenset(character.groups)
+		for group in oldGroups-newGroups:
+			self._discard(group, character)
+		for group in newGroups-oldGroups:
+			self._members.setdefault(group, set()).add(character)
+		self._groupsOf[character] = newGroups
+
+	def query(self, group):
+		'''
+		Gets every character in a group.
+		@param group The group to look up.
+		@return A list of characters in the group, in the order they were inserted.
+		'''
+		return sorted(self._members.get(group, ()), key=self._order.__getitem__)
+
+	def count(self, group):
+		'''
+		Gets the number of characters in a group.
+		@param group The group to look up.
+		@return The number of characters in the group.
+		'''
+		return len(self._members.get(group, ()))
+
+	def groupCount(self):
+		'''
+		Gets the number of groups with at least one member.
+		@return The number of groups.
+		'''
+		return len(self._members)
+
+	def __len__(self):
+		'''
+		Returns the number of characters in the index.
+		'''
+		return len(self._groupsOf)
+
+	#Private
+
+	def _discard(self, group, character):
+		'''
+		PRIVATE: Removes character from the members of group, dropping the group if it becomes empty.
+		'''
+		members = self._members.get(group)
+		if members is None:
+			return
+		members.discard(character)
+		if not members:
+			del self._members[group]
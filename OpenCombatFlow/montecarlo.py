@@ -0,0 +1,193 @@
+'''
+Open Combat Flow - montecarlo.py
+@purpose Runs the same encounter many times, spread across a process pool, and merges the outcomes into win rates and other statistics.
+@note The factory and termination predicate are sent to worker processes, so they must be picklable (for example, functions defined at the top level of a module).
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import opencombatflow.combatlog as combatlog
+import collections
+import multiprocessing
+import random
+
+TrialResult = collections.namedtuple('TrialResult', ['index', 'seed', 'turns', 'finished', 'winners', 'damage', 'deaths'])
+TrialResult.__doc__ = '''
+The outcome of one trial. finished is False if the trial ran out of turns before the termination predicate held. winners is a tuple of the groups with characters still alive. damage maps each character name to the damage it dealt, and deaths maps each character name to the number of times a character with that name died.
+'''
+
+class Statistics():
+	'''
+	Outcome statistics, merged over many trials.
+	'''
+
+	def __init__(self):
+		'''
+		Creates empty statistics.
+		'''
+		self.trials = 0 #The number of trials added.
+		self.unfinished = 0 #The number of trials that ran out of turns.
+		self.wins = collections.Counter() #The number of trials each group won (IE, was the only group left standing).
+		self.totalTurns = 0
+		self.minTurns = None
+		self.maxTurns = None
+		self.damage = collections.Counter() #The total damage dealt by each character name.
+		self.deaths = collections.Counter() #The total deaths of each character name.
+
+	def add(self, result):
+		'''
+		Adds the outcome of one trial.
+		@param result A TrialResult.
+		'''
+		self.trials+=1
+		if not result.finished:
+			self.unfinished+=1
+		if len(result.winners) == 1:
+			self.wins[result.winners[0]]+=1
+		self.totalTurns+=result.turns
+		self.minTurns = result.turns if self.minTurns is None else min(self.minTurns, result.turns)
+		self.maxTurns = result.turns if self.maxTurns is None else max(self.maxTurns, result.turns)
+		self.damage.update(result.damage)
+		self.deaths.update(result.deaths)
+
+	def merge(self, other):
+		'''
+		Adds every trial from other Statistics.
+		@param other The Statistics to merge in.
+		'''
+		self.trials+=other.trials
+		self.unfinished+=other.unfinished
+		self.wins.update(other.wins)
+		self.totalTurns+=other.totalTurns
+		for attribute, pick in (('minTurns', min), ('maxTurns', max)):
+			if getattr(other, attribute) is not None:
+				mine = getattr(self, attribute)
+				setattr(self, attribute, getattr(other, attribute) if mine is None else pick(mine, getattr(other, attribute)))
+		self.damage.update(other.damage)
+		self.deaths.update(other.deaths)
+
+	def winRate(self, group):
+		'''
+		Returns the fraction of trials won by a group.
+		@param group The group.
+		@return The win rate, from 0 to 1.
+		'''
+		return self.wins[group]/self.trials if self.trials else 0.0
+
+	def meanTurns(self):
+		'''
+		Returns the mean number of turns per trial.
+		'''
+		return self.totalTurns/self.trials if self.trials else 0.0
+
+	def asDict(self):
+		'''
+		Returns the statistics as a plain dictionary.
+		'''
+		return {
+			'trials': self.trials,
+			'unfinished': self.unfinished,
+			'winRates': {group: self.winRate(group) for group in self.wins},
+			'meanTurns': self.meanTurns(),
+			'minTurns': self.minTurns,
+			'maxTurns': self.maxTurns,
+			'damage': dict(self.damage),
+			'deaths': dict(self.deaths),
+		}
+
+oneGroupRemaining = character.oneGroupRemaining #The default termination predicate.
+
+def trialSeed(seed, index):
+	'''
+	Derives the seed of a single trial. Depends only on the seed of the run and the index of the trial, so results do not depend on which worker ran which trial.
+	@param seed The seed of the whole run.
+	@param index The index of the trial.
+	@return The seed for the trial.
+	'''
+	return random.Random(f"{seed}/{index}").getrandbits(64)
+
+def runTrial(factory, index, seed = 0, until = oneGroupRemaining, maxTurns = 10000):
+	'''
+	Runs a single trial, in this process.
+	@param factory A callable taking no arguments, that returns a fresh combatHandler with its characters added.
+	@param index The index of the trial.
+	@param seed The seed of the whole run. See trialSeed.
+	@param until The termination predicate. Called with the handler before each turn; the trial ends once it returns True.
+	@param maxTurns The maximum number of turns before the trial is abandoned.
+	@return A TrialResult.
+	'''
+	return _runTrial((factory, index, seed, until, maxTurns))
+
+def iterTrials(factory, trials, until = oneGroupRemaining, maxTurns = 10000, seed = 0, processes = None, chunkSize = 16):
+	'''
+	Runs trials across a process pool, yielding each result as soon as it finishes. Results arrive in no particular order, but each is reproducible from seed and its index.
+	@param factory A callable taking no arguments, that returns a fresh combatHandler with its characters added. Its random stream, and the global random module, are seeded for each trial. The state of the global random module is restored after each trial, so running trials in this process does not disturb it.
+	@param trials The number of trials to run.
+	@param until The termination predicate. Called with the handler before each turn; the trial ends once it returns True.
+	@param maxTurns The maximum number of turns before a trial is abandoned.
+	@param seed The seed of the whole run.
+	@param processes The number of worker processes. If None, one per CPU. If 1, trials run in this process, without a pool.
+	@param chunkSize The number of trials sent to a worker at once.
+	@return An iterator of TrialResults.
+	'''
+	jobs = ((factory, index, seed, until, maxTurns) for index in range(trials))
+	if processes == 1:
+		for job in jobs:
+			yield _runTrial(job)
+		return
+	with multiprocessing.Pool(processes) as pool:
+		for result in pool.imap_unordered(_runTrial, jobs, chunkSize):
+			yield result
+
+def runTrials(factory, trials, until = oneGroupRemaining, maxTurns = 10000, seed = 0, processes = None, chunkSize = 16, callback = None):
+	'''
+	Runs trials across a process pool, and merges their outcomes. See iterTrials for the parameters.
+	@param callback If given, called with each TrialResult as it finishes.
+	@return The merged Statistics.
+	'''
+	statistics = Statistics()
+	for result in iterTrials(factory, trials, until, maxTurns, seed, processes, chunkSize):
+		statistics.add(result)
+		if callback is not None:
+			callback(result)
+	return statistics
+
+#Private
+
+class _OutcomeCollector():
+	'''
+	PRIVATE: A log sink that tallies damage dealt and deaths by character name.
+	'''
+
+	def __init__(self):
+		self.damage = collections.Counter()
+		self.deaths = collections.Counter()
+
+	def __call__(self, message):
+		if message['messageType'] == 'attackHit':
+			self.damage[message['action']['user'].name]+=message['damage'].get('damageTaken', 0)
+		elif message['messageType'] == 'death':
+			self.deaths[message['character'].name]+=1
+
+def _runTrial(job):
+	'''
+	PRIVATE: Runs one trial. Takes a single tuple, so it can be mapped over a pool.
+	'''
+	factory, index, seed, until, maxTurns = job
+	thisSeed = trialSeed(seed, index)
+	callerState = random.getstate() #Trials may run in the caller's process, so its global stream is put back afterwards.
+	random.seed(thisSeed) #For any randomness in the characters themselves.
+	try:
+		handler = factory()
+		handler.rng = random.Random(thisSeed)
+
+		collector = _OutcomeCollector()
+		if isinstance(handler.log, combatlog.CombatLog):
+			handler.log.addSink(collector)
+		else:
+			handler.configureLog(maxMessages=0, messageTypes=('attackHit', 'death'), sinks=[collector])
+
+		summary = handler.run(max_turns=maxTurns, until=until)
+	finally:
+		random.setstate(callerState)
+	return TrialResult(index, thisSeed, summary.turns, summary.reason == 'until', summary.groups, dict(collector.damage), dict(collector.deaths))
@@ -0,0 +1,223 @@
+'''
+Open Combat Flow - profiling.py
+@purpose Defines the Profiler, which counts calls and measures time spent in each phase of a combatHandler's turns, per action name, and how deep chains of retaliations and failure conditions go.
+@note A handler only pays for profiling while it is enabled: combatHandler.enableProfiling() wraps the handler's methods on that one handler, and disableProfiling() removes the wrappers.
+@author Owen Mellema
+@date 2-25-19
+'''
+import collections
+import csv
+import functools
+import inspect
+import io
+import time
+
+PHASES = {
+	'turn': 'turn', #A whole turn, including every phase below.
+	'_getAction': 'getActionBlock',
+	'_getReaction': 'getReactionBlock',
+	'_gatherReactions': 'getReactionBlock',
+	'_findTargets': 'inRange',
+	'_chanceFails': 'chance', #Rolling chances.
+	'_getDamageBlock': 'damageRoll', #Rolling damage, resistances and effects.
+	'_rollMany': 'damageRoll',
+	'_dealDamage': 'takeDamage',
+	'addLogMessage': 'log',
+} #Maps each wrapped method of the combatHandler to the phase it is counted under. enforce is counted through the handler's validator, actions through the handler's _actionStarted and _actionFinished hooks, and single targets through its _isTarget hook.
+HOOKS = ('_actionStarted', '_actionFinished', '_isTarget') #Hooks the combatHandler only calls if they are set. They are set by attach, so handlers that are not profiled skip them entirely.
+
+class Profiler():
+	'''
+	Call counts and cumulative times, in nanoseconds, for one combatHandler. Phases nest: "turn" includes everything done during the turn, and the time of an action includes its retaliations and failure conditions.
+	'''
+
+	def __init__(self):
+		'''
+		Creates an empty profile.
+		'''
+		self.reset()
+
+	def reset(self):
+		'''
+		Discards everything measured so far.
+		@post Every count and time is 0.
+		'''
+		self.phases = {} #Maps each phase to [calls, nanoseconds].
+		self.actions = {} #Maps each action name to [calls, nanoseconds, deepest level it was executed at].
+		self.depths = collections.Counter() #Maps each depth to the number of actions executed at it. Actions chosen on a turn have depth 1; their retaliations and failure conditions have depth 2, and so on.
+		self.maxDepth = 0
+		self._starts = [] #The start times of the actions executing right now, innermost last.
+
+	def attach(self, handler):
+		'''
+		Starts profiling a handler, by wrapping its methods.
+		@param handler The combatHandler.
+		@post The handler's phases are counted by this profiler.
+		'''
+		for method, phase in PHASES.items():
+			original = getattr(handler, method, None)
+			if original is not None:
+				setattr(handler, method, self._wrap(phase, original))
+		started, finished = handler._actionStarted, handler._actionFinished
+		def profiledStarted(action, depth):
+			self._enter(depth)
+			if started is not None:
+				started(action, depth)
+		def profiledFinished(action, depth):
+			if finished is not None:
+				finished(action, depth)
+			self._leave(action, depth)
+		handler._actionStarted = profiledStarted
+		handler._actionFinished = profiledFinished
+		handler._isTarget = self._wrap('inRange', handler._isTarget or _isTarget)
+		getValidator = handler.getValidator
+		proxies = {}
+		def profiledGetValidator():
+			validator = getValidator()
+			if validator not in proxies:
+				proxies.clear()
+				proxies[validator] = _ProfiledValidator(validator, self)
+			return proxies[validator]
+		handler.getValidator = profiledGetValidator
+
+	def detach(self, handler):
+		'''
+		Stops profiling a handler, by removing the wrappers added by attach.
+		@param handler The combatHandler.
+		@post The handler runs exactly as it did before attach.
+		'''
+		for method in tuple(PHASES)+HOOKS+('getValidator',):
+			handler.__dict__.pop(method, None)
+
+	def record(self, phase, nanoseconds):
+		'''
+		Adds one call to a phase.
+		@param phase The name of the phase.
+		@param nanoseconds The time the call took.
+		'''
+		entry = self.phases.get(phase)
+		if entry is None:
+			entry = self.phases[phase] = [0, 0]
+		entry[0]+=1
+		entry[1]+=nanoseconds
+
+	def asDict(self):
+		'''
+		Returns the profile as a plain dictionary.
+		@return A dictionary with "phases" and "actions" (each mapping a name to its "calls" and "ns", plus "maxDepth" for actions), "depths" and "maxDepth".
+		'''
+		return {
+			'phases': {phase: {'calls': calls, 'ns': ns} for phase, (calls, ns) in self.phases.items()},
+			'actions': {name: {'calls': calls, 'ns': ns, 'maxDepth': depth} for name, (calls, ns, depth) in self.actions.items()},
+			'depths': dict(self.depths),
+			'maxDepth': self.maxDepth,
+		}
+
+	def toCSV(self, file = None):
+		'''
+		Writes the profile as CSV, with the columns kind ("phase", "action" or "depth"), name, calls, ns and maxDepth.
+		@param file A file object to write to. If None, the CSV is returned as a string.
+		@return The CSV, if file is None.
+		'''
+		output = io.StringIO() if file is None else file
+		writer = csv.writer(output)
+		writer.writerow(['kind', 'name', 'calls', 'ns', 'maxDepth'])
+		for phase, (calls, ns) in sorted(self.phases.items()):
+			writer.writerow(['phase', phase, calls, ns, ''])
+		for name, (calls, ns, depth) in sorted(self.actions.items(), key=lambda item: str(item[0])):
+			writer.writerow(['action', name, calls, ns, depth])
+		for depth, calls in sorted(self.depths.items()):
+			writer.writerow(['depth', depth, calls, '', ''])
+		if file is None:
+			return output.getvalue()
+
+	#Private
+
+	def _wrap(self, phase, function):
+		'''
+		PRIVATE: Wraps a function (or coroutine function) so each call is recorded under phase. If an ordinary function returns something awaitable, the call is recorded once that has been awaited.
+		'''
+		clock = time.perf_counter_ns
+		record = self.record
+		if inspect.iscoroutinefunction(function):
+			@functools.wraps(function)
+			async def profiledAsync(*args, **kwargs):
+				start = clock()
+				try:
+					return await function(*args, **kwargs)
+				finally:
+					record(phase, clock()-start)
+			return profiledAsync
+
+		@functools.wraps(function)
+		def profiled(*args, **kwargs):
+			start = clock()
+			try:
+				result = function(*args, **kwargs)
+			except BaseException:
+				record(phase, clock()-start)
+				raise
+			if inspect.isawaitable(result): #An ordinary method handing back a coroutine, such as a character's async getReactionBlock. Time it until it is awaited.
+				return self._recordAwaited(phase, result, start)
+			record(phase, clock()-start)
+			return result
+		return profiled
+
+	async def _recordAwaited(self, phase, awaitable, start):
+		'''
+		PRIVATE: Awaits the result of a wrapped call, and records the call under phase once it is done.
+		@param start The time the call started.
+		'''
+		try:
+			return await awaitable
+		finally:
+			self.record(phase, time.perf_counter_ns()-start)
+
+	def _enter(self, depth):
+		'''
+		PRIVATE: Notes that an action has started executing.
+		@param depth The depth of the action.
+		'''
+		self.depths[depth]+=1
+		if depth > self.maxDepth:
+			self.maxDepth = depth
+		self._starts.append(time.perf_counter_ns())
+
+	def _leave(self, action, depth):
+		'''
+		PRIVATE: Notes that an action, and all its follow-ups, have finished executing.
+		'''
+		nanoseconds = time.perf_counter_ns()-self._starts.pop()
+		name = action.get('name') if hasattr(action, 'get') else None
+		entry = self.actions.get(name)
+		if entry is None:
+			entry = self.actions[name] = [0, 0, 0]
+		entry[0]+=1
+		entry[1]+=nanoseconds
+		if depth > entry[2]:
+			entry[2] = depth
+
+class _ProfiledValidator():
+	'''
+	PRIVATE: Stands in for an enforce.Validator, recording each call to enforce under the "enforce" phase.
+	'''
+
+	def __init__(self, validator, profiler):
+		self._validator = validator
+		self._profiler = profiler
+
+	def enforce(self, block, blockType):
+		start = time.perf_counter_ns()
+		try:
+			return self._validator.enforce(block, blockType)
+		finally:
+			self._profiler.record('enforce', time.perf_counter_ns()-start)
+
+	def __getattr__(self, name):
+		return getattr(self._validator, name)
+
+def _isTarget(character, range):
+	'''
+	PRIVATE: Checks whether a single target is in range. Installed as a profiled handler's _isTarget hook.
+	'''
+	return character._inRange(range)
@@ -0,0 +1,196 @@
+'''
+Open Combat Flow - replay.py
+@purpose Defines snapshots of a combatHandler, and a driver that replays recorded decisions, so a simulation can be rerun from any turn without asking characters for new actions or reactions.
+@author Owen Mellema
+@date 2-25-19
+'''
+import collections
+
+Snapshot = collections.namedtuple('Snapshot', ['alive', 'dead', 'turnOrder', 'turnCount', 'roundCount', 'characters', 'rngState'])
+Snapshot.__doc__ = '''
+The state of a combatHandler at one moment, as returned by combatHandler.snapshot(). alive is in turn order, turnOrder is the state of the handler's scheduler (see turnorder.Scheduler.getState), and characters holds a CharacterState for every alive and dead character.
+'''
+
+CharacterState = collections.namedtuple('CharacterState', ['character', 'HP', 'effects', 'position', 'groups'])
+CharacterState.__doc__ = '''
+The state of a single character: its HP, its effects (as a tuple of (effect, duration) pairs), its position and its groups.
+'''
+
+def captureCharacter(character):
+	'''
+	Captures the state of a character.
+	@param character The character.
+	@return A CharacterState.
+	'''
+	return CharacterState(character, character.HP, tuple(character.effects.items()), tuple(character.position), tuple(character.groups))
+
+def restoreCharacter(state):
+	'''
+	Puts a character back into a captured state. Indexes are not notified; combatHandler.restore rebuilds them.
+	@param state A CharacterState.
+	@post The character's HP, effects, position and groups match the state.
+	'''
+	character = state.character
+	character.HP = state.HP
+	character.effects = dict(state.effects)
+	character.position = list(state.position)
+	character.groups = list(state.groups)
+
+class DecisionRecorder():
+	'''
+	Records the action and reactions chosen on every turn, by listening to log messages. A DecisionRecorder is a sink, so it can be passed to combatHandler.configureLog. A plain list log can be recorded with recordLog.
+	If it is given the handler's random stream, it also records the state of the stream right after each decision. Decisions that roll (for example, with getRandomCharacterInRange) then replay exactly, since the replay puts the stream back where the decision left it.
+	States are kept compactly. Nothing is kept if the stream has not moved since the last record. Otherwise, the Mersenne Twister key (its 624 words, which only change every 624 draws) is shared with the previous record, and only the position in it is new.
+	@note The log must include "startOfTurn", "action" and "reaction" messages.
+	@note Reactions gathered concurrently (see setReactionExecutor and asynchandler) that draw from the random stream cannot be replayed exactly, since the order of their draws is not known.
+	'''
+
+	def __init__(self, firstTurn = 0, rng = None):
+		'''
+		Creates an empty recording.
+		@param firstTurn The turnCount of the handler when recording starts.
+		@param rng The handler's random stream (combatHandler.rng). If None, only the decisions are recorded, so they must not draw from the stream.
+		'''
+		self.turns = [] #One [action, [reactions], actionState, [reactionStates]] entry per recorded turn, in order. The states are the compact states of rng right after each decision, or None if nothing changed.
+		self.firstTurn = firstTurn
+		self.rng = rng
+		self._lastState = None #The full state of rng at the last record.
+		self._lastWords = None #The key of the last record, shared by every record until it changes.
+
+	def __call__(self, message):
+		'''
+		Records one log message. Messages other than "startOfTurn", "action" and "reaction" are ignored.
+		@param message The logBlock.
+		'''
+		messageType = message['messageType']
+		if messageType == 'startOfTurn':
+			self.turns.append([None, [], None, []])
+		elif self.turns == []: #Nothing to attach the decision to.
+			return
+		elif messageType == 'action':
+			self.turns[-1][0] = message['action']
+			self.turns[-1][2] = self._rngState()
+		elif messageType == 'reaction':
+			self.turns[-1][1].append(message['reaction'])
+			self.turns[-1][3].append(self._rngState())
+
+	def recordLog(self, messages):
+		'''
+		Records every message in a log.
+		@note The states of the random stream are not known after the fact, so they are not recorded.
+		@param messages An iterable of logBlocks, such as combatHandler.getLog().
+		'''
+		rng = self.rng
+		self.rng = None
+		try:
+			for message in messages:
+				self(message)
+		finally:
+			self.rng = rng
+
+	#Private
+
+	def _rngState(self):
+		'''
+		PRIVATE: Gets the current state of rng, as a compact (version, words, position, gauss) tuple. See expandState.
+		@return The compact state, or None if there is no rng, or it has not moved since the last record.
+		'''
+		if self.rng is None:
+			return None
+		state = self.rng.getstate()
+		if state == self._lastState:
+			return None
+		self._lastState = state
+		version, internal, gauss = state
+		words = internal[:-1]
+		if words != self._lastWords:
+			self._lastWords = words
+		return (version, self._lastWords, internal[-1], gauss)
+
+def expandState(compact):
+	'''
+	Turns a compact state recorded by a DecisionRecorder back into a state that random.Random.setstate accepts.
+	@param compact A (version, words, position, gauss) tuple.
+	@return The full state.
+	'''
+	version, words, position, gauss = compact
+	return (version, words+(position,), gauss)
+
+class RecordedDecisions():
+	'''
+	Feeds recorded actions and reactions to a combatHandler, in place of its characters. Set as combatHandler.decisionSource by replay().
+	'''
+
+	def __init__(self, turns, rng = None):
+		'''
+		Creates a feed.
+		@param turns The [action, [reactions], actionState, [reactionStates]] entries to feed, in order, as recorded by a DecisionRecorder.
+		@param rng The handler's random stream. Before each decision is handed back, it is set to the recorded state, if there is one. A decision with no recorded state leaves the stream where the replay has it, which is where the original run had it.
+		'''
+		self._turns = collections.deque(turns)
+		self._reactions = collections.deque()
+		self.rng = rng
+
+	def getActionBlock(self, character):
+		'''
+		Gets the recorded action for the next turn.
+		@param character The character whose turn it is.
+		@raise IndexError If the recording has run out of turns.
+		@return The recorded actionBlock.
+		'''
+		action, reactions, actionState, reactionStates = self._turns.popleft()
+		self._reactions = collections.deque(zip(reactions, reactionStates))
+		self._setState(actionState)
+		return action
+
+	def getReactionBlock(self, character, action):
+		'''
+		Gets the next recorded reaction of the current turn.
+		@param character The character reacting.
+		@param action The action being reacted to.
+		@raise IndexError If the turn has no more recorded reactions.
+		@return The recorded reactionBlock.
+		'''
+		reaction, state = self._reactions.popleft()
+		self._setState(state)
+		return reaction
+
+	#Private
+
+	def _setState(self, state):
+		'''
+		PRIVATE: Puts rng into a recorded state, if there is one.
+		'''
+		if state is not None and self.rng is not None:
+			self.rng.setstate(expandState(state))
+
+def replay(handler, recorder, turns, snapshot = None):
+	'''
+	Fast-forwards a handler through recorded turns. Characters are not asked for actions or reactions; everything else (rolls, damage, effects, preTurn and postTurn) runs as usual, so the handler ends up exactly where the original run did.
+	@param handler The combatHandler to advance.
+	@param recorder The DecisionRecorder of the original run.
+	@param turns The number of turns to replay.
+	@param snapshot If given, the handler is restored to this snapshot first. It must have been taken at the start of a turn of the recorded run.
+	@raise IndexError If the recording does not cover the requested turns.
+	@post The handler has played the requested turns.
+	'''
+	if snapshot is not None:
+		handler.restore(snapshot)
+	start = handler.turnCount-recorder.firstTurn
+	if start < 0 or start+turns > len(recorder.turns):
+		raise IndexError("The recording does not cover the requested turns.")
+
+	#Do not record the replayed turns a second time.
+	recording = recorder in getattr(handler.log, 'sinks', ())
+	if recording:
+		handler.log.removeSink(recorder)
+
+	previousSource = handler.decisionSource
+	handler.decisionSource = RecordedDecisions(recorder.turns[start:start+turns], handler.rng)
+	try:
+		for i in range(turns):
+			handler.turn()
+	finally:
+		handler.decisionSource = previousSource
+		if recording:
+			handler.log.addSink(recorder)
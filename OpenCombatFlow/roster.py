@@ -0,0 +1,242 @@
+'''
+Open Combat Flow - roster.py
+@purpose Defines the Roster, which stores the HP, position and effect timers of many characters in contiguous arrays, and the RosterCharacter, a lightweight Character backed by a row of a Roster.
+@note This module requires NumPy.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as c
+import collections.abc
+
+try:
+	import numpy
+except ImportError: #NumPy is optional, and only needed for rosters.
+	numpy = None
+
+class Roster():
+	'''
+	Array-backed storage for many characters. Each character owns one row (a "slot") of every array:
+	-hp: The HP of each character.
+	-positions: The coordinates of each character, as an (n, 3) array.
+	-timers: The time remaining on each effect, as an (n, number of effects) array. An effect with 0 time remaining is not active.
+	-used: Whether each slot belongs to a character.
+	Bulk operations, such as tickEffects() and findDead(), work on every character at once.
+	'''
+
+	def __init__(self, effectNames = (), capacity = 1024):
+		'''
+		Creates an empty roster.
+		@param effectNames The effects to allocate timers for up front. Other effects get a timer the first time they are applied.
+		@param capacity The number of characters to allocate room for up front. The roster grows as needed.
+		@raise ImportError If NumPy is not installed.
+		'''
+		if numpy is None:
+			raise ImportError("NumPy is required for rosters.")
+		capacity = max(1, capacity)
+		self.hp = numpy.zeros(capacity, dtype=numpy.int64)
+		self.positions = numpy.zeros((capacity, 3), dtype=numpy.float64)
+		self.timers = numpy.zeros((capacity, len(effectNames)), dtype=numpy.int64)
+		self.used = numpy.zeros(capacity, dtype=bool)
+		self.effectColumns = {name: column for column, name in enumerate(effectNames)} #Maps each effect to its column in timers.
+		self.effectNames = list(effectNames) #The effect for each column in timers.
+		self._characters = [None]*capacity #The character in each slot.
+		self._free = list(range(capacity-1, -1, -1)) #Unused slots. The lowest slot is taken first.
+
+	def add(self, character, HP = 1, position = (0, 0, 0)):
+		'''
+		Gives a character a slot in the roster. Called by RosterCharacter.
+		@param character The character to add.
+		@param HP The character's starting HP.
+		@param position The character's starting position, with up to 3 coordinates.
+		@return The slot of the character.
+		'''
+		if not self._free:
+			self._grow(2*len(self.used))
+		slot = self._free.pop()
+		self.used[slot] = True
+		self.hp[slot] = HP
+		self.positions[slot] = tuple(position)+(0,)*(3-len(position))
+		self.timers[slot] = 0
+		self._characters[slot] = character
+		return slot
+
+	def release(self, character):
+		'''
+		Frees the slot of a character, so another character can reuse it. The character must not be used afterwards.
+		@param character The character to remove.
+		@post The character's slot is free.
+		'''
+		slot = character._slot
+		self.used[slot] = False
+		self._characters[slot] = None
+		self._free.append(slot)
+
+	def effectColumn(self, effect, create = False):
+		'''
+		Gets the column of timers that holds an effect.
+		@param effect The name of the effect.
+		@param create If true, a column is added for effects that do not have one yet.
+		@return The column, or None if the effect has no column and create is false.
+		'''
+		column = self.effectColumns.get(effect)
+		if column is None and create:
+			column = len(self.effectNames)
+			self.timers = numpy.concatenate((self.timers, numpy.zeros((len(self.used), 1), dtype=numpy.int64)), axis=1)
+			self.effectColumns[effect] = column
+			self.effectNames.append(effect)
+		return column
+
+	def tickEffects(self):
+		'''
+		Ticks down the effects of every character at once, like Character._update does for a single character.
+		@post Every active effect has one less turn remaining. Effects with no time remaining are no longer active.
+		'''
+		numpy.subtract(self.timers, 1, out=self.timers, where=self.timers > 0)
+
+	def findDead(self):
+		'''
+		Finds every character in the roster with no HP left.
+		@return A list of dead characters, in slot order.
+		'''
+		return [self._characters[slot] for slot in numpy.flatnonzero(self.used & (self.hp <= 0))]
+
+	def applyDamage(self, characters, amounts):
+		'''
+		Subtracts HP from many characters at once. HP never drops below 0.
+		@param characters The characters to damage. Each must belong to this roster, and appear only once.
+		@param amounts The damage dealt to each character, in the same order.
+		@post Each character's HP is reduced.
+		'''
+		slots = numpy.fromiter((character._slot for character in characters), dtype=numpy.intp, count=len(characters))
+		self.hp[slots] = numpy.maximum(self.hp[slots]-numpy.asarray(amounts, dtype=numpy.int64), 0)
+
+	def characters(self):
+		'''
+		Gets every character in the roster.
+		@return A list of characters, in slot order.
+		'''
+		return [self._characters[slot] for slot in numpy.flatnonzero(self.used)]
+
+	def __len__(self):
+		'''
+		Returns the number of characters in the roster.
+		'''
+		return int(self.used.sum())
+
+	#Private
+
+	def _grow(self, capacity):
+		'''
+		PRIVATE: Grows every array to hold capacity characters.
+		'''
+		oldCapacity = len(self.used)
+		extra = capacity-oldCapacity
+		self.hp = numpy.concatenate((self.hp, numpy.zeros(extra, dtype=numpy.int64)))
+		self.positions = numpy.concatenate((self.positions, numpy.zeros((extra, 3), dtype=numpy.float64)))
+		self.timers = numpy.concatenate((self.timers, numpy.zeros((extra, self.timers.shape[1]), dtype=numpy.int64)))
+		self.used = numpy.concatenate((self.used, numpy.zeros(extra, dtype=bool)))
+		self._characters.extend([None]*extra)
+		self._free.extend(range(capacity-1, oldCapacity-1, -1))
+
+class EffectTimers(collections.abc.MutableMapping):
+	'''
+	A dictionary-like view of the active effects of one RosterCharacter. Reads and writes go straight to the roster's timers.
+	@note Setting an effect to 0 (or less) deactivates it.
+	'''
+	__slots__ = ('_roster', '_slot')
+
+	def __init__(self, roster, slot):
+		'''
+		Creates a view of the effects in one slot of a roster.
+		@param roster The Roster.
+		@param slot The slot of the character.
+		'''
+		self._roster = roster
+		self._slot = slot
+
+	def __getitem__(self, effect):
+		column = self._roster.effectColumn(effect)
+		if column is None or self._roster.timers[self._slot, column] <= 0:
+			raise KeyError(effect)
+		return int(self._roster.timers[self._slot, column])
+
+	def __setitem__(self, effect, duration):
+		column = self._roster.effectColumn(effect, create=True)
+		self._roster.timers[self._slot, column] = max(0, duration)
+
+	def __delitem__(self, effect):
+		column = self._roster.effectColumn(effect)
+		if column is None or self._roster.timers[self._slot, column] <= 0:
+			raise KeyError(effect)
+		self._roster.timers[self._slot, column] = 0
+
+	def __iter__(self):
+		names = self._roster.effectNames
+		return iter([names[column] for column in numpy.flatnonzero(self._roster.timers[self._slot] > 0)])
+
+	def __len__(self):
+		return int((self._roster.timers[self._slot] > 0).sum())
+
+	def __repr__(self):
+		return repr(dict(self))
+
+class RosterCharacter(c.Character):
+	'''
+	A Character whose HP, position and effects live in a Roster, rather than on the object itself.
+	@note The attributes it needs are kept in slots. Like every Character, it also has a __dict__, which stays empty unless a derived class stores something else on the object.
+	'''
+	__slots__ = ('_roster', '_slot', 'name', 'groups', '_positionListeners', '_groupListeners')
+
+	def __init__(self, roster, HP = 1, position = (0, 0, 0), groups = (), name = "Set"):
+		'''
+		Creates a character, and gives it a slot in the roster.
+		@param roster The Roster to store the character in.
+		@param HP The starting HP.
+		@param position The starting position, with up to 3 coordinates.
+		@param groups The groups the character belongs to.
+		@param name The name of the character.
+		'''
+		self._roster = roster
+		self._slot = roster.add(self, HP, position)
+		self.name = name
+		self.groups = list(groups)
+		self._positionListeners = ()
+		self._groupListeners = ()
+
+	@property
+	def HP(self):
+		return int(self._roster.hp[self._slot])
+
+	@HP.setter
+	def HP(self, value):
+		self._roster.hp[self._slot] = value
+
+	@property
+	def position(self):
+		return self._roster.positions[self._slot].tolist()
+
+	@position.setter
+	def position(self, value):
+		self._roster.positions[self._slot] = tuple(value)+(0,)*(3-len(value))
+
+	@property
+	def effects(self):
+		return EffectTimers(self._roster, self._slot)
+
+	@effects.setter
+	def effects(self, value):
+		self._roster.timers[self._slot] = 0
+		for effect, duration in value.items():
+			column = self._roster.effectColumn(effect, create=True) #May grow timers, so it must be looked up first.
+			self._roster.timers[self._slot, column] = max(0, duration)
+
+	def _update(self):
+		'''
+		PRIVATE: Ticks down this character's effects, in its row of the roster.
+		@post Effects are ticked down, and inactive effects (those with time remaining <= 0) are removed. effectExpired is called for each of them.
+		'''
+		timers = self._roster.timers[self._slot]
+		expiring = numpy.flatnonzero(timers == 1)
+		numpy.subtract(timers, 1, out=timers, where=timers > 0)
+		for column in expiring:
+			self.effectExpired(self._roster.effectNames[column])
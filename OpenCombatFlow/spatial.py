@@ -0,0 +1,119 @@
+'''
+Open Combat Flow - spatial.py
+@purpose Defines the UniformGrid, a spatial index over character positions, used by the combatHandler to answer area range queries without scanning every character.
+@author Owen Mellema
+@date 2-25-19
+'''
+import math
+
+class UniformGrid():
+	'''
+	Buckets characters into cubic cells, based upon their position. An area query only looks at the cells that overlap the area.
+	@note The grid only knows about position changes made through Character.setPosition. If you write to position directly, call move() yourself.
+	'''
+
+	def __init__(self, cellSize):
+		'''
+		Creates an empty grid.
+		@param cellSize The length of the side of each cell. Something close to the distance of a typical area attack works well.
+		@raise ValueError If cellSize is not positive.
+		'''
+		if cellSize <= 0:
+			raise ValueError("The cell size of a UniformGrid must be positive.")
+		self.cellSize = cellSize
+		self._cells = {} #Maps each occupied cell to the set of characters in it.
+		self._cellOf = {} #Maps each character to the cell it is in.
+		self._order = {} #Maps each character to the order in which it was inserted, so queries can return characters in a stable order.
+		self._nextOrder = 0
+
+	def insert(self, character):
+		'''
+		Adds a character to the grid.
+		@param character The character to add.
+		@post The character will be found by queries that cover its position.
+		'''
+		cell = self._cell(character.position)
+		self._cells.setdefault(cell, set()).add(character)
+		self._cellOf[character] = cell
+		self._order[character] = self._nextOrder
+		self._nextOrder+=1
+
+	def remove(self, character):
+		'''
+		Removes a character from the grid. Nothing happens if the character is not in the grid.
+		@param character The character to remove.
+		@post The character will not be found by any query.
+		'''
+		cell = self._cellOf.pop(character, None)
+		if cell is None:
+			return
+		self._order.pop(character, None)
+		self._cells[cell].discard(character)
+		if not self._cells[cell]:
+			del self._cells[cell]
+
+	def move(self, character):
+		'''
+		Moves a character to the cell for its current position. Nothing happens if the character is not in the grid.
+		@param character The character that moved.
+		@post The character is in the cell matching its position.
+		'''
+		oldCell = self._cellOf.get(character)
+		if oldCell is None:
+			return
+		newCell = self._cell(character.position)
+		if newCell == oldCell:
+			return
+		self._cells[oldCell].discard(character)
+		if not self._cells[oldCell]:
+			del self._cells[oldCell]
+		self._cells.setdefault(newCell, set()).add(character)
+		self._cellOf[character] = newCell
+
+	def query(self, center, distance):
+		'''
+		Gets every character that may be within distance of center. The result can include characters that are slightly too far away, so exact distances should still be checked.
+		@param center The center of the area, with up to 3 coordinates. Missing coordinates are treated as 0.
+		@param distance The radius of the area. May be infinite.
+		@return A list of candidate characters, in the order they were inserted.
+		'''
+		center = tuple(center)+(0,)*(3-len(center))
+		lowest = [coordinate-distance for coordinate in center]
+		highest = [coordinate+distance for coordinate in center]
+		if not all(math.isfinite(coordinate) for coordinate in lowest+highest): #The area has no bounds (for example, an infinite distance), so every character may be in it.
+			candidates = list(self._cellOf)
+			candidates.sort(key=self._order.__getitem__)
+			return candidates
+		low = self._cell(lowest)
+		high = self._cell(highest)
+
+		candidates = []
+		boxSize = (high[0]-low[0]+1)*(high[1]-low[1]+1)*(high[2]-low[2]+1)
+		if boxSize > len(self._cells): #The area covers more cells than are occupied, so it is cheaper to look at the occupied ones.
+			for cell, characters in self._cells.items():
+				if all(low[axis] <= cell[axis] <= high[axis] for axis in range(3)):
+					candidates.extend(characters)
+		else:
+			for x in range(low[0], high[0]+1):
+				for y in range(low[1], high[1]+1):
+					for z in range(low[2], high[2]+1):
+						characters = self._cells.get((x, y, z))
+						if characters:
+							candidates.extend(characters)
+
+		candidates.sort(key=self._order.__getitem__)
+		return candidates
+
+	def __len__(self):
+		'''
+		Returns the number of characters in the grid.
+		'''
+		return len(self._cellOf)
+
+	#Private
+
+	def _cell(self, position):
+		'''
+		PRIVATE: Gets the cell containing position.
+		'''
+		return (math.floor(position[0]/self.cellSize), math.floor(position[1]/self.cellSize), math.floor(position[2]/self.cellSize))
@@ -0,0 +1,521 @@
+'''
+Open Combat Flow - turnorder.py
+@purpose Defines schedulers, which hold the alive characters of a combatHandler and decide whose turn it is. TurnOrder takes characters in the order they were added, SpeedScheduler lets faster characters act more often, and InitiativeScheduler rolls initiative every round.
+@note A scheduler is any object with the methods of Scheduler. The combatHandler calls append when a character is added, remove when one dies, current to find the actor, and advance at the end of every turn.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.dice as dice
+import heapq
+
+TICKS_PER_ROUND = 720720 #The length of a round in SpeedScheduler time. Divisible by every whole number up to 16, so common speeds divide a round exactly.
+
+class Scheduler():
+	'''
+	The base class of schedulers. Derived classes implement append, remove, current, advance, getState, setState, __len__, __iter__ and __contains__. This class turns those into a list-like interface.
+	@note Iterating over a scheduler, and indexing it, take linear time.
+	'''
+
+	def append(self, character):
+		'''
+		Adds a character.
+		@note This is a placeholder, and should be implemented in a derived class.
+		@param character The character to add.
+		@raise ValueError If the character is already scheduled.
+		'''
+		raise NotImplementedError
+
+	def remove(self, character):
+		'''
+		Removes a character. If it was the current character, the next call to advance() moves on to whoever would have gone after it, without skipping anyone.
+		@note This is a placeholder, and should be implemented in a derived class.
+		@param character The character to remove.
+		@raise ValueError If the character is not scheduled.
+		'''
+		raise NotImplementedError
+
+	def current(self):
+		'''
+		Gets the character whose turn it is.
+		@note This is a placeholder, and should be implemented in a derived class.
+		@return The current character, or None if there are no characters.
+		'''
+		raise NotImplementedError
+
+	def advance(self):
+		'''
+		Ends the turn of the current character.
+		@note This is a placeholder, and should be implemented in a derived class.
+		@return True if this completed a round.
+		'''
+		raise NotImplementedError
+
+	def getState(self):
+		'''
+		Gets everything needed to put the scheduler back where it is now, with setState.
+		@note This is a placeholder, and should be implemented in a derived class.
+		@return An immutable state.
+		'''
+		raise NotImplementedError
+
+	def setState(self, state):
+		'''
+		Puts the scheduler back into a state returned by getState.
+		@note This is a placeholder, and should be implemented in a derived class.
+		@param state The state.
+		'''
+		raise NotImplementedError
+
+	def discard(self, character):
+		'''
+		Removes a character, if it is scheduled.
+		@param character The character to remove.
+		@post The character is not scheduled.
+		'''
+		if character in self:
+			self.remove(character)
+
+	def index(self, character):
+		'''
+		Gets the position of a character, in iteration order.
+		@param character The character to find.
+		@raise ValueError If the character is not scheduled.
+		@return The position, starting from 0.
+		'''
+		for i, other in enumerate(self):
+			if other == character:
+				return i
+		raise ValueError("The character is not scheduled.")
+
+	def __getitem__(self, index):
+		return list(self)[index]
+
+	def __eq__(self, other):
+		if isinstance(other, (Scheduler, list, tuple)):
+			return list(self) == list(other)
+		return NotImplemented
+
+	def __add__(self, other):
+		return list(self)+list(other)
+
+	def __repr__(self):
+		return f"{type(self).__name__}({list(self)})"
+
+class TurnOrder(Scheduler):
+	'''
+	Characters in turn order, with a cursor on the character whose turn it is. This is the default scheduler: characters take turns in the order they were added. Adding and removing characters, and moving the cursor, take constant time. If the current character is removed, the cursor moves on to the character after it.
+	'''
+
+	def __init__(self, characters = ()):
+		'''
+		Creates a turn order.
+		@param characters The characters to add, in order. The first one has the first turn.
+		'''
+		self._clear()
+		for character in characters:
+			self.append(character)
+
+	def append(self, character):
+		'''
+		Adds a character at the end of the order.
+		@param character The character to add.
+		@raise ValueError If the character is already in the order.
+		@post The character takes its turn after every character already in the order.
+		'''
+		if character in self._next:
+			raise ValueError("The character is already in the turn order.")
+		self._next[character] = None
+		self._prev[character] = self._tail
+		if self._tail is None:
+			self._head = character
+		else:
+			self._next[self._tail] = character
+		self._tail = character
+		if self._current is None:
+			self._current = character
+
+	def remove(self, character):
+		'''
+		Removes a character.
+		@param character The character to remove.
+		@raise ValueError If the character is not in the order.
+		@post The character is not in the order. If it was the current character, the next call to advance() keeps the cursor on the character after it.
+		'''
+		if character not in self._next:
+			raise ValueError("The character is not in the turn order.")
+		after = self._next.pop(character)
+		before = self._prev.pop(character)
+		if before is None:
+			self._head = after
+		else:
+			self._next[before] = after
+		if after is None:
+			self._tail = before
+		else:
+			self._prev[after] = before
+
+		if character == self._current:
+			if not self._advanced:
+				self._advanced = True
+				self._wrapped = False
+			if after is None:
+				self._wrapped = True
+				after = self._head
+			self._current = after
+			if after is None: #Nobody is left.
+				self._advanced = False
+				self._wrapped = False
+
+	def current(self):
+		'''
+		Gets the character whose turn it is.
+		@return The current character, or None if there are no characters.
+		'''
+		return self._current
+
+	def advance(self):
+		'''
+		Moves the cursor to the next character, wrapping around to the first after the last.
+		@post The cursor is on the character whose turn is next.
+		@return True if the cursor wrapped around, completing a round.
+		'''
+		if self._advanced:
+			wrapped = self._wrapped
+			self._advanced = False
+			self._wrapped = False
+			return wrapped
+		if self._current is None:
+			return False
+		after = self._next[self._current]
+		if after is None:
+			self._current = self._head
+			return True
+		self._current = after
+		return False
+
+	def getState(self):
+		'''
+		Gets the order and the state of the cursor, so that they can be put back with setState.
+		@return A tuple of the characters in order, the current character, and whether the cursor has already moved on from a removed character, and by wrapping around.
+		'''
+		return (tuple(self), self._current, self._advanced, self._wrapped)
+
+	def setState(self, state):
+		'''
+		Puts the order and the cursor back into a state returned by getState.
+		@param state The state.
+		@raise ValueError If the current character is not in the order.
+		'''
+		characters, current, advanced, wrapped = state
+		if current not in characters and characters != ():
+			raise ValueError("The character is not in the turn order.")
+		self._clear()
+		for character in characters:
+			self.append(character)
+		self._current = current
+		self._advanced = advanced
+		self._wrapped = wrapped
+
+	def __len__(self):
+		return len(self._next)
+
+	def __contains__(self, character):
+		return character in self._next
+
+	def __iter__(self):
+		#Walk the order up front, so characters can be added and removed while iterating.
+		characters = []
+		character = self._head
+		while character is not None:
+			characters.append(character)
+			character = self._next[character]
+		return iter(characters)
+
+	#Private
+
+	def _clear(self):
+		'''
+		PRIVATE: Removes every character, and resets the cursor.
+		'''
+		self._next = {} #Maps each character to the one after it, or None for the last.
+		self._prev = {} #Maps each character to the one before it, or None for the first.
+		self._head = None
+		self._tail = None
+		self._current = None #The character whose turn it is. None only if there are no characters.
+		self._advanced = False #True if the current character was removed, so the cursor has already moved on.
+		self._wrapped = False #True if the cursor moved on by wrapping around to the first character.
+
+class SpeedScheduler(Scheduler):
+	'''
+	Lets faster characters act more often. Each character has a time for its next turn, and the character with the earliest time goes next, taken from a heap in O(log n). After its turn, a character's next turn is TICKS_PER_ROUND/speed later, so a character with speed 2 acts twice for every turn of a character with speed 1. Ties go to whoever was scheduled first.
+	@note Speed is read from each character's speed attribute, when it is added and after each of its turns. Changing a character's speed takes effect after its next turn.
+	@note Iteration is in the order characters were added, not in turn order.
+	'''
+
+	def __init__(self, characters = ()):
+		'''
+		Creates a scheduler.
+		@param characters The characters to add. Everyone's first turn comes within the first round, fastest first.
+		'''
+		self._clear()
+		for character in characters:
+			self.append(character)
+
+	def append(self, character):
+		'''
+		Adds a character. Its first turn comes TICKS_PER_ROUND/speed after the turn that is currently underway (or, between turns, after the last turn that ended).
+		@param character The character to add.
+		@raise ValueError If the character is already scheduled, or its speed is not positive.
+		'''
+		if character in self._entries:
+			raise ValueError("The character is already scheduled.")
+		if self._actor is not None:
+			now = self._actor[0]
+		elif self._advanced:
+			now = self._actorTime
+		else:
+			now = self._clock
+		self._push(character, now+self._delay(character))
+
+	def remove(self, character):
+		'''
+		Removes a character. Removal takes constant time; its place in the heap is cleaned up lazily.
+		@param character The character to remove.
+		@raise ValueError If the character is not scheduled.
+		'''
+		if character not in self._entries:
+			raise ValueError("The character is not scheduled.")
+		if character == self.current() and not self._advanced:
+			self._advanced = True
+			self._actorTime = self._actor[0]
+			self._actor = None
+		del self._entries[character]
+		if len(self._heap) > 2*len(self._entries)+64: #Mostly stale entries, so rebuild the heap.
+			self._heap = list(self._entries.values())
+			heapq.heapify(self._heap)
+
+	def current(self):
+		'''
+		Gets the character whose turn it is: the one with the earliest next turn, when its turn started. Characters added during its turn cannot take its place.
+		@return The current character, or None if there are no characters.
+		'''
+		if self._actor is None:
+			self._settle()
+			if not self._heap:
+				return None
+			self._actor = self._heap[0]
+		return self._actor[2]
+
+	def advance(self):
+		'''
+		Reschedules the current character, TICKS_PER_ROUND/speed later.
+		@return True if the next turn falls in a later round than the one that just ended.
+		'''
+		if self._advanced:
+			actorTime = self._actorTime
+			self._advanced = False
+		else:
+			if self.current() is None:
+				return False
+			actorTime, order, character = self._actor
+			self._push(character, actorTime+self._delay(character)) #Replaces the actor's entry, which is left in the heap as a stale entry.
+		self._actor = None
+		self._clock = actorTime
+		self._settle()
+		if not self._heap:
+			return False
+		return self._roundOf(self._heap[0][0]) > self._roundOf(actorTime)
+
+	def timeOf(self, character):
+		'''
+		Gets the time of a character's next turn.
+		@param character The character.
+		@raise KeyError If the character is not scheduled.
+		@return The time, in ticks.
+		'''
+		return self._entries[character][0]
+
+	def getState(self):
+		'''
+		Gets the time of every character's next turn, so that they can be put back with setState.
+		@return A tuple of the (time, order, character) entries, the current time, the entry of the character whose turn it is (or None), and the pending state of a removed current character.
+		'''
+		return (tuple(self._entries.values()), self._clock, self._nextOrder, self._actor, self._advanced, self._actorTime)
+
+	def setState(self, state):
+		'''
+		Puts the schedule back into a state returned by getState.
+		@param state The state.
+		'''
+		entries, clock, nextOrder, actor, advanced, actorTime = state
+		self._clear()
+		for entry in entries:
+			self._entries[entry[2]] = entry
+		self._heap = list(entries)
+		heapq.heapify(self._heap)
+		self._clock = clock
+		self._nextOrder = nextOrder
+		self._actor = actor
+		self._advanced = advanced
+		self._actorTime = actorTime
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, character):
+		return character in self._entries
+
+	def __iter__(self):
+		return iter(list(self._entries))
+
+	#Private
+
+	def _clear(self):
+		'''
+		PRIVATE: Removes every character, and resets the clock.
+		'''
+		self._entries = {} #Maps each character to its live (time, order, character) heap entry, in the order characters were added.
+		self._heap = [] #Heap entries. Entries that are no longer in _entries are stale, and are skipped.
+		self._nextOrder = 0 #Breaks ties between equal times, in the order entries were pushed.
+		self._clock = 0 #The time of the last turn that ended.
+		self._actor = None #The live entry of the character whose turn it is, once current() has chosen it. None between turns.
+		self._advanced = False #True if the current character was removed before its turn ended.
+		self._actorTime = 0 #The time of the removed current character's turn.
+
+	def _push(self, character, time):
+		'''
+		PRIVATE: Schedules the next turn of a character.
+		'''
+		entry = (time, self._nextOrder, character)
+		self._nextOrder+=1
+		self._entries[character] = entry
+		heapq.heappush(self._heap, entry)
+
+	def _settle(self):
+		'''
+		PRIVATE: Pops stale entries off the top of the heap.
+		'''
+		heap = self._heap
+		entries = self._entries
+		while heap and entries.get(heap[0][2]) is not heap[0]:
+			heapq.heappop(heap)
+
+	def _delay(self, character):
+		'''
+		PRIVATE: Gets the time between a character's turns.
+		'''
+		speed = getattr(character, 'speed', 1)
+		if speed <= 0:
+			raise ValueError(f"Speed must be positive, not {speed}.")
+		return max(1, round(TICKS_PER_ROUND/speed))
+
+	def _roundOf(self, time):
+		'''
+		PRIVATE: Gets the round a time falls in. Round 0 is the times from 1 to TICKS_PER_ROUND.
+		'''
+		return (time-1)//TICKS_PER_ROUND
+
+class InitiativeScheduler(Scheduler):
+	'''
+	Rolls initiative at the start of every round, and lets characters act from highest roll to lowest. Ties go to whoever was added first. Characters added during a round act at the end of it.
+	@note Initiative is read from each character's initiative attribute, which can be a dice string or an integer.
+	@note Iteration is in the order characters were added, not in turn order.
+	'''
+
+	def __init__(self, characters = (), rng = None):
+		'''
+		Creates a scheduler.
+		@param characters The characters to add.
+		@param rng The random generator used to roll initiative. If None, combatHandler.setScheduler gives it the handler's random stream.
+		'''
+		self.rng = rng
+		self._members = {} #Every character, in the order they were added.
+		self._round = None #The TurnOrder of the current round. None until the first round starts.
+		for character in characters:
+			self.append(character)
+
+	def append(self, character):
+		'''
+		Adds a character. If a round is underway, the character acts at the end of it.
+		@param character The character to add.
+		@raise ValueError If the character is already scheduled.
+		'''
+		if character in self._members:
+			raise ValueError("The character is already scheduled.")
+		self._members[character] = None
+		if self._round is not None:
+			self._round.append(character)
+
+	def remove(self, character):
+		'''
+		Removes a character.
+		@param character The character to remove.
+		@raise ValueError If the character is not scheduled.
+		'''
+		if character not in self._members:
+			raise ValueError("The character is not scheduled.")
+		del self._members[character]
+		if self._round is not None:
+			self._round.remove(character)
+
+	def current(self):
+		'''
+		Gets the character whose turn it is. Rolls initiative for the first round, if it has not started yet.
+		@return The current character, or None if there are no characters.
+		'''
+		if self._round is None:
+			if not self._members:
+				return None
+			self._newRound()
+		return self._round.current()
+
+	def advance(self):
+		'''
+		Moves on to the next character in this round's order. After the last, rolls initiative for a new round.
+		@return True if a round was completed.
+		'''
+		if self._round is None:
+			return False
+		if self._round.advance():
+			self._newRound()
+			return True
+		return False
+
+	def getState(self):
+		'''
+		Gets every character and the order of the current round, so that they can be put back with setState.
+		@return A tuple of the characters, and the state of the round's TurnOrder (or None, before the first round).
+		'''
+		return (tuple(self._members), None if self._round is None else self._round.getState())
+
+	def setState(self, state):
+		'''
+		Puts the scheduler back into a state returned by getState.
+		@param state The state.
+		'''
+		characters, roundState = state
+		self._members = dict.fromkeys(characters)
+		if roundState is None:
+			self._round = None
+		else:
+			self._round = TurnOrder()
+			self._round.setState(roundState)
+
+	def __len__(self):
+		return len(self._members)
+
+	def __contains__(self, character):
+		return character in self._members
+
+	def __iter__(self):
+		return iter(list(self._members))
+
+	#Private
+
+	def _newRound(self):
+		'''
+		PRIVATE: Rolls initiative for every character, and orders the round from highest roll to lowest.
+		'''
+		rolls = [(-dice.evaluate(character.initiative, rng=self.rng), i, character) for i, character in enumerate(self._members)]
+		rolls.sort(key=lambda roll: roll[:2])
+		self._round = TurnOrder(character for roll, i, character in rolls)
@@ -0,0 +1,6 @@
+'''
+Open Combat Flow - benchmarks
+@purpose Seeded, reproducible benchmarks for dice, block enforcement, range queries and whole encounters. Run them with "python -m benchmarks", which writes the results as JSON, and compare two result files with "python -m benchmarks --compare old.json new.json".
+@author Owen Mellema
+@date 2-25-19
+'''
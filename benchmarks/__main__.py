@@ -0,0 +1,43 @@
+'''
+Open Combat Flow - benchmarks/__main__.py
+@purpose Command line entry point: "python -m benchmarks [--output results.json] [--filter dice] [--seed 0] [--repeats 5]", or "python -m benchmarks --compare old.json new.json".
+@author Owen Mellema
+@date 2-25-19
+'''
+import benchmarks.runner as runner
+import benchmarks.scenarios
+import argparse
+import sys
+
+def main(arguments = None):
+	'''
+	Runs the benchmarks, or compares two result files.
+	@param arguments The command line arguments. If None, sys.argv is used.
+	@return The exit status.
+	'''
+	parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks for OpenCombatFlow.")
+	parser.add_argument('--output', default="-", help="Where to write the JSON results. Defaults to standard output.")
+	parser.add_argument('--filter', default="", help="Only run benchmarks whose name contains this text.")
+	parser.add_argument('--seed', type=int, default=0, help="The seed given to every scenario.")
+	parser.add_argument('--repeats', type=int, default=5, help="The number of times each benchmark is timed.")
+	parser.add_argument('--list', action='store_true', help="List the benchmarks, and exit.")
+	parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two result files, instead of running anything.")
+	options = parser.parse_args(arguments)
+
+	if options.compare:
+		for name, before, after, ratio in runner.compare(runner.load(options.compare[0]), runner.load(options.compare[1])):
+			print(f"{name:<40} {before:>14.1f} {after:>14.1f} {ratio:>8.2f}x")
+		return 0
+
+	selected = [bench for bench in runner.registry if options.filter in bench.name]
+	if options.list:
+		for bench in selected:
+			print(bench.name)
+		return 0
+
+	results = runner.run(selected, options.seed, options.repeats, log=lambda line: print(line, file=sys.stderr))
+	runner.save(results, options.output)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
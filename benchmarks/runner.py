@@ -0,0 +1,125 @@
+'''
+Open Combat Flow - benchmarks/runner.py
+@purpose Times registered benchmarks, and reads, writes and compares result files.
+@author Owen Mellema
+@date 2-25-19
+'''
+import collections
+import json
+import platform
+import statistics
+import sys
+import time
+
+FORMAT_VERSION = 1 #Bumped whenever the layout of result files changes.
+
+Benchmark = collections.namedtuple('Benchmark', ['name', 'setup', 'operations'])
+Benchmark.__doc__ = '''
+A single benchmark. setup is called with a seed, and returns a callable taking no arguments: the work to time. operations is the number of operations that work performs, so results can be reported per operation.
+'''
+
+registry = [] #Every registered Benchmark, in the order they were registered.
+
+def benchmark(name, operations):
+	'''
+	Registers a setup function as a benchmark. Use as a decorator.
+	@param name The name of the benchmark, as "group.case".
+	@param operations The number of operations performed by each call of the work returned by setup.
+	@return The decorator.
+	'''
+	def register(setup):
+		registry.append(Benchmark(name, setup, operations))
+		return setup
+	return register
+
+def run(benchmarks, seed = 0, repeats = 5, log = None):
+	'''
+	Runs benchmarks. Each repeat calls setup again (untimed), then times the work once.
+	@param benchmarks The Benchmarks to run.
+	@param seed The seed given to every setup, so that every run does exactly the same work.
+	@param repeats The number of times each benchmark is timed.
+	@param log If given, called with a line of text after each benchmark.
+	@return The results, as a dictionary that can be written with save().
+	'''
+	results = {}
+	for bench in benchmarks:
+		times = []
+		for i in range(repeats):
+			work = bench.setup(seed)
+			start = time.perf_counter_ns()
+			work()
+			times.append(time.perf_counter_ns()-start)
+		perOperation = [elapsed/bench.operations for elapsed in times]
+		results[bench.name] = {
+			'operations': bench.operations,
+			'repeats': repeats,
+			'minNs': min(perOperation),
+			'medianNs': statistics.median(perOperation),
+			'meanNs': statistics.mean(perOperation),
+		}
+		if log is not None:
+			log(f"{bench.name:<40} {results[bench.name]['medianNs']:>14.1f} ns/op")
+	return {
+		'format': FORMAT_VERSION,
+		'seed': seed,
+		'environment': environment(),
+		'results': results,
+	}
+
+def environment():
+	'''
+	Describes the machine and software the benchmarks ran on.
+	@return A dictionary.
+	'''
+	try:
+		import numpy
+		numpyVersion = numpy.__version__
+	except ImportError:
+		numpyVersion = None
+	return {
+		'python': platform.python_version(),
+		'implementation': platform.python_implementation(),
+		'platform': platform.platform(),
+		'machine': platform.machine(),
+		'numpy': numpyVersion,
+	}
+
+def save(results, path):
+	'''
+	Writes results to a JSON file.
+	@param results The dictionary returned by run().
+	@param path The path of the file. If "-", the results are written to standard output.
+	'''
+	text = json.dumps(results, indent=2, sort_keys=True)
+	if path == "-":
+		sys.stdout.write(text+"\n")
+		return
+	with open(path, 'w') as file:
+		file.write(text+"\n")
+
+def load(path):
+	'''
+	Reads results from a JSON file.
+	@param path The path of the file.
+	@raise ValueError If the file was written by an incompatible version.
+	@return The results.
+	'''
+	with open(path) as file:
+		results = json.load(file)
+	if results.get('format') != FORMAT_VERSION:
+		raise ValueError(f"{path} has result format {results.get('format')}, not {FORMAT_VERSION}.")
+	return results
+
+def compare(old, new):
+	'''
+	Compares the median time per operation of two sets of results.
+	@param old The earlier results.
+	@param new The later results.
+	@return A list of (name, old median, new median, new/old ratio) tuples, for every benchmark in both, sorted by name. A ratio above 1 is a slowdown.
+	'''
+	rows = []
+	for name in sorted(set(old['results']) & set(new['results'])):
+		before = old['results'][name]['medianNs']
+		after = new['results'][name]['medianNs']
+		rows.append((name, before, after, after/before if before else float('inf')))
+	return rows
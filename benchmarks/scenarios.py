@@ -0,0 +1,176 @@
+'''
+Open Combat Flow - benchmarks/scenarios.py
+@purpose The benchmark scenarios. Every scenario builds everything it needs from the seed it is given, so runs with the same seed do exactly the same work.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.blocks as blocks
+import opencombatflow.character as character
+import opencombatflow.dice as dice
+import opencombatflow.enforce as enforce
+from benchmarks.runner import benchmark
+import math
+import random
+
+DICE_ROLLS = 10000 #Rolls per timed call, for the dice benchmarks.
+DICE_STRINGS = {
+	'simple': "1d6",
+	'heavy': "10d6+5d8+3d12+7",
+	'conditional': "1d20+5>15",
+} #The dice strings rolled by the dice benchmarks.
+ENFORCE_CHECKS = 2000 #Blocks checked per timed call, for the enforce benchmarks.
+DAMAGE_ROLLS = 2000 #Damage blocks rolled per timed call, for the damage benchmark.
+RANGE_QUERIES = 200 #Queries per timed call, for the range benchmarks.
+RANGE_SIZES = (100, 1000, 10000) #Numbers of characters for the range benchmarks.
+DENSITY = 10 #The average distance between neighbouring characters, in the range benchmarks.
+CROWD_SPREAD = DENSITY*math.sqrt(1000)/3 #The size of the square the mass battles are fought in. Packed tightly enough that every area attack hits more targets than BATCH_THRESHOLD.
+BATCH_THRESHOLD = 16 #The batch threshold of the batched mass battle.
+HUGE_HP = 10**9 #Encounters give everyone this much HP, so the same number of turns is played every time.
+
+class Soldier(character.Character):
+	'''
+	A benchmark character. Soldiers strike a random enemy; mages (area=True) hit every enemy near a random enemy.
+	'''
+
+	def __init__(self, handler, name, group, position, area = False):
+		self.handler = handler
+		self.name = name
+		self.groups = [group]
+		self.HP = HUGE_HP
+		self.position = list(position)
+		self.area = area
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		target = self.handler.getRandomCharacterInRange({'group': enemy})
+		if self.area:
+			return {
+				'name': "fireball",
+				'user': self,
+				'range': {'group': enemy, 'center': target.position, 'distance': 2*DENSITY},
+				'damage': {'fire': "3d6"},
+				'effects': {'burning': "1d3"},
+				'chance': "1d20>4",
+			}
+		return {
+			'name': "slash",
+			'user': self,
+			'range': {'character': target},
+			'damage': {'slashing': "1d8+2"},
+			'chance': "1d20+4>10",
+			'failureCondition': {'name': "stumble", 'user': self, 'range': {'character': self}, 'damage': {'bludgeoning': 1}},
+		}
+
+	def getReactionBlock(self, action):
+		return {'user': self, 'name': "parry", 'resistance': {'slashing': "1d2"}}
+
+def _encounter(seed, sides, mageEvery = 0, spread = 0, spatialIndex = False, batch = None):
+	'''
+	PRIVATE: Builds an encounter: sides characters on each side, alternating in turn order.
+	'''
+	random.seed(seed)
+	handler = character.combatHandler(seed=seed)
+	generator = random.Random(seed)
+	for i in range(2*sides):
+		position = (generator.uniform(0, spread), generator.uniform(0, spread), 0)
+		handler.addCharacter(Soldier(handler, f"unit{i}", "AB"[i%2], position, area=bool(mageEvery) and i%mageEvery == 0))
+	if spatialIndex:
+		handler.enableSpatialIndex(2*DENSITY)
+	if batch is not None:
+		handler.setBatchResolution(batch)
+	return handler
+
+def _runTurns(handler, turns):
+	'''
+	PRIVATE: Returns work that plays a fixed number of turns.
+	'''
+	return lambda: handler.run(max_turns=turns, until=None)
+
+#Dice
+
+for _case, _diceString in DICE_STRINGS.items():
+	def _setup(seed, diceString = _diceString):
+		random.seed(seed)
+		evaluate = dice.evaluate
+		return lambda: [evaluate(diceString) for i in range(DICE_ROLLS)]
+	benchmark(f"dice.evaluate.{_case}", DICE_ROLLS)(_setup)
+
+	if dice.numpy is not None:
+		def _setupMany(seed, diceString = _diceString):
+			return lambda: dice.evaluate_many(diceString, DICE_ROLLS, rng=seed)
+		benchmark(f"dice.evaluate_many.{_case}", DICE_ROLLS)(_setupMany)
+
+#Enforcement
+
+def _nestedAction(depth):
+	'''
+	PRIVATE: Builds an action with failure conditions nested depth deep.
+	'''
+	user = Soldier(None, "user", "A", (0, 0, 0))
+	action = {'name': "stumble", 'user': user, 'range': {'character': user}, 'damage': {'bludgeoning': 1}}
+	for level in range(depth):
+		action = {
+			'name': f"strike{level}",
+			'user': user,
+			'range': {'group': "B", 'center': [0, 0, 0], 'distance': 20},
+			'damage': {'slashing': "2d6+3", 'fire': "1d4"},
+			'chance': "1d20+2>12",
+			'failureCondition': action,
+		}
+	return action
+
+@benchmark("enforce.nestedAction", ENFORCE_CHECKS)
+def _enforceNested(seed):
+	action = _nestedAction(3)
+	return lambda: [enforce.enforce(action, "action") for i in range(ENFORCE_CHECKS)]
+
+@benchmark("enforce.nestedActionFrozen", ENFORCE_CHECKS)
+def _enforceNestedFrozen(seed):
+	action = enforce.freeze(_nestedAction(3))
+	return lambda: [enforce.enforce(action, "action") for i in range(ENFORCE_CHECKS)]
+
+@benchmark("enforce.nestedActionBlock", ENFORCE_CHECKS)
+def _enforceNestedBlock(seed):
+	action = blocks.ActionBlock(_nestedAction(3))
+	return lambda: [enforce.enforce(action, "action") for i in range(ENFORCE_CHECKS)]
+
+#Damage
+
+@benchmark("damage.getDamageBlock", DAMAGE_ROLLS)
+def _damage(seed):
+	handler = _encounter(seed, 1)
+	handler.setValidationMode('off') #Only the rolling is measured.
+	attacker, defender = handler.alive
+	action = attacker.getActionBlock()
+	reaction = defender.getReactionBlock(action)
+	return lambda: [handler._getDamageBlock(action, reaction) for i in range(DAMAGE_ROLLS)]
+
+#Range queries
+
+for _size in RANGE_SIZES:
+	for _indexed in (False, True):
+		def _setup(seed, size = _size, indexed = _indexed):
+			spread = DENSITY*math.sqrt(size)
+			handler = _encounter(seed, size//2, spread=spread, spatialIndex=indexed)
+			generator = random.Random(seed)
+			queries = [{'center': [generator.uniform(0, spread), generator.uniform(0, spread), 0], 'distance': 2*DENSITY} for i in range(RANGE_QUERIES)]
+			return lambda: [handler.getAllInRange(query) for query in queries]
+		benchmark(f"range.getAllInRange.{_size}.{'indexed' if _indexed else 'scan'}", RANGE_QUERIES)(_setup)
+
+#Encounters
+
+@benchmark("encounter.duel", 500)
+def _duel(seed):
+	return _runTurns(_encounter(seed, 1), 500)
+
+@benchmark("encounter.skirmish", 500)
+def _skirmish(seed):
+	return _runTurns(_encounter(seed, 10, spread=50), 500)
+
+@benchmark("encounter.massAoE", 200)
+def _massAoE(seed):
+	return _runTurns(_encounter(seed, 500, mageEvery=2, spread=CROWD_SPREAD, spatialIndex=True), 200)
+
+@benchmark("encounter.massAoEBatched", 200)
+def _massAoEBatched(seed):
+	return _runTurns(_encounter(seed, 500, mageEvery=2, spread=CROWD_SPREAD, spatialIndex=True, batch=BATCH_THRESHOLD), 200)
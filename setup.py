@@ -11,4 +11,8 @@ setup(name='opencombatflow',
       license='MIT',
       keywords='games game rpg turn',
       long_description=long_description,
+      packages=['opencombatflow'],
+      package_dir={'opencombatflow': 'OpenCombatFlow'}, #The code imports the package as opencombatflow.
+      package_data={'opencombatflow': ['DSD.txt', 'DiceStringFormat.txt']},
+      extras_require={'numpy': ['numpy']},
       include_package_data=True)
\ No newline at end of file
@@ -0,0 +1,94 @@
+'''
+Open Combat Flow - tests/sentries.py
+@purpose Shared by the tests that gather reactions concurrently: the Sentry, which takes a while to react, and the seeded serial fight that concurrent fights must match exactly.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import opencombatflow.combatlog as combatlog
+import threading
+import time
+
+DELAY = 0.01 #Seconds each reaction takes.
+SEEDS = 3
+SENTRIES = 6 #Sentries in each fight.
+MAX_TURNS = 40
+
+class InFlight():
+	'''
+	Counts the reactions being gathered at once, and the most there have ever been. Used as a context manager around each reaction.
+	'''
+
+	def __init__(self):
+		self.now = 0
+		self.most = 0
+		self._lock = threading.Lock()
+
+	def __enter__(self):
+		with self._lock:
+			self.now+=1
+			self.most = max(self.most, self.now)
+
+	def __exit__(self, *exc):
+		with self._lock:
+			self.now-=1
+
+class Sentry(character.Character):
+	'''
+	Sweeps every enemy, and takes DELAY seconds to react. Some sentries resist, and some retaliate.
+	'''
+
+	def __init__(self, index, inFlight):
+		self.name = f"sentry{index}"
+		self.groups = ["AB"[index%2]]
+		self.HP = 14
+		self.effects = {}
+		self.position = [0, 0, 0]
+		self.index = index
+		self.inFlight = inFlight
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		return {'name': "sweep", 'user': self, 'range': {'group': enemy}, 'damage': {'base': "1d6"}, 'chance': "1d20>5"}
+
+	def getReactionBlock(self, action):
+		with self.inFlight:
+			time.sleep(DELAY)
+		return self.react(action)
+
+	def react(self, action):
+		'''
+		Chooses a reaction, without waiting.
+		'''
+		reaction = {'user': self, 'name': "brace"}
+		if self.index%3 == 1:
+			reaction['resistance'] = {'base': "1d2"}
+		if self.index%3 == 2 and action['name'] == "sweep":
+			reaction['action'] = {'name': "riposte", 'user': self, 'range': {'character': action['user']}, 'damage': {'base': "1d3"}}
+		return reaction
+
+def addSentries(handler, sentryClass = Sentry):
+	'''
+	Adds SENTRIES sentries to a handler, sharing one InFlight.
+	@return The sentries, and their InFlight.
+	'''
+	inFlight = InFlight()
+	sentries = [sentryClass(i, inFlight) for i in range(SENTRIES)]
+	for sentry in sentries:
+		handler.addCharacter(sentry)
+	return sentries, inFlight
+
+def outcome(handler, sentries, summary):
+	'''
+	Sums up a finished fight, with no live references.
+	'''
+	return summary, [combatlog.summarize(message) for message in handler.getLog()], [sentry.HP for sentry in sentries]
+
+def serialFight(seed):
+	'''
+	Runs a seeded fight on a plain combatHandler, gathering reactions one at a time.
+	@return The outcome, which a concurrent fight with the same seed must match.
+	'''
+	handler = character.combatHandler(seed=seed)
+	sentries, inFlight = addSentries(handler)
+	return outcome(handler, sentries, handler.run(max_turns=MAX_TURNS))
@@ -0,0 +1,91 @@
+'''
+Open Combat Flow - tests/test_actionchains.py
+@purpose Tests that long chains of retaliations run without hitting the recursion limit, on both combatHandler and AsyncCombatHandler, and that the action budget cuts them short.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.asynchandler as asynchandler
+import opencombatflow.character as character
+import asyncio
+import sys
+import unittest
+
+CHAIN = 5000 #Retaliations in the deep chain. Several times the default recursion limit.
+
+class Duelist(character.Character):
+	'''
+	Ripostes every attack, until the duel has gone on for a given number of ripostes.
+	'''
+
+	def __init__(self, name, group, duel):
+		self.name = name
+		self.groups = [group]
+		self.HP = 10
+		self.effects = {}
+		self.position = [0, 0, 0]
+		self.duel = duel
+
+	def getActionBlock(self):
+		return {'name': "lunge", 'user': self, 'range': {'character': self.duel['opponent'][self]}, 'damage': {'base': 0}}
+
+	def getReactionBlock(self, action):
+		if self.duel['ripostes'] >= self.duel['limit']:
+			return {'user': self, 'name': "parry"}
+		self.duel['ripostes']+=1
+		return {'user': self, 'name': "parry", 'action': {'name': "riposte", 'user': self, 'range': {'character': action['user']}, 'damage': {'base': 0}}}
+
+class AsyncDuelist(Duelist):
+	'''
+	A Duelist that decides asynchronously.
+	'''
+
+	async def getReactionBlock(self, action):
+		await asyncio.sleep(0)
+		return Duelist.getReactionBlock(self, action)
+
+def _duel(handlerClass, duelistClass, limit):
+	duel = {'ripostes': 0, 'limit': limit, 'opponent': {}}
+	handler = handlerClass()
+	first, second = duelistClass("first", "A", duel), duelistClass("second", "B", duel)
+	duel['opponent'] = {first: second, second: first}
+	handler.addCharacter(first)
+	handler.addCharacter(second)
+	return handler, duel
+
+def _hits(handler):
+	return sum(1 for message in handler.getLog() if message['messageType'] == 'attackHit')
+
+class ActionChainTest(unittest.TestCase):
+
+	def test_deepChain(self):
+		self.assertGreater(CHAIN, sys.getrecursionlimit())
+		handler, duel = _duel(character.combatHandler, Duelist, CHAIN)
+		handler.turn()
+		self.assertEqual(duel['ripostes'], CHAIN)
+		self.assertEqual(_hits(handler), CHAIN+1)
+
+	def test_deepChainAsync(self):
+		handler, duel = _duel(asynchandler.AsyncCombatHandler, AsyncDuelist, CHAIN)
+		asyncio.run(handler.turn())
+		self.assertEqual(duel['ripostes'], CHAIN)
+		self.assertEqual(_hits(handler), CHAIN+1)
+
+	def test_deepChainBatched(self):
+		handler, duel = _duel(character.combatHandler, Duelist, CHAIN)
+		handler.setBatchResolution(1)
+		handler.turn()
+		self.assertEqual(_hits(handler), CHAIN+1)
+
+	def test_depthBudget(self):
+		for handlerClass, duelistClass in ((character.combatHandler, Duelist), (asynchandler.AsyncCombatHandler, AsyncDuelist)):
+			handler, duel = _duel(handlerClass, duelistClass, CHAIN)
+			handler.setActionBudget(maxDepth=10)
+			result = handler.turn()
+			if handlerClass is asynchandler.AsyncCombatHandler:
+				asyncio.run(result)
+			self.assertEqual(_hits(handler), 10)
+			self.assertEqual(handler.truncatedActions, 1)
+			self.assertEqual(handler.getLog()[-1]['reason'], 'depth')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,109 @@
+'''
+Open Combat Flow - tests/test_archive.py
+@purpose Tests that an archive reads back every message of a seeded fight, including who reacted, that jumping to a turn gives exactly that turn's messages, and that iterating in chunks gives the same records as indexing.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.archive as archive
+import opencombatflow.character as character
+import opencombatflow.combatlog as combatlog
+import os
+import tempfile
+import unittest
+
+class Guard(character.Character):
+	'''
+	Sweeps every enemy. Some guards resist, and some retaliate, so reactions come from many characters.
+	'''
+
+	def __init__(self, index):
+		self.name = f"guard{index}"
+		self.groups = ["AB"[index%2]]
+		self.HP = 16
+		self.effects = {}
+		self.position = [0, 0, 0]
+		self.index = index
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		return {'name': "sweep", 'user': self, 'range': {'group': enemy}, 'damage': {'base': "1d6"}, 'effects': {'dazed': "1"}, 'chance': "1d20>6"}
+
+	def getReactionBlock(self, action):
+		reaction = {'user': self, 'name': "brace"}
+		if self.index%3 == 1:
+			reaction = {'user': self, 'name': "block", 'resistance': {'base': "1d2"}}
+		if self.index%3 == 2 and action['name'] == "sweep":
+			reaction = {'user': self, 'name': "counter", 'action': {'name': "riposte", 'user': self, 'range': {'character': action['user']}, 'damage': {'base': "1d3"}}}
+		return reaction
+
+def _expected(message):
+	'''
+	Gets the ArchiveRecord fields that a logBlock should read back as, apart from the turn.
+	'''
+	summary = combatlog.summarize(message)
+	reactor = message['reaction']['user'].name if 'reaction' in message else None
+	return (summary['messageType'], summary.get('character', summary.get('user')), summary.get('action'), summary.get('reaction'), reactor, summary.get('damageTaken'), summary.get('effects', {}))
+
+def _fields(record):
+	'''
+	Gets the fields of an ArchiveRecord, apart from the turn.
+	'''
+	return (record.messageType,)+tuple(record[2:])
+
+class ArchiveTest(unittest.TestCase):
+
+	def setUp(self):
+		handle, self.path = tempfile.mkstemp(suffix=".ocflog")
+		os.close(handle)
+		handler = character.combatHandler(seed=5)
+		for i in range(8):
+			handler.addCharacter(Guard(i))
+		with archive.ArchiveWriter(self.path) as writer:
+			handler.configureLog(sinks=[writer])
+			handler.run(max_turns=60)
+		self.log = handler.getLog()
+		self.turns = handler.turnCount
+
+	def tearDown(self):
+		os.remove(self.path)
+
+	def test_roundTrip(self):
+		with archive.ArchiveReader(self.path) as reader:
+			self.assertEqual(len(reader), len(self.log))
+			self.assertEqual([_fields(record) for record in reader], [_expected(message) for message in self.log])
+			reactions = [record for record in reader if record.messageType == 'reaction']
+			self.assertGreater(len({record.reactor for record in reactions}), 1)
+			self.assertTrue(all(record.reactor != record.character for record in reactions)) #Nobody reacts to their own action.
+
+	def test_turn(self):
+		expected = []
+		for message in self.log:
+			if message['messageType'] == 'startOfTurn' or expected == []:
+				expected.append([])
+			expected[-1].append(_expected(message))
+		with archive.ArchiveReader(self.path) as reader:
+			self.assertEqual(reader.turnCount(), len(expected))
+			self.assertEqual(reader.turnCount(), self.turns)
+			for turn in reversed(range(reader.turnCount())): #Out of order, so each turn is found through the index.
+				records = list(reader.turn(turn))
+				self.assertTrue(all(record.turn == turn for record in records))
+				self.assertEqual([_fields(record) for record in records], expected[turn])
+			with self.assertRaises(IndexError):
+				reader.turn(reader.turnCount())
+
+	def test_chunks(self):
+		chunkRecords = archive.CHUNK_RECORDS
+		archive.CHUNK_RECORDS = 7 #Many chunks, with the last one cut short.
+		try:
+			with archive.ArchiveReader(self.path) as reader:
+				indexed = [reader[i] for i in range(len(reader))]
+				self.assertNotEqual(len(reader)%archive.CHUNK_RECORDS, 0)
+				self.assertEqual(list(reader), indexed)
+				self.assertEqual(list(reader.records(5, 30)), indexed[5:30])
+				self.assertEqual(list(reader.records(-3, len(reader)+10)), indexed)
+				self.assertEqual(reader[-1], indexed[-1])
+		finally:
+			archive.CHUNK_RECORDS = chunkRecords
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,40 @@
+'''
+Open Combat Flow - tests/test_asynchandler.py
+@purpose Tests that the AsyncCombatHandler, which gathers slow reactions concurrently, plays seeded fights exactly as the serial combatHandler does.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.asynchandler as asynchandler
+import sentries
+import asyncio
+import unittest
+
+class AsyncSentry(sentries.Sentry):
+	'''
+	A Sentry whose reactions are coroutines.
+	'''
+
+	async def getReactionBlock(self, action):
+		with self.inFlight:
+			await asyncio.sleep(sentries.DELAY)
+		return self.react(action)
+
+def _async(seed):
+	'''
+	Runs a seeded fight on an AsyncCombatHandler.
+	@return The outcome, and the most reactions that were awaited at once.
+	'''
+	handler = asynchandler.AsyncCombatHandler(seed=seed)
+	fighters, inFlight = sentries.addSentries(handler, AsyncSentry)
+	return sentries.outcome(handler, fighters, asyncio.run(handler.run(max_turns=sentries.MAX_TURNS))), inFlight.most
+
+class AsyncEquivalenceTest(unittest.TestCase):
+
+	def test_matchesSerial(self):
+		for seed in range(sentries.SEEDS):
+			outcome, most = _async(seed)
+			self.assertEqual(outcome, sentries.serialFight(seed), f"seed {seed}")
+			self.assertEqual(most, sentries.SENTRIES//2, f"seed {seed}") #Every target of a sweep was awaited at once, at least on the first turn.
+
+if __name__ == '__main__':
+	unittest.main()
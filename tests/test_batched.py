@@ -0,0 +1,112 @@
+'''
+Open Combat Flow - tests/test_batched.py
+@purpose Tests that batched resolution (combatHandler.setBatchResolution) has the same effect as resolving an action one target at a time, when failure conditions and retaliations kill targets part way through.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import collections
+import unittest
+
+class Unit(character.Character):
+	'''
+	A character whose blocks are given by the test.
+	'''
+
+	def __init__(self, name, group, HP, action = None, reaction = None):
+		self.name = name
+		self.groups = [group]
+		self.HP = HP
+		self.effects = {}
+		self.position = [0, 0, 0]
+		self.action = action
+		self.reaction = reaction
+
+	def getActionBlock(self):
+		return self.action(self)
+
+	def getReactionBlock(self, action):
+		if self.reaction is None or action['name'] != "sweep":
+			return {'user': self, 'name': "brace"}
+		return self.reaction(self, action)
+
+def _play(units, batchThreshold):
+	'''
+	Plays the first unit's turn, and returns what happened.
+	'''
+	handler = character.combatHandler(seed=0)
+	for unit in units:
+		handler.addCharacter(unit)
+	if batchThreshold is not None:
+		handler.setBatchResolution(batchThreshold)
+	handler.turn()
+	counts = collections.Counter(message['messageType'] for message in handler.getLog())
+	deaths = [message['character'].name for message in handler.getLog() if message['messageType'] == 'death']
+	return {unit.name: unit.HP for unit in units}, counts, deaths, [unit.name for unit in handler.alive]
+
+def _sweep(chance = None, failureCondition = None):
+	def action(user):
+		block = {'name': "sweep", 'user': user, 'range': {'group': "B"}, 'damage': {'base': 1}}
+		if chance is not None:
+			block['chance'] = chance
+		if failureCondition is not None:
+			block['failureCondition'] = failureCondition(user)
+		return block
+	return action
+
+class BatchedTest(unittest.TestCase):
+
+	def assertSameAsSerial(self, build):
+		serial = _play(build(), None)
+		for threshold in (1, 2, 4):
+			self.assertEqual(_play(build(), threshold), serial)
+
+	def test_failureConditionKillsTargets(self):
+		#The first miss wipes out every target, so nobody else is resolved.
+		def build():
+			wipe = lambda user: {'name': "backfire", 'user': user, 'range': {'group': "B"}, 'damage': {'base': 100}}
+			attacker = Unit("attacker", "A", 50, _sweep(chance="1d1>1", failureCondition=wipe))
+			return [attacker]+[Unit(f"b{i}", "B", 10) for i in range(6)]
+		self.assertSameAsSerial(build)
+		self.assertEqual(_play(build(), 2)[1]['attackFailure'], 1)
+
+	def test_failureConditionKillsSomeTargets(self):
+		#The first miss kills the last target, which must then be skipped.
+		def build():
+			targets = [Unit(f"b{i}", "B", 10) for i in range(6)]
+			stray = lambda user: {'name': "stray", 'user': user, 'range': {'character': targets[-1]}, 'damage': {'base': 100}}
+			return [Unit("attacker", "A", 50, _sweep(chance="1d1>1", failureCondition=stray))]+targets
+		self.assertSameAsSerial(build)
+		self.assertEqual(_play(build(), 2)[1]['attackFailure'], 5)
+
+	def test_retaliationsKillLaterTargets(self):
+		#Every other target retaliates by killing the target after it, which then must not be hit, react or retaliate.
+		def build():
+			targets = [Unit(f"b{i}", "B", 10) for i in range(6)]
+			for i in range(0, 6, 2):
+				victim = targets[i+1]
+				targets[i].reaction = lambda user, action, victim=victim: {'user': user, 'name': "cleave", 'action': {'name': "cleave", 'user': user, 'range': {'character': victim}, 'damage': {'base': 100}}}
+				targets[i+1].reaction = lambda user, action: {'user': user, 'name': "riposte", 'action': {'name': "riposte", 'user': user, 'range': {'character': action['user']}, 'damage': {'base': 5}}}
+			return [Unit("attacker", "A", 50, _sweep())]+targets
+		self.assertSameAsSerial(build)
+		self.assertEqual(_play(build(), 2)[1]['attackHit'], 6)
+
+	def test_retaliationsKillAttacker(self):
+		#The attacker dies part way through, but the remaining targets are still resolved.
+		def build():
+			riposte = lambda user, action: {'user': user, 'name': "riposte", 'action': {'name': "riposte", 'user': user, 'range': {'character': action['user']}, 'damage': {'base': 4}}}
+			return [Unit("attacker", "A", 10, _sweep())]+[Unit(f"b{i}", "B", 10, reaction=riposte) for i in range(5)]
+		self.assertSameAsSerial(build)
+
+	def test_intChances(self):
+		#An int chance works as in dice.evaluate(): 0 always misses, and any other int always hits.
+		for chance, hits in ((0, 0), (1, 3), (-2, 3)):
+			build = lambda: [Unit("attacker", "A", 50, _sweep(chance=chance))]+[Unit(f"b{i}", "B", 10) for i in range(3)]
+			self.assertSameAsSerial(build)
+			HP, counts, deaths, alive = _play(build(), 1)
+			self.assertEqual(counts['attackHit'], hits)
+			self.assertEqual(counts['attackFailure'], 3-hits)
+			self.assertEqual([HP[f"b{i}"] for i in range(3)], [10 if hits == 0 else 9]*3)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,143 @@
+'''
+Open Combat Flow - tests/test_blocks.py
+@purpose Tests that the block classes are equivalent to plain dicts: enforce() accepts and rejects the same blocks, blocks read back the same keys and values, and a seeded fight plays the same with blocks as with dicts.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.blocks as blocks
+import opencombatflow.character as character
+import opencombatflow.combatlog as combatlog
+import opencombatflow.enforce as enforce
+import pickle
+import unittest
+
+USER = character.Character()
+
+VALID = [
+	('action', {'name': "strike", 'user': USER, 'range': {'group': "B"}, 'damage': {'slashing': "2d6"}}),
+	('action', {'name': "blast", 'user': USER, 'range': {'center': [1, 2], 'distance': 3.5}, 'damage': {'fire': 4}, 'chance': "1d20>8", 'failureCondition': {'name': "fizzle", 'user': USER, 'range': {'character': USER}, 'damage': {'fire': "1"}}}),
+	('action', {'name': "mark", 'user': USER, 'range': {}, 'note': "not in the DSD"}),
+	('range', {'center': (0, 0, 0), 'distance': 10, 'group': "A"}),
+	('range', {}),
+	('reaction', {'user': USER, 'name': "block", 'resistance': {'slashing': "1d4"}}),
+	('reaction', {'user': USER, 'action': {'name': "riposte", 'user': USER, 'range': {'character': USER}, 'damage': {'piercing': "1d3"}}}),
+	('damage', {'damageTaken': 5, 'effects': {'burning': 2}}),
+	('damage', {}),
+]
+
+INVALID = [
+	('action', {'name': "strike", 'user': USER, 'damage': {'slashing': "2d6"}}), #No range.
+	('action', {'name': "strike", 'user': USER, 'range': {'group': 1}}), #The group is not a string.
+	('action', {'name': "strike", 'user': USER, 'range': {}, 'damage': {'slashing': "two"}}), #Not a dice string.
+	('action', {'name': "strike", 'user': USER, 'range': {}, 'failureCondition': {'name': "fizzle", 'user': USER}}), #The nested action has no range.
+	('range', {'distance': "far"}),
+	('reaction', {'name': "block"}), #No user.
+	('reaction', {'user': USER, 'action': {'name': "riposte", 'user': "nobody", 'range': {}}}),
+	('damage', {'damageTaken': "5"}),
+	('damage', {'effects': {'burning': "2"}}),
+]
+
+class EnforceEquivalenceTest(unittest.TestCase):
+
+	def test_valid(self):
+		for blockType, block in VALID:
+			enforce.enforce(block, blockType)
+			built = blocks.BLOCK_CLASSES[blockType](block)
+			enforce.enforce(built, blockType)
+			self.assertEqual(built, enforce.freeze(block))
+			self.assertEqual(built.toDict(), {key: _asList(value) for key, value in block.items()})
+			self.assertEqual(set(built), set(block))
+			self.assertEqual(len(built), len(block))
+
+	def test_invalid(self):
+		for blockType, block in INVALID:
+			with self.assertRaises(KeyError, msg=block):
+				enforce.enforce(block, blockType)
+			with self.assertRaises(KeyError, msg=block):
+				blocks.BLOCK_CLASSES[blockType](block)
+
+	def test_validatorModes(self):
+		for mode in enforce.Validator.MODES:
+			validator = enforce.Validator(mode)
+			for blockType, block in VALID:
+				validator.enforce(blocks.BLOCK_CLASSES[blockType](block), blockType)
+				validator.enforce(block, blockType)
+			if mode == 'strict':
+				for blockType, block in INVALID:
+					with self.assertRaises(KeyError, msg=block):
+						validator.enforce(block, blockType)
+		validator = enforce.Validator('first')
+		built = blocks.ActionBlock(VALID[0][1])
+		for i in range(3):
+			validator.enforce(built, "action")
+		self.assertEqual(validator.getCounters(), {'performed': 0, 'skipped': 3}) #Blocks were checked when they were built.
+
+	def test_frozen(self):
+		built = blocks.ActionBlock(VALID[1][1])
+		self.assertIs(type(built.range), blocks.RangeBlock)
+		self.assertIs(type(built.failureCondition), blocks.ActionBlock)
+		self.assertEqual(built['damage'], built.damage)
+		with self.assertRaises(AttributeError):
+			built.name = "other"
+		with self.assertRaises(TypeError):
+			built.damage['fire'] = 9
+		for block in (built.range, blocks.DamageBlock(VALID[7][1])):
+			self.assertEqual(pickle.loads(pickle.dumps(block)), block)
+		self.assertNotIn('effects', built)
+		with self.assertRaises(KeyError):
+			built['effects']
+
+def _asList(value):
+	'''
+	Gets a value as toDict() gives it back: tuples become lists, and nested dicts are copied.
+	'''
+	if isinstance(value, dict):
+		return {key: _asList(element) for key, element in value.items()}
+	if isinstance(value, (list, tuple)):
+		return [_asList(element) for element in value]
+	return value
+
+class Fighter(character.Character):
+	'''
+	Attacks with either a dict or an ActionBlock, and reacts with either a dict or a ReactionBlock.
+	'''
+
+	def __init__(self, index, useBlocks):
+		self.name = f"fighter{index}"
+		self.groups = ["AB"[index%2]]
+		self.HP = 15
+		self.effects = {}
+		self.position = [index, 0, 0]
+		enemy = "B" if self.groups[0] == "A" else "A"
+		self.action = {'name': "sweep", 'user': self, 'range': {'group': enemy}, 'damage': {'slashing': "1d6", 'fire': "1d2"}, 'effects': {'burning': "1"}, 'chance': "1d20>6"}
+		self.reaction = {'user': self, 'name': "block", 'resistance': {'slashing': "1d2"}}
+		if index%3 == 0:
+			self.reaction['action'] = {'name': "riposte", 'user': self, 'range': {'group': enemy, 'center': [index, 0], 'distance': 2}, 'damage': {'piercing': "1d3"}}
+		if useBlocks:
+			self.action = blocks.ActionBlock(self.action)
+			self.reaction = blocks.ReactionBlock(self.reaction)
+
+	def getActionBlock(self):
+		return self.action
+
+	def getReactionBlock(self, action):
+		return self.reaction
+
+def _fight(seed, useBlocks):
+	'''
+	Runs a seeded fight, and sums up its log with no live references.
+	'''
+	handler = character.combatHandler(seed=seed)
+	for i in range(6):
+		handler.addCharacter(Fighter(i, useBlocks))
+	handler.run(max_turns=60)
+	return [combatlog.summarize(message) for message in handler.getLog()], [(c.name, c.HP, dict(c.effects)) for c in handler.alive]
+
+class FightEquivalenceTest(unittest.TestCase):
+
+	def test_sameFight(self):
+		for seed in range(5):
+			self.assertEqual(_fight(seed, True), _fight(seed, False), f"seed {seed}")
+
+if __name__ == '__main__':
+	unittest.main()
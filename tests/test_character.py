@@ -0,0 +1,108 @@
+'''
+Open Combat Flow - tests/test_character.py
+@purpose Tests that a plain Character can be used on its own: its attributes can be set, it can move, and it gets its own effects. Also tests that cached damage plans roll exactly as uncached plans and the blocks themselves do, and that the plan cache drops the plan used least recently.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import opencombatflow.dice as dice
+import collections
+import random
+import unittest
+
+class PlainCharacterTest(unittest.TestCase):
+
+	def test_attributes(self):
+		plain = character.Character()
+		plain.name = "plain"
+		plain.HP = 7
+		plain.setGroups(["A"])
+		self.assertEqual((plain.name, plain.HP, plain.groups), ("plain", 7, ["A"]))
+		self.assertEqual(character.Character.name, "Set") #The class defaults are untouched.
+
+	def test_setPosition(self):
+		plain = character.Character()
+		plain.setPosition(1, 2)
+		self.assertEqual(plain.position, [1, 2, 0])
+		self.assertEqual(character.Character.position, [0, 0, 0])
+
+	def test_effects(self):
+		first, second = character.Character(), character.Character()
+		first.effects = {'burning': 2}
+		self.assertEqual(dict(first.effects), {'burning': 2})
+		self.assertEqual(dict(second.effects), {})
+		first._update()
+		first._update()
+		self.assertEqual(dict(first.effects), {})
+
+USER = character.Character()
+WEAPONS = [
+	({'slashing': "2d6+1", 'fire': "1d4"}, {'slashing': "1d3"}, None),
+	({'piercing': "3d4"}, None, {'bleeding': "1d3", 'dazed': "1"}),
+	({'crushing': "1d8", 'cold': "1d6>3"}, {'crushing': "2d2", 'cold': "1"}, {'slowed': "1d2"}),
+]
+
+def _rollBlocks(damage, resistance, effects, rng):
+	'''
+	Rolls damage straight from the blocks, as the combatHandler did before damage plans.
+	'''
+	total = 0
+	for dType in damage:
+		if resistance is not None and dType in resistance:
+			total+=max(0, dice.evaluate(damage[dType], rng=rng)-dice.evaluate(resistance[dType], rng=rng))
+		else:
+			total+=dice.evaluate(damage[dType], rng=rng)
+	toReturn = {'damageTaken': total}
+	if effects is not None:
+		toReturn['effects'] = {}
+		if total != 0:
+			for effect in effects:
+				toReturn['effects'][effect] = dice.evaluate(effects[effect], rng=rng)
+	return toReturn
+
+class DamagePlanTest(unittest.TestCase):
+
+	def setUp(self):
+		character.clearDamagePlans()
+
+	def tearDown(self):
+		character.clearDamagePlans()
+
+	def _blocks(self, damage, resistance, effects):
+		action = {'name': "strike", 'user': USER, 'range': {}, 'damage': damage}
+		if effects is not None:
+			action['effects'] = effects
+		reaction = {'user': USER, 'name': "brace"}
+		if resistance is not None:
+			reaction['resistance'] = resistance
+		return action, reaction
+
+	def test_cachedMatchesUncached(self):
+		for damage, resistance, effects in WEAPONS:
+			action, reaction = self._blocks(damage, resistance, effects)
+			cachedRng, uncachedRng, blocksRng = random.Random(9), random.Random(9), random.Random(9)
+			cached, uncached, direct = [], [], []
+			for i in range(2000):
+				cached.append(character.damagePlan(action, reaction).roll(cachedRng))
+				character.clearDamagePlans()
+				uncached.append(character.damagePlan(action, reaction).roll(uncachedRng))
+				direct.append(_rollBlocks(damage, resistance, effects, blocksRng))
+			self.assertEqual(cached, uncached)
+			self.assertEqual(cached, direct)
+			distribution = collections.Counter(block['damageTaken'] for block in cached)
+			self.assertGreater(len(distribution), 3) #The rolls really vary.
+
+	def test_leastRecentlyUsed(self):
+		hot = self._blocks(*WEAPONS[0])
+		hotPlan = character.damagePlan(*hot)
+		for i in range(character.DAMAGE_PLAN_CACHE_SIZE*2):
+			character.damagePlan(*self._blocks({'slashing': f"1d{i+2}"}, None, None))
+			if i%100 == 0:
+				self.assertIs(character.damagePlan(*hot), hotPlan) #Used often, so it is never dropped.
+		self.assertEqual(character._cachedDamagePlan.cache_info().currsize, character.DAMAGE_PLAN_CACHE_SIZE)
+		misses = character._cachedDamagePlan.cache_info().misses
+		character.damagePlan(*self._blocks({'slashing': "1d2"}, None, None)) #The first cold plan, long since dropped.
+		self.assertEqual(character._cachedDamagePlan.cache_info().misses, misses+1)
+
+if __name__ == '__main__':
+	unittest.main()
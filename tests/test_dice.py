@@ -0,0 +1,112 @@
+'''
+Open Combat Flow - tests/test_dice.py
+@purpose Tests that rolling a dice string many times at once with evaluateMany gives the same results, or the same distribution of results, as rolling it with evaluate over and over: for ints, for bare dice, with conditionals, and with return_bool. Also tests that the parse cache hands back independent expressions, which keep no state between rolls and cannot be changed by whoever holds them.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.dice as dice
+import collections
+import random
+import unittest
+
+N = 50000 #Rolls taken each way.
+TOLERANCE = 0.015 #The largest difference allowed between the frequencies of any result. Many standard deviations at N rolls.
+
+def _frequencies(results):
+	'''
+	Gets the fraction of the results that are each value.
+	'''
+	counts = collections.Counter(results)
+	return {value: count/len(results) for value, count in counts.items()}
+
+@unittest.skipIf(dice.numpy is None, "evaluateMany needs NumPy.")
+class EvaluateManyTest(unittest.TestCase):
+
+	def _compare(self, diceString, return_bool = False, failure_value = 0):
+		'''
+		Rolls diceString N times each way, from fixed seeds, and checks that every result has about the same frequency.
+		'''
+		expression = dice.parse(diceString, failure_value)
+		rng = random.Random(11)
+		serial = [expression.evaluate(return_bool, rng) for i in range(N)]
+		many = expression.evaluateMany(N, return_bool, dice.numpy.random.default_rng(11)).tolist()
+		self.assertEqual(len(many), N)
+		self.assertEqual({type(result) for result in many}, {type(result) for result in serial}, diceString)
+		serial, many = _frequencies(serial), _frequencies(many)
+		self.assertEqual(set(many), set(serial), diceString) #Exactly the same possible results.
+		for value in serial:
+			self.assertAlmostEqual(many[value], serial[value], delta=TOLERANCE, msg=f"{diceString}, result {value}")
+		return many
+
+	def test_ints(self):
+		for value in (0, 1, 7, -3):
+			expression = dice.parse(value)
+			rng = dice.numpy.random.default_rng(0)
+			state = rng.bit_generator.state
+			self.assertEqual(expression.evaluateMany(5, rng=rng).tolist(), [expression.evaluate()]*5)
+			self.assertEqual(expression.evaluateMany(5, True, rng).tolist(), [expression.evaluate(True) != 0]*5)
+			self.assertEqual(rng.bit_generator.state, state) #Nothing was drawn.
+
+	def test_bareDice(self):
+		for diceString in ("1d6", "2d6+1", "3d4-2", "1d20+1d4", "5"):
+			frequencies = self._compare(diceString)
+		self.assertEqual(frequencies, {5: 1.0})
+
+	def test_conditionals(self):
+		for diceString in ("1d20>12", "2d6<1d8", "1d4=1d4", "1d6+2>1d8"):
+			self._compare(diceString)
+		frequencies = self._compare("1d6>4", failure_value=-1)
+		self.assertEqual(set(frequencies), {-1, 5, 6})
+
+	def test_returnBool(self):
+		for diceString in ("1d20>12", "2d6<1d8", "1d4=1d4"):
+			self._compare(diceString, return_bool=True)
+		self.assertEqual(self._compare("2d6", return_bool=True), {True: 1.0}) #No conditional always succeeds.
+
+class ParseCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		dice.parse.cache_clear()
+
+	def test_cached(self):
+		first = dice.parse("2d6+1>1d8")
+		self.assertIs(dice.parse("2d6+1>1d8"), first)
+		self.assertEqual(dice.parse.cache_info().hits, 1)
+		dice.parse.cache_clear()
+		fresh = dice.parse("2d6+1>1d8")
+		self.assertIsNot(fresh, first)
+		self.assertEqual(fresh, first)
+
+	def test_keys(self):
+		default = dice.parse("1d6>4")
+		failing = dice.parse("1d6>4", -1)
+		self.assertIsNot(default, failing)
+		self.assertEqual((default.failure_value, failing.failure_value), (0, -1))
+		self.assertIs(type(dice.parse(5)), dice.ConstantExpression) #Not mixed up with the string "5".
+		self.assertIs(type(dice.parse("5")), dice.DiceExpression)
+		self.assertEqual(dice.parse("1d6>4").failure_value, 0) #Parsing with another failure value did not change the first expression.
+
+	def test_immutable(self):
+		expression = dice.parse("3d4")
+		with self.assertRaises(AttributeError):
+			expression.failure_value = 7
+		with self.assertRaises(AttributeError):
+			expression.pre.constant = 7
+		with self.assertRaises(AttributeError):
+			expression.cache = {}
+		self.assertEqual(dice.parse("3d4"), dice.DiceExpression(dice.DiceTerms(((3, 4),), 0), None, None, 0))
+
+	def test_noState(self):
+		shared = dice.parse("2d8-1d4")
+		mine, theirs = random.Random(1), random.Random(2)
+		interleaved = []
+		for i in range(200):
+			interleaved.append(shared.evaluate(rng=mine))
+			shared.evaluate(rng=theirs) #Someone else rolls the same expression in between.
+		dice.parse.cache_clear()
+		rng = random.Random(1)
+		alone = [dice.parse("2d8-1d4").evaluate(rng=rng) for i in range(200)]
+		self.assertEqual(interleaved, alone)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,34 @@
+'''
+Open Combat Flow - tests/test_dicemath.py
+@purpose Tests that the exact distributions of large numbers of dice, which are built by squaring smaller distributions, match the known moments.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.dicemath as dicemath
+from fractions import Fraction
+import unittest
+
+class DiceSumTest(unittest.TestCase):
+
+	def test_moments(self):
+		for numberDice, numberSides in ((1, 6), (7, 4), (100, 20), (129, 6)):
+			distribution = dicemath.distribution(f"{numberDice}d{numberSides}")
+			self.assertEqual(distribution.mean(), Fraction(numberDice*(numberSides+1), 2))
+			self.assertEqual(distribution.variance(), Fraction(numberDice*(numberSides**2-1), 12))
+			self.assertEqual(sum(distribution.pmf().values()), 1)
+
+	def test_packedConvolution(self):
+		offset, counts = dicemath._diceSumCounts(130, 3)
+		serial = (1,)
+		for i in range(130):
+			serial = dicemath._addDie(serial, 3)
+		self.assertEqual(offset, 130)
+		self.assertEqual(counts, serial)
+
+	def test_pmfCopy(self):
+		distribution = dicemath.distribution("2d6")
+		distribution.pmf()[7] = 0
+		self.assertEqual(distribution.pmf()[7], Fraction(1, 6))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+'''
+Open Combat Flow - tests/test_effects.py
+@purpose Tests that TimedEffects behaves exactly like a dict that is counted down on every turn, including for effects that last far longer than most, so they outlive many turns of their neighbours.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.effects as effects
+import random
+import unittest
+
+class CountedDown():
+	'''
+	The original effects: a plain dict, with every effect counted down on every turn.
+	'''
+
+	def __init__(self):
+		self.effects = {}
+
+	def tick(self):
+		expired = []
+		for effect in self.effects:
+			self.effects[effect]-=1
+			if self.effects[effect] <= 0:
+				expired.append(effect)
+		for effect in expired:
+			del self.effects[effect]
+		return expired
+
+class TimedEffectsTest(unittest.TestCase):
+
+	def test_longDurations(self):
+		timed = effects.TimedEffects({'curse': 5000, 'burning': 3})
+		for turn in range(1, 5000):
+			self.assertNotIn('curse', timed.tick())
+			self.assertEqual(timed['curse'], 5000-turn)
+			if turn%7 == 0:
+				timed.add('burning', 3) #Short effects come and go all along.
+		self.assertEqual(timed.tick(), ['curse'])
+		self.assertNotIn('curse', timed)
+
+	def test_matchesCountingDown(self):
+		for seed in range(5):
+			rng = random.Random(seed)
+			timed = effects.TimedEffects()
+			reference = CountedDown()
+			names = [f"effect{i}" for i in range(12)]
+			for turn in range(3000):
+				for i in range(rng.randrange(3)):
+					effect = rng.choice(names)
+					duration = rng.choice([rng.randrange(0, 6), rng.randrange(50, 300), rng.randrange(1000, 2500)])+rng.choice([0, 0.5]) #Short, long and very long, some with half turns left.
+					operation = rng.random()
+					if operation < 0.4:
+						timed.add(effect, duration)
+						reference.effects[effect] = reference.effects.get(effect, 0)+duration
+					elif operation < 0.8:
+						timed[effect] = duration
+						reference.effects[effect] = duration
+					elif effect in reference.effects:
+						del timed[effect]
+						del reference.effects[effect]
+				self.assertEqual(timed.tick(), reference.tick(), f"seed {seed}, turn {turn}")
+				self.assertEqual(dict(timed), reference.effects, f"seed {seed}, turn {turn}")
+
+	def test_noTimeLeft(self):
+		timed = effects.TimedEffects()
+		timed['stunned'] = 0
+		timed['dazed'] = -2
+		self.assertEqual(dict(timed), {'stunned': 0, 'dazed': -2})
+		self.assertEqual(timed.tick(), ['stunned', 'dazed']) #Removed on the next tick, like a counted down dict.
+		self.assertEqual(len(timed), 0)
+
+if __name__ == '__main__':
+	unittest.main()
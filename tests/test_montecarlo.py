@@ -0,0 +1,50 @@
+'''
+Open Combat Flow - tests/test_montecarlo.py
+@purpose Tests that running Monte Carlo trials in this process leaves the global random module as it was, while the trials stay reproducible.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import opencombatflow.montecarlo as montecarlo
+import random
+import unittest
+
+class Gambler(character.Character):
+	'''
+	Picks its damage with the global random module.
+	'''
+
+	def __init__(self, name, group):
+		self.name = name
+		self.groups = [group]
+		self.HP = 12
+		self.effects = {}
+		self.position = [0, 0, 0]
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		return {'name': "gamble", 'user': self, 'range': {'group': enemy}, 'damage': {'base': random.randint(1, 6)}}
+
+	def getReactionBlock(self, action):
+		return {'user': self, 'name': "brace"}
+
+def _encounter():
+	handler = character.combatHandler()
+	for i in range(4):
+		handler.addCharacter(Gambler(f"gambler{i}", "AB"[i%2]))
+	return handler
+
+class InProcessTest(unittest.TestCase):
+
+	def test_globalRandomUntouched(self):
+		random.seed(42)
+		expected = [random.random() for i in range(3)]
+		random.seed(42)
+		first = montecarlo.runTrials(_encounter, 5, processes=1, seed=7)
+		self.assertEqual([random.random() for i in range(3)], expected)
+
+		second = montecarlo.runTrials(_encounter, 5, processes=1, seed=7)
+		self.assertEqual(first.asDict(), second.asDict())
+
+if __name__ == '__main__':
+	unittest.main()
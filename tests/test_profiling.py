@@ -0,0 +1,91 @@
+'''
+Open Combat Flow - tests/test_profiling.py
+@purpose Tests that profiling an AsyncCombatHandler measures how long characters take to decide, not just how long it takes to start asking them, and that a handler only has its profiling hooks while it is profiled.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.asynchandler as asynchandler
+import opencombatflow.character as character
+import opencombatflow.profiling as profiling
+import asyncio
+import unittest
+
+DELAY = 0.005 #Seconds each decision takes.
+
+class Ponderer(character.Character):
+	'''
+	Takes DELAY seconds to choose each action and reaction.
+	'''
+
+	def __init__(self, name, group):
+		self.name = name
+		self.groups = [group]
+		self.HP = 1000
+		self.effects = {}
+		self.position = [0, 0, 0]
+
+	async def getActionBlock(self):
+		await asyncio.sleep(DELAY)
+		enemy = "B" if self.groups[0] == "A" else "A"
+		return {'name': "strike", 'user': self, 'range': {'group': enemy}, 'damage': {'base': 1}}
+
+	async def getReactionBlock(self, action):
+		await asyncio.sleep(DELAY)
+		return {'user': self, 'name': "brace"}
+
+class AsyncProfilingTest(unittest.TestCase):
+
+	def test_decisionLatency(self):
+		handler = asynchandler.AsyncCombatHandler()
+		for i in range(4):
+			handler.addCharacter(Ponderer(f"unit{i}", "AB"[i%2]))
+		profiler = handler.enableProfiling()
+		asyncio.run(handler.run(max_turns=4))
+		phases = profiler.asDict()['phases']
+		self.assertEqual(phases['getActionBlock']['calls'], 4)
+		self.assertEqual(phases['getReactionBlock']['calls'], 8) #Two targets per turn, gathered together.
+		self.assertGreaterEqual(phases['getActionBlock']['ns'], 4*DELAY*10**9)
+		self.assertGreaterEqual(phases['getReactionBlock']['ns'], 8*DELAY*10**9)
+
+class Striker(character.Character):
+	'''
+	Strikes every enemy, and braces.
+	'''
+
+	def __init__(self, name, group):
+		self.name = name
+		self.groups = [group]
+		self.HP = 1000
+		self.effects = {}
+		self.position = [0, 0, 0]
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		return {'name': "strike", 'user': self, 'range': {'group': enemy}, 'damage': {'base': 1}}
+
+	def getReactionBlock(self, action):
+		return {'user': self, 'name': "brace"}
+
+class ProfilingHooksTest(unittest.TestCase):
+
+	def test_hooksOnlyWhileProfiled(self):
+		handler = character.combatHandler(seed=1)
+		for i in range(4):
+			handler.addCharacter(Striker(f"unit{i}", "AB"[i%2]))
+		hooks = lambda: [getattr(handler, hook) for hook in profiling.HOOKS]
+		self.assertEqual(hooks(), [None]*len(profiling.HOOKS))
+
+		profiler = handler.enableProfiling()
+		self.assertNotIn(None, hooks())
+		handler.run(max_turns=4)
+		phases = profiler.asDict()['phases']
+		self.assertEqual(phases['inRange']['calls'], 4*4) #Each target is checked one at a time.
+		self.assertEqual(profiler.depths[1], 4)
+
+		handler.disableProfiling()
+		self.assertEqual(hooks(), [None]*len(profiling.HOOKS))
+		handler.run(max_turns=4)
+		self.assertEqual(profiler.depths[1], 4) #Nothing is measured once profiling is disabled.
+
+if __name__ == '__main__':
+	unittest.main()
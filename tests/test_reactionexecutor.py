@@ -0,0 +1,41 @@
+'''
+Open Combat Flow - tests/test_reactionexecutor.py
+@purpose Tests that gathering slow reactions on a thread pool (combatHandler.setReactionExecutor) plays seeded fights exactly as gathering them one at a time does.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import sentries
+import concurrent.futures
+import unittest
+
+def _threaded(seed, executor = None, threads = None):
+	'''
+	Runs a seeded fight, gathering reactions on a thread pool.
+	@return The outcome, and the most reactions that were gathered at once.
+	'''
+	handler = character.combatHandler(seed=seed)
+	fighters, inFlight = sentries.addSentries(handler)
+	handler.setReactionExecutor(executor, threads)
+	summary = handler.run(max_turns=sentries.MAX_TURNS)
+	handler.setReactionExecutor()
+	return sentries.outcome(handler, fighters, summary), inFlight.most
+
+class ThreadedEquivalenceTest(unittest.TestCase):
+
+	def test_ownedThreads(self):
+		for seed in range(sentries.SEEDS):
+			outcome, most = _threaded(seed, threads=2)
+			self.assertEqual(outcome, sentries.serialFight(seed), f"seed {seed}")
+			self.assertEqual(most, 2, f"seed {seed}") #Never more at once than the pool has threads.
+
+	def test_sharedExecutor(self):
+		with concurrent.futures.ThreadPoolExecutor(8) as executor:
+			for seed in range(sentries.SEEDS):
+				outcome, most = _threaded(seed, executor)
+				self.assertEqual(outcome, sentries.serialFight(seed), f"seed {seed}")
+				self.assertGreater(most, 1, f"seed {seed}")
+			self.assertEqual(executor.submit(int, "7").result(), 7) #The handler does not shut down an executor it was given.
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,86 @@
+'''
+Open Combat Flow - tests/test_replay.py
+@purpose Tests that replay.replay() reproduces a recorded combat, including when characters roll to choose their targets, and that the recorded states of the random stream stay small.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import opencombatflow.replay as replay
+import pickle
+import unittest
+
+class Skirmisher(character.Character):
+	'''
+	Strikes a random enemy, chosen with the handler's random stream, and sometimes dodges at random too.
+	'''
+
+	def __init__(self, handler, name, group):
+		self.handler = handler
+		self.name = name
+		self.groups = [group]
+		self.HP = 25
+		self.effects = {}
+		self.position = [0, 0, 0]
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		target = self.handler.getRandomCharacterInRange({'group': enemy})
+		return {'name': "strike", 'user': self, 'range': {'character': target}, 'damage': {'base': "1d6"}, 'chance': "1d20>6"}
+
+	def getReactionBlock(self, action):
+		if self.handler.rng.random() < 0.5:
+			return {'user': self, 'name': "dodge", 'resistance': {'base': "1d4"}}
+		return {'user': self, 'name': "brace"}
+
+def _state(handler):
+	return ([(c.name, c.HP) for c in handler.alive], [c.name for c in handler.dead], handler.turnCount, handler.rng.getstate())
+
+class ReplayTest(unittest.TestCase):
+
+	def _handler(self, seed):
+		handler = character.combatHandler(seed=seed)
+		for i in range(6):
+			handler.addCharacter(Skirmisher(handler, f"unit{i}", "AB"[i%2]))
+		return handler
+
+	def test_replayWithRandomTargets(self):
+		for seed in range(20):
+			handler = self._handler(seed)
+			recorder = replay.DecisionRecorder(handler.turnCount, handler.rng)
+			handler.configureLog(sinks=[recorder])
+			start = handler.snapshot()
+			handler.run(max_turns=40)
+			expected = _state(handler)
+			turns = handler.turnCount
+
+			replay.replay(handler, recorder, turns, snapshot=start)
+			self.assertEqual(_state(handler), expected)
+
+	def test_replayFromMiddle(self):
+		handler = self._handler(7)
+		recorder = replay.DecisionRecorder(handler.turnCount, handler.rng)
+		handler.configureLog(sinks=[recorder])
+		handler.run(max_turns=10)
+		middle = handler.snapshot()
+		handler.run(max_turns=15)
+		expected = _state(handler)
+
+		replay.replay(handler, recorder, 15, snapshot=middle)
+		self.assertEqual(_state(handler), expected)
+
+	def test_recordingSize(self):
+		handler = self._handler(3)
+		for i in range(6, 40): #Many characters, so the fight lasts long enough for the key to change a few times.
+			handler.addCharacter(Skirmisher(handler, f"unit{i}", "AB"[i%2]))
+		recorder = replay.DecisionRecorder(handler.turnCount, handler.rng)
+		handler.configureLog(sinks=[recorder])
+		handler.run(max_turns=400)
+
+		states = [turn[2] for turn in recorder.turns]+[state for turn in recorder.turns for state in turn[3]]
+		fullSize = len(pickle.dumps(handler.rng.getstate()))
+		keys = len({id(state[1]) for state in states if state is not None})
+		self.assertGreater(len(states), 20*keys) #Most records share their key with the one before.
+		self.assertLess(len(pickle.dumps(states)), (keys+1)*fullSize+len(states)*32) #Each key is stored once, and each record only adds a few bytes.
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,81 @@
+'''
+Open Combat Flow - tests/test_roster.py
+@purpose Tests that a Roster keeps each character's row intact as characters are added and released, reuses freed slots before growing, and starts every reused slot clean.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.roster as roster
+import random
+import unittest
+
+def _row(character):
+	'''
+	Gets everything a roster stores for a character.
+	'''
+	return (character.HP, character.position, dict(character.effects))
+
+@unittest.skipIf(roster.numpy is None, "Rosters need NumPy.")
+class RosterTest(unittest.TestCase):
+
+	def test_grow(self):
+		units = roster.Roster(['poisoned'], capacity=2)
+		characters = [roster.RosterCharacter(units, HP=i+1, position=(i, -i), name=f"unit{i}") for i in range(9)]
+		characters[0].effects['poisoned'] = 3
+		characters[8].effects['stunned'] = 2 #A new effect column, added after growing.
+		self.assertGreaterEqual(len(units.used), 9)
+		self.assertEqual(len(units), 9)
+		self.assertEqual(units.characters(), characters)
+		self.assertEqual([_row(character) for character in characters], [(i+1, [i, -i, 0], {'poisoned': 3} if i == 0 else {'stunned': 2} if i == 8 else {}) for i in range(9)])
+
+	def test_release(self):
+		units = roster.Roster(capacity=4)
+		a, b, c = [roster.RosterCharacter(units, HP=10, name=name) for name in "abc"]
+		slot = b._slot
+		b.effects = {'burning': 4}
+		units.release(b)
+		self.assertEqual(units.characters(), [a, c])
+		self.assertEqual(len(units), 2)
+		d = roster.RosterCharacter(units, HP=3, position=(7,), name="d")
+		self.assertEqual(d._slot, slot) #The freed slot is reused,
+		self.assertEqual(_row(d), (3, [7, 0, 0], {})) #and starts clean.
+		self.assertEqual(units.characters(), [a, d, c])
+
+	def test_churn(self):
+		rng = random.Random(4)
+		units = roster.Roster(['dazed'], capacity=8)
+		alive = {}
+		peak = 0
+		for step in range(2000):
+			if alive and (len(alive) >= 40 or rng.random() < 0.45):
+				character = rng.choice(list(alive))
+				units.release(character)
+				del alive[character]
+			else:
+				character = roster.RosterCharacter(units, HP=rng.randrange(1, 50), position=(rng.randrange(100), rng.randrange(100)), name=f"unit{step}")
+				if rng.random() < 0.5:
+					character.effects['dazed'] = rng.randrange(1, 5)
+				alive[character] = _row(character)
+			peak = max(peak, len(alive))
+			if step%50 == 0:
+				units.tickEffects()
+				for character in alive:
+					alive[character] = _row(character)
+		self.assertEqual({character: _row(character) for character in alive}, alive) #Nobody's row was disturbed by the others.
+		self.assertEqual(set(units.characters()), set(alive))
+		self.assertEqual(len(units), len(alive))
+		self.assertLessEqual(len(units.used), 2*peak) #Freed slots were reused, so the roster only grew with the population.
+		slots = [character._slot for character in units.characters()]
+		self.assertEqual(slots, sorted(slots))
+		self.assertEqual(len(set(slots)), len(slots))
+
+	def test_bulk(self):
+		units = roster.Roster(capacity=4)
+		characters = [roster.RosterCharacter(units, HP=5, name=f"unit{i}") for i in range(6)]
+		units.release(characters[2])
+		living = characters[:2]+characters[3:]
+		units.applyDamage(living, [1, 5, 9, 0, 4])
+		self.assertEqual([character.HP for character in living], [4, 0, 0, 5, 1])
+		self.assertEqual(units.findDead(), [characters[1], characters[3]])
+
+if __name__ == '__main__':
+	unittest.main()
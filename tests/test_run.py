@@ -0,0 +1,69 @@
+'''
+Open Combat Flow - tests/test_run.py
+@purpose Tests that combatHandler.run() never builds the log messages that the log ignores, and that doing so does not change the fight.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import unittest
+
+class Brawler(character.Character):
+	'''
+	Hits every enemy, most of the time.
+	'''
+
+	def __init__(self, name, group):
+		self.name = name
+		self.groups = [group]
+		self.HP = 20
+		self.effects = {}
+		self.position = [0, 0, 0]
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		return {'name': "brawl", 'user': self, 'range': {'group': enemy}, 'damage': {'base': "1d6"}, 'chance': "1d20>5"}
+
+	def getReactionBlock(self, action):
+		return {'user': self, 'name': "brace"}
+
+class CountingHandler(character.combatHandler):
+	'''
+	Remembers the messageType of every message it is asked to log.
+	'''
+
+	def addLogMessage(self, message):
+		self.built.append(message['messageType'])
+		super().addLogMessage(message)
+
+def _fight(messageTypes):
+	'''
+	Runs a fight to the end, and returns the handler and the HP of every character.
+	'''
+	handler = CountingHandler(seed=3)
+	handler.built = []
+	brawlers = [Brawler(f"brawler{i}", "AB"[i%2]) for i in range(6)]
+	for brawler in brawlers:
+		handler.addCharacter(brawler)
+	handler.configureLog(messageTypes=messageTypes)
+	summary = handler.run(max_turns=200)
+	return handler, summary, [brawler.HP for brawler in brawlers]
+
+class RunLogTest(unittest.TestCase):
+
+	def test_unloggedNotBuilt(self):
+		full, fullSummary, fullHP = _fight(None)
+		deaths, deathsSummary, deathsHP = _fight(['death'])
+		self.assertEqual(fullSummary, deathsSummary)
+		self.assertEqual(fullHP, deathsHP)
+		self.assertEqual(set(deaths.built), {'death'})
+		self.assertEqual(deaths.built.count('death'), full.built.count('death'))
+
+	def test_turnAfterRun(self):
+		handler, summary, HP = _fight(['death'])
+		handler.configureLog()
+		handler.addCharacter(Brawler("late", "B"))
+		handler.turn()
+		self.assertEqual(handler.getLog()[0]['messageType'], 'startOfTurn')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,85 @@
+'''
+Open Combat Flow - tests/test_spatial.py
+@purpose Tests that UniformGrid queries with unbounded or very large distances fall back to looking at every character, and that characters on cell boundaries and at negative coordinates are found exactly as a scan of every character would find them.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import opencombatflow.spatial as spatial
+import math
+import random
+import unittest
+
+class Marker(character.Character):
+	'''
+	A character that only has a position.
+	'''
+
+	def __init__(self, name, position):
+		self.name = name
+		self.groups = ["A"]
+		self.HP = 10
+		self.effects = {}
+		self.position = list(position)
+
+POSITIONS = [(0, 0, 0), (500, -20, 3), (-1e6, 7, 0), (2.5, 2.5, 1e9)]
+
+class UniformGridTest(unittest.TestCase):
+
+	def setUp(self):
+		self.grid = spatial.UniformGrid(10)
+		self.markers = [Marker(f"marker{i}", position) for i, position in enumerate(POSITIONS)]
+		for marker in self.markers:
+			self.grid.insert(marker)
+
+	def test_unbounded(self):
+		for distance in (float('inf'), 1e308):
+			self.assertEqual(self.grid.query([0, 0, 0], distance), self.markers)
+
+	def test_large(self):
+		self.assertEqual(self.grid.query([0, 0], 1e12), self.markers)
+
+	def test_handler(self):
+		handler = character.combatHandler()
+		for marker in self.markers:
+			handler.addCharacter(marker)
+		handler.enableSpatialIndex()
+		rangeBlock = {'center': [0, 0, 0], 'distance': float('inf')}
+		self.assertEqual(handler.getAllInRange(rangeBlock), self.markers)
+
+EDGES = [-20.0000001, -20, -19.9999999, -10, -0.5, -0.0, 0, 9.9999999, 10, 10.0000001] #On, just inside and just outside cell boundaries, with a cell size of 10.
+
+class BoundaryTest(unittest.TestCase):
+
+	def test_cells(self):
+		grid = spatial.UniformGrid(10)
+		self.assertEqual(grid._cell((-0.5, -10, -10.5)), (-1, -1, -2))
+		self.assertEqual(grid._cell((-0.0, 9.9999999, 10)), (0, 0, 1))
+
+	def test_edges(self):
+		grid = spatial.UniformGrid(10)
+		markers = [Marker(f"marker{x},{y}", (x, y, 0)) for x in EDGES for y in EDGES]
+		for marker in markers:
+			grid.insert(marker)
+		for center in [(0, 0), (-10, -10), (-20, 10), (-15, -5), (9.9999999, -0.5)]:
+			for distance in (0, 0.5, 5, 10, 10.0000001, 20):
+				found = grid.query(center, distance)
+				exact = [marker for marker in markers if math.dist(marker.position, tuple(center)+(0,)) <= distance]
+				self.assertEqual([marker for marker in found if marker in exact], exact, f"{center}, {distance}") #Nobody in range is missed, and the order is kept.
+
+	def test_handler(self):
+		rng = random.Random(6)
+		markers = [Marker(f"marker{i}", (rng.choice(EDGES)+10*rng.randrange(-3, 3), rng.choice(EDGES), rng.choice((-10, -0.5, 0)))) for i in range(300)]
+		scan, indexed = character.combatHandler(), character.combatHandler()
+		for marker in markers:
+			scan.addCharacter(marker)
+			indexed.addCharacter(marker)
+		indexed.enableSpatialIndex(10)
+		for i in range(200):
+			rangeBlock = {'center': [rng.choice(EDGES)+10*rng.randrange(-3, 3), rng.choice(EDGES), rng.choice((-10, 0))], 'distance': rng.choice((0, 0.5, 5, 10, 15, 30))}
+			self.assertEqual(indexed.getAllInRange(rangeBlock), scan.getAllInRange(rangeBlock), rangeBlock)
+			mover = rng.choice(markers)
+			mover.setPosition(rng.choice(EDGES), rng.choice(EDGES)-10, rng.choice((-10, 0))) #Across boundaries, into negative cells.
+
+if __name__ == '__main__':
+	unittest.main()
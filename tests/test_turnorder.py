@@ -0,0 +1,233 @@
+'''
+Open Combat Flow - tests/test_turnorder.py
+@purpose Tests the schedulers: that the TurnOrder gives turns in the same order as the original list of alive characters and its index, with no turns skipped when characters die before, at or after the current one, that the SpeedScheduler keeps the current actor when characters are added or removed during its turn, and that the InitiativeScheduler re-rolls every round, breaks ties by the order characters were added, and puts latecomers at the end of the round.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.character as character
+import opencombatflow.turnorder as turnorder
+import random
+import unittest
+
+SEEDS = 200
+
+class Duelist(character.Character):
+	'''
+	Sweeps every enemy. Some duelists riposte, which can kill the attacker during its own turn.
+	'''
+
+	def __init__(self, name, group, HP, ripostes):
+		self.name = name
+		self.groups = [group]
+		self.HP = HP
+		self.effects = {}
+		self.position = [0, 0, 0]
+		self.ripostes = ripostes
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		return {'name': "sweep", 'user': self, 'range': {'group': enemy}, 'damage': {'base': "1d6"}, 'chance': "1d20>6"}
+
+	def getReactionBlock(self, action):
+		if not self.ripostes or action['name'] != "sweep":
+			return {'user': self, 'name': "brace"}
+		riposte = {'name': "riposte", 'user': self, 'range': {'character': action['user']}, 'damage': {'base': "1d4"}}
+		return {'user': self, 'name': "parry", 'action': riposte}
+
+class ListOrder():
+	'''
+	The original turn order: a list of alive characters, and the index of the current one. When a character before the current one dies, the index moves back with it, so nobody is skipped.
+	'''
+
+	def __init__(self, characters):
+		self.characters = list(characters)
+		self.index = 0
+
+	def current(self):
+		return self.characters[self.index]
+
+	def remove(self, character):
+		position = self.characters.index(character)
+		self.characters.pop(position)
+		if position < self.index:
+			self.index-=1
+		self.wrap()
+
+	def advance(self, actorDied):
+		if not actorDied: #If the actor died, the character after it has already moved into its place.
+			self.index+=1
+		self.wrap()
+
+	def wrap(self):
+		if self.index >= len(self.characters):
+			self.index = 0
+
+def _fight(seed):
+	'''
+	Runs a seeded fight, and returns its log and the characters in the order they were added.
+	'''
+	setup = random.Random(seed)
+	handler = character.combatHandler(seed=seed)
+	duelists = [Duelist(f"duelist{i}", "AB"[i%2], setup.randint(3, 14), setup.random() < 0.4) for i in range(setup.randint(3, 9))]
+	for duelist in duelists:
+		handler.addCharacter(duelist)
+	handler.run(max_turns=300)
+	return handler.getLog(), duelists
+
+class TurnOrderTest(unittest.TestCase):
+
+	def test_matchesListOrder(self):
+		for seed in range(SEEDS):
+			log, duelists = _fight(seed)
+			reference = ListOrder(duelists)
+			actor = None
+			actorDied = False
+			turns = 0
+			for message in log:
+				if message['messageType'] == 'startOfTurn':
+					if actor is not None:
+						reference.advance(actorDied)
+					self.assertIs(message['character'], reference.current(), f"seed {seed}, turn {turns}")
+					actor = message['character']
+					actorDied = False
+					turns+=1
+				elif message['messageType'] == 'death':
+					reference.remove(message['character'])
+					actorDied = actorDied or message['character'] is actor
+			self.assertGreater(turns, 0)
+
+class Runner():
+	'''
+	A character with nothing but a name and a speed.
+	'''
+
+	def __init__(self, name, speed):
+		self.name = name
+		self.speed = speed
+
+	def __repr__(self):
+		return self.name
+
+def _turns(scheduler, count, during = None):
+	'''
+	Plays count turns, and returns who acted and when. during is called with the scheduler and the turn number, in the middle of each turn.
+	'''
+	turns = []
+	for i in range(count):
+		actor = scheduler.current()
+		turns.append((actor.name, scheduler.timeOf(actor)))
+		if during is not None:
+			during(scheduler, i)
+		scheduler.advance()
+	return turns
+
+class SpeedSchedulerTest(unittest.TestCase):
+
+	def test_order(self):
+		scheduler = turnorder.SpeedScheduler([Runner("a", 1), Runner("b", 2)])
+		names = [name for name, time in _turns(scheduler, 6)]
+		self.assertEqual(names, ["b", "a", "b", "b", "a", "b"]) #a and b tie at the end of each round, and a was added first.
+
+	def test_ties(self):
+		scheduler = turnorder.SpeedScheduler([Runner(name, 3) for name in "xyz"])
+		self.assertEqual([name for name, time in _turns(scheduler, 9)], list("xyz")*3)
+
+	def test_appendMidTurn(self):
+		b = Runner("b", 2)
+		scheduler = turnorder.SpeedScheduler([Runner("a", 1), b])
+		summon = Runner("summon", 1000)
+		def during(scheduler, turn):
+			if turn == 0:
+				self.assertEqual(scheduler.current().name, "b")
+				scheduler.append(summon)
+				self.assertEqual(scheduler.current().name, "b") #The summon cannot take over the turn underway.
+		turns = _turns(scheduler, 20, during)
+		self.assertEqual([name for name, time in turns[:3]], ["b", "summon", "summon"])
+		self.assertEqual(turns[1][1], turns[0][1]+round(turnorder.TICKS_PER_ROUND/1000)) #The summon's first turn counts from b's turn, not from the last turn that ended.
+		self.assertEqual([time for name, time in turns], sorted(time for name, time in turns)) #Time never runs backwards.
+		self.assertEqual(scheduler.timeOf(b), turnorder.TICKS_PER_ROUND) #b was rescheduled once, not twice.
+
+	def test_removeMidTurn(self):
+		a, b, c = Runner("a", 1), Runner("b", 2), Runner("c", 4)
+		scheduler = turnorder.SpeedScheduler([a, b, c])
+		def during(scheduler, turn):
+			if turn == 1:
+				scheduler.remove(scheduler.current()) #The actor dies during its own turn.
+			if turn == 2:
+				scheduler.remove(a) #Someone else dies.
+		names = [name for name, time in _turns(scheduler, 6, during)]
+		self.assertEqual(names, ["c", "b", "c", "c", "c", "c"])
+
+class Contender():
+	'''
+	A character with nothing but a name and an initiative.
+	'''
+
+	def __init__(self, name, initiative):
+		self.name = name
+		self.initiative = initiative
+
+	def __repr__(self):
+		return self.name
+
+def _rounds(scheduler, count):
+	'''
+	Plays count whole rounds, and returns the names of the characters in each.
+	'''
+	rounds = [[]]
+	while len(rounds) <= count:
+		rounds[-1].append(scheduler.current().name)
+		if scheduler.advance():
+			rounds.append([])
+	return rounds[:count]
+
+def _restOfRound(scheduler):
+	'''
+	Plays the rest of the current round, and returns the names of the characters who acted.
+	'''
+	names = [scheduler.current().name]
+	while not scheduler.advance():
+		names.append(scheduler.current().name)
+	return names
+
+class InitiativeSchedulerTest(unittest.TestCase):
+
+	def test_highestFirst(self):
+		scheduler = turnorder.InitiativeScheduler([Contender("slow", 2), Contender("fast", 9), Contender("middling", "5")], random.Random(0))
+		self.assertEqual(_rounds(scheduler, 3), [["fast", "middling", "slow"]]*3)
+
+	def test_ties(self):
+		scheduler = turnorder.InitiativeScheduler([Contender(name, 4) for name in "xyz"]+[Contender("w", 6)], random.Random(0))
+		self.assertEqual(_rounds(scheduler, 3), [["w", "x", "y", "z"]]*3) #x, y and z tie, so they go in the order they were added.
+
+	def test_rerolls(self):
+		contenders = [Contender(f"c{i}", "1d20") for i in range(5)]
+		scheduler = turnorder.InitiativeScheduler(contenders, random.Random(3))
+		rounds = _rounds(scheduler, 30)
+		reference = random.Random(3)
+		for order in rounds:
+			rolls = [(-reference.randrange(1, 21), i) for i in range(len(contenders))] #Rolled in the order they were added, highest first, ties to the first added.
+			self.assertEqual(order, [contenders[i].name for roll, i in sorted(rolls)])
+		self.assertGreater(len({tuple(order) for order in rounds}), 10) #The order really changes from round to round.
+
+	def test_joinAndLeave(self):
+		a, b, c = Contender("a", 3), Contender("b", 2), Contender("c", 1)
+		scheduler = turnorder.InitiativeScheduler([a, b, c], random.Random(0))
+		self.assertIs(scheduler.current(), a)
+		scheduler.append(Contender("late", 10))
+		scheduler.advance()
+		scheduler.remove(c)
+		self.assertEqual(_rounds(scheduler, 2), [["b", "late"], ["late", "a", "b"]]) #The latecomer waits for the end of the round, then rolls like anyone else.
+
+	def test_state(self):
+		scheduler = turnorder.InitiativeScheduler([Contender(f"c{i}", "1d6") for i in range(4)], random.Random(5))
+		scheduler.current()
+		scheduler.advance()
+		state = scheduler.getState()
+		rest = _restOfRound(scheduler)
+		scheduler.setState(state)
+		self.assertEqual(_restOfRound(scheduler), rest)
+		self.assertEqual(len(rest), 3)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,123 @@
+'''
+Open Combat Flow - tests/test_validation.py
+@purpose Tests that a Validator in "first" mode checks each shape of block once, skips blocks that are already known to be valid, and only keeps a bounded number of blocks alive, and that a combatHandler checks a range once per query or action rather than once per character.
+@author Owen Mellema
+@date 2-25-19
+'''
+import opencombatflow.blocks as blocks
+import opencombatflow.character as character
+import opencombatflow.enforce as enforce
+import gc
+import unittest
+import weakref
+
+USER = character.Character()
+
+def _action(damage):
+	'''
+	Builds an action for the validator to check.
+	'''
+	return {'name': "strike", 'user': USER, 'range': {'group': "B"}, 'damage': damage}
+
+class FirstModeTest(unittest.TestCase):
+
+	def setUp(self):
+		self.validator = enforce.Validator('first')
+
+	def test_shapes(self):
+		action = _action({'slashing': "2d6"})
+		for i in range(3):
+			self.validator.enforce(action, "action")
+		self.validator.enforce(_action({'slashing': "1d4"}), "action") #Same shape, different values.
+		self.validator.enforce(_action({'slashing': 4}), "action") #A new shape.
+		self.assertEqual(self.validator.getCounters(), {'performed': 2, 'skipped': 3})
+
+	def test_invalid(self):
+		with self.assertRaises(KeyError):
+			self.validator.enforce(_action({'slashing': "sword"}), "action")
+		with self.assertRaises(KeyError): #A failed check does not mark its shape as seen.
+			self.validator.enforce(_action({'slashing': "axe"}), "action")
+
+	def test_knownValid(self):
+		frozen = enforce.freeze(_action({'slashing': "2d6"}))
+		block = blocks.ActionBlock(_action({'slashing': "2d6"}))
+		for i in range(3):
+			self.validator.enforce(frozen, "action")
+			self.validator.enforce(block, "action")
+		self.assertEqual(self.validator.getCounters(), {'performed': 1, 'skipped': 5}) #Only the first look at the frozen block.
+
+class CacheBoundTest(unittest.TestCase):
+
+	def test_blocksReleased(self):
+		validator = enforce.Validator('first')
+		owner = character.Character()
+		action = {'name': "strike", 'user': owner, 'range': {'group': "B"}, 'damage': {'slashing': "1d4"}}
+		frozen = enforce.freeze(action)
+		validator.enforce(action, "action")
+		validator.enforce(frozen, "action")
+		owner = weakref.ref(owner)
+		del action, frozen
+		for i in range(max(enforce.SHAPE_CACHE_SIZE, enforce.FROZEN_CACHE_SIZE)): #Push both blocks out of the caches.
+			validator.enforce(_action({'slashing': "1d4"}), "action")
+			validator.enforce(enforce.freeze(_action({'slashing': "1d4"})), "action")
+		gc.collect()
+		self.assertIsNone(owner())
+		self.assertLessEqual(len(validator._shapes), enforce.SHAPE_CACHE_SIZE)
+		self.assertLessEqual(len(enforce._validatedFrozen), enforce.FROZEN_CACHE_SIZE)
+
+	def test_leastRecentlyUsed(self):
+		cache = enforce._IdentityCache(3)
+		blocks = [{'index': i} for i in range(5)]
+		for block in blocks[:3]:
+			cache.put(id(block), block, block['index'])
+		self.assertEqual(cache.get(id(blocks[0]), blocks[0]), 0) #Used again, so it is kept.
+		cache.put(id(blocks[3]), blocks[3], 3)
+		cache.put(id(blocks[4]), blocks[4], 4)
+		self.assertEqual([cache.get(id(block), block) for block in blocks], [0, None, None, 3, 4])
+		self.assertIsNone(cache.get(id(blocks[0]), {'index': 0})) #Only the same block, not an equal one.
+
+class Soldier(character.Character):
+	'''
+	Strikes every enemy, and braces.
+	'''
+
+	def __init__(self, index):
+		self.name = f"soldier{index}"
+		self.groups = ["AB"[index%2]]
+		self.HP = 10
+		self.effects = {}
+		self.position = [index, 0, 0]
+
+	def getActionBlock(self):
+		enemy = "B" if self.groups[0] == "A" else "A"
+		return {'name': "strike", 'user': self, 'range': {'group': enemy}, 'damage': {'base': "1d4"}}
+
+	def getReactionBlock(self, action):
+		return {'user': self, 'name': "brace"}
+
+class HandlerChecksTest(unittest.TestCase):
+
+	def setUp(self):
+		self.handler = character.combatHandler(seed=2)
+		for i in range(40):
+			self.handler.addCharacter(Soldier(i))
+		self.handler.setValidationMode('strict')
+		self.validator = self.handler.getValidator()
+
+	def test_rangeQuery(self):
+		self.assertEqual(len(self.handler.getAllInRange({'group': "A"})), 20)
+		self.assertEqual(self.validator.getCounters(), {'performed': 1, 'skipped': 0})
+		with self.assertRaises(KeyError): #Still checked, just not once per character.
+			self.handler.getAllInRange({'group': 1})
+
+	def test_action(self):
+		counts = {}
+		def count(block, blockType):
+			counts[blockType] = counts.get(blockType, 0)+1
+		self.validator.enforce = count
+		self.handler.turn()
+		self.assertEqual(counts.get('range', 0), 0) #Only checked as part of the action.
+		self.assertEqual(counts['action'], 1+20) #Once when the action starts, and once more for each target, to roll damage.
+
+if __name__ == '__main__':
+	unittest.main()